@@ -0,0 +1,276 @@
+import json, os, threading
+from collections import Counter
+
+from indexes import id_key
+from store import store
+
+
+class HistoryArchive:
+    """
+    Cold tier for nested history lists (license audits, release update logs).
+
+    Entries moved out of a document are appended to one JSON-lines segment
+    per document, <root>/<kind>/<id>.jsonl, oldest first. Segments are only
+    opened when someone asks for that document's history.
+
+    Each kind also keeps a tally file (<root>/<kind>/tally.json) counting the
+    archived entries per document by one field (e.g. update log status), so
+    counters can include archived entries without reading any segment, and
+    noting the child id of the last entry archived per document, so a move
+    repeated after a crash knows what is already there without reading it.
+
+    With shared=True another worker process may be the one appending, so a
+    tally file that changed on disk is read again.
+    """
+
+    def __init__(self, root: str, kinds: dict, shared: bool = False):
+        self.root = root
+        self.kinds = kinds          # kind -> field the tally counts by
+        self.shared = shared
+        self._tallies = {}          # kind -> {"counts": {id_key: {value: count}}, "last": {id_key: child id_key}}
+        self._mtimes = {}           # kind -> mtime_ns of the tally file we read
+        self._listeners = []
+        self._lock = threading.Lock()
+
+    def subscribe(self, listener):
+        """Call listener(kind, id, Counter of newly archived tally values) after each append."""
+        self._listeners.append(listener)
+
+    def append(self, kind: str, id, entries: list, last=None):
+        """Append entries (oldest first); `last` is the child id of the final one."""
+        if not entries:
+            return
+        field = self.kinds[kind]
+        added = Counter(_tally_key(e.get(field)) for e in entries)
+        with self._lock:
+            directory = os.path.join(self.root, kind)
+            os.makedirs(directory, exist_ok=True)
+            with open(self._segment(kind, id), "a", encoding="utf-8") as f:
+                f.write("".join(json.dumps(e) + "\n" for e in entries))
+                f.flush()
+                os.fsync(f.fileno())
+
+            tally = self._tally(kind)
+            counts = tally["counts"].setdefault(id_key(id), {})
+            for value, n in added.items():
+                counts[value] = counts.get(value, 0) + n
+            tally["last"][id_key(id)] = id_key(last)
+            self._write_tally(kind)
+        for listener in self._listeners:
+            listener(kind, id, added)
+
+    def drop(self, kind: str, id):
+        """Forget one document's archived entries (it was deleted; a new one may reuse the id)."""
+        with self._lock:
+            try:
+                os.remove(self._segment(kind, id))
+            except FileNotFoundError:
+                pass
+            tally = self._tally(kind)
+            if tally["counts"].pop(id_key(id), None) is not None or tally["last"].pop(id_key(id), None):
+                self._write_tally(kind)
+
+    def count(self, kind: str, id) -> int:
+        return sum(self.tally(kind, id).values())
+
+    def tally(self, kind: str, id) -> dict:
+        with self._lock:
+            return dict(self._tally(kind)["counts"].get(id_key(id), {}))
+
+    def last(self, kind: str, id):
+        """id_key of the child archived last for one document, None if nothing is."""
+        with self._lock:
+            return self._tally(kind)["last"].get(id_key(id))
+
+    def read_newest(self, kind: str, id, offset: int, limit: int) -> list:
+        """
+        Archived entries of one document, newest first, from `offset` on. The
+        segment is read backwards from its end, so only the entries up to
+        the end of the window are read.
+        """
+        try:
+            f = open(self._segment(kind, id), "rb")
+        except FileNotFoundError:
+            return []
+        entries = []
+        with f:
+            for i, line in enumerate(_lines_backwards(f)):
+                if i >= offset + limit:
+                    break
+                if i >= offset:
+                    entries.append(json.loads(line))
+        return entries
+
+    def _segment(self, kind, id):
+        # ids end up in file names: keep them to one safe path component
+        name = "".join(c if c.isalnum() or c in "-_" else "_" for c in id_key(id))
+        return os.path.join(self.root, kind, f"{name}.jsonl")
+
+    def _tally(self, kind):
+        # caller holds the lock
+        path = os.path.join(self.root, kind, "tally.json")
+        if kind in self._tallies and (not self.shared or self._mtimes.get(kind) == _mtime(path)):
+            return self._tallies[kind]
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                self._mtimes[kind] = os.fstat(f.fileno()).st_mtime_ns
+                tally = json.load(f)
+        except FileNotFoundError:
+            tally = {}
+        if "counts" not in tally:
+            # written before the last archived ids were kept: counts only
+            tally = {"counts": tally, "last": {}}
+        self._tallies[kind] = tally
+        return tally
+
+    def _write_tally(self, kind):
+        path = os.path.join(self.root, kind, "tally.json")
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self._tallies[kind], f)
+        os.replace(tmp, path)
+        self._mtimes[kind] = _mtime(path)
+
+
+class HistoryTier:
+    """
+    Keeps the newest `keep` entries of a nested history list inline and moves
+    older ones to the archive. List order is insertion order, so the oldest
+    entries are at the front.
+
+    Change events only note which documents grew past keep + batch; the
+    archiving pass then moves them a batch at a time, so a write never waits
+    on the archive and the archive is appended in chunks rather than per
+    entry. A move is three steps: overflow() picks the entries (in memory,
+    on the event loop), archive_entries() appends them (disk, in a thread,
+    no collection lock held) and trim() drops them from the document (in
+    memory, under its write lock).
+    """
+
+    def __init__(self, archive: HistoryArchive, kind, path, key, field, child_key, keep: int, batch: int):
+        self.archive = archive
+        self.kind = kind
+        self.path = path
+        self.key = key
+        self.field = field
+        self.child_key = child_key
+        self.keep = keep
+        self.batch = batch
+        self._pending = set()
+        self._lock = threading.Lock()
+
+    def on_change(self, event):
+        if event["path"] != self.path or event["op"] not in ("upsert", "upsert_child"):
+            return
+        if event["op"] == "upsert":
+            doc = event["result"]
+        elif event.get("field") == self.field:
+            doc = store.find(self.path, self.key, event.get("id"))
+        else:
+            return
+        if doc and len(doc.get(self.field) or []) > self.keep + self.batch:
+            with self._lock:
+                self._pending.add(id_key(doc.get(self.key)))
+
+    def scan(self):
+        """Queue every document that is already over the limit (once, at startup)."""
+        over = [
+            id_key(doc.get(self.key)) for doc in store.load(self.path)
+            if len(doc.get(self.field) or []) > self.keep + self.batch
+        ]
+        with self._lock:
+            self._pending.update(over)
+        return len(over)
+
+    def take(self) -> list:
+        with self._lock:
+            pending, self._pending = self._pending, set()
+        return sorted(pending)
+
+    def overflow(self, id) -> list:
+        """All but the newest `keep` entries of one document, oldest first."""
+        doc = store.find(self.path, self.key, id)
+        entries = (doc or {}).get(self.field) or []
+        return entries[:max(len(entries) - self.keep, 0)]
+
+    def archive_entries(self, id, cold: list):
+        """
+        Append the overflow to the archive. After a crash between archiving
+        and trim() the same entries are offered again; those up to the last
+        archived child id are already there and are skipped.
+        """
+        keys = [id_key(e.get(self.child_key)) for e in cold]
+        last = self.archive.last(self.kind, id)
+        fresh = cold[keys.index(last) + 1:] if last in keys else cold
+        if fresh:
+            self.archive.append(self.kind, id, fresh, last=fresh[-1].get(self.child_key))
+
+    def trim(self, id, cold: list) -> int:
+        """Drop archived entries from the document; caller holds its write lock."""
+        doc = store.find(self.path, self.key, id)
+        if doc is None:
+            return 0
+        # entries edited since they were picked stay inline
+        archived = {id_key(e.get(self.child_key)): e for e in cold}
+        entries = doc.get(self.field) or []
+        hot = [e for e in entries if archived.get(id_key(e.get(self.child_key))) != e]
+        if len(hot) < len(entries):
+            store.upsert(self.path, self.key, {**doc, self.field: hot})
+        return len(entries) - len(hot)
+
+    def drop(self, id):
+        """The document is gone: drop its archived entries and any queued move."""
+        with self._lock:
+            self._pending.discard(id_key(id))
+        self.archive.drop(self.kind, id)
+
+    def hot(self, id):
+        """The inline entries of one document, newest first; None if there is no document."""
+        doc = store.find(self.path, self.key, id)
+        if doc is None:
+            return None
+        return list(reversed(doc.get(self.field) or []))
+
+    def page(self, id, hot: list, offset: int, limit: int):
+        """
+        (total, entries) of one document's history, newest first: the inline
+        entries `hot` (from hot()), then archived ones. The archive segment
+        is only read when the page reaches past the inline entries, and then
+        only up to the end of the page.
+        """
+        total = len(hot) + self.archive.count(self.kind, id)
+        entries = hot[offset:offset + limit]
+        if len(entries) < limit:
+            skip = max(offset - len(hot), 0)
+            entries += self.archive.read_newest(self.kind, id, skip, limit - len(entries))
+        return total, entries
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def _tally_key(value):
+    # tally.json is JSON: keys must be strings
+    return "" if value is None else str(value)
+
+
+def _lines_backwards(f, block: int = 64 * 1024):
+    """Yield the non-empty lines of a binary file, last line first."""
+    f.seek(0, os.SEEK_END)
+    end = f.tell()
+    tail = b""
+    while end > 0:
+        start = max(end - block, 0)
+        f.seek(start)
+        chunk = f.read(end - start) + tail
+        end = start
+        lines = chunk.split(b"\n")
+        # the first piece may be cut mid-line unless the file starts there
+        tail = lines.pop(0) if start > 0 else b""
+        for line in reversed(lines):
+            if line.strip():
+                yield line
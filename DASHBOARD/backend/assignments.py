@@ -0,0 +1,127 @@
+import threading
+
+from indexes import id_key
+from store import store
+
+# client fields holding one linked row per index (product, release, update log)
+LINKED_FIELDS = ("productIds", "releaseIds", "updateLogIds")
+
+
+class AssignmentIndex:
+    """
+    Indexes over the client-product assignments, kept up to date from store
+    change events: the assignment id per (clientId, productId) pair, plus
+    forward (client -> products) and reverse (product -> clients) adjacency
+    maps.
+
+    A duplicate check is one dict lookup and either side of the membership
+    is read straight off a map, so none of them scans the collection.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.RLock()
+        self._stale = True
+        self._changes = 0     # relevant events seen, to detect writes racing a rebuild
+
+        self._rows = {}       # assignment id_key -> (client id_key, product id_key)
+        self._pairs = {}      # (client id_key, product id_key) -> assignment id
+        self._products = {}   # client id_key -> {product id_key: assignment id}
+        self._clients = {}    # product id_key -> {client id_key: assignment id}
+
+    # -------------------------
+    # READ
+    # -------------------------
+    def _ready(self):
+        while self._stale:
+            # read storage without holding our lock, as UpdatesView does
+            seen = self._changes
+            entries = store.load(self.path)
+            with self._lock:
+                if self._changes == seen:
+                    self._rebuild(entries)
+
+    def find(self, client_id, product_id):
+        """Id of the assignment of product_id to client_id, None if there is none."""
+        self._ready()
+        with self._lock:
+            return self._pairs.get((id_key(client_id), id_key(product_id)))
+
+    def of_client(self, client_id) -> dict:
+        """{product id_key: assignment id} for everything assigned to one client."""
+        self._ready()
+        with self._lock:
+            return dict(self._products.get(id_key(client_id), {}))
+
+    def of_product(self, product_id) -> dict:
+        """{client id_key: assignment id} for every client a product is assigned to."""
+        self._ready()
+        with self._lock:
+            return dict(self._clients.get(id_key(product_id), {}))
+
+    # -------------------------
+    # MAINTENANCE
+    # -------------------------
+    def on_change(self, event):
+        if event["path"] != self.path:
+            return
+        with self._lock:
+            self._changes += 1
+            if self._stale:
+                return
+            if event["op"] == "replace":
+                self._stale = True
+                return
+            self._remove(id_key(event.get("id")))
+            if event["op"] == "upsert":
+                self._add(event["result"])
+
+    def _rebuild(self, entries):
+        self._rows, self._pairs, self._products, self._clients = {}, {}, {}, {}
+        for entry in entries:
+            self._add(entry)
+        self._stale = False
+
+    def _add(self, entry):
+        aid = id_key(entry.get("id"))
+        pair = (id_key(entry.get("clientId")), id_key(entry.get("productId")))
+        self._rows[aid] = pair
+        self._pairs[pair] = entry.get("id")
+        self._products.setdefault(pair[0], {})[pair[1]] = entry.get("id")
+        self._clients.setdefault(pair[1], {})[pair[0]] = entry.get("id")
+
+    def _remove(self, aid):
+        pair = self._rows.pop(aid, None)
+        if pair is None or id_key(self._pairs.get(pair)) != aid:
+            # unknown, or a duplicate of a pair another assignment still holds
+            return
+        del self._pairs[pair]
+        for adjacency, (a, b) in ((self._products, pair), (self._clients, pair[::-1])):
+            del adjacency[a][b]
+            if not adjacency[a]:
+                del adjacency[a]
+
+
+def relinked(client: dict, add=(), remove=()):
+    """
+    The client's LINKED_FIELDS after adding a row for each product in `add`
+    that has none and dropping the rows of the products in `remove`; None
+    when nothing changes. The three lists are read as rows by index, so
+    they are edited together and stay the same length (cells the client
+    never filled in are 0, as the client form does).
+    """
+    columns = [list(client.get(f) or []) for f in LINKED_FIELDS]
+    rows = [
+        [c[i] if i < len(c) else 0 for c in columns]
+        for i in range(max(map(len, columns)))
+    ]
+    dropped = {id_key(p) for p in remove}
+    kept = [r for r in rows if id_key(r[0]) not in dropped]
+    linked = {id_key(r[0]) for r in kept}
+    for product_id in add:
+        if id_key(product_id) not in linked:
+            linked.add(id_key(product_id))
+            kept.append([product_id, 0, 0])
+    if kept == rows and all(len(c) == len(rows) for c in columns):
+        return None
+    return {f: [r[i] for r in kept] for i, f in enumerate(LINKED_FIELDS)}
@@ -0,0 +1,74 @@
+"""
+Compare two benchmark result files (see benchmarks.run).
+
+    python -m benchmarks.compare baseline.json candidate.json [--threshold 0.10] [--min-ms 0.5]
+
+Prints the p50 / p95 / p99 change per route and exits with status 1 when any
+route's p95 got slower by more than --threshold (a fraction) and by more
+than --min-ms milliseconds, or started returning errors.
+"""
+import argparse, json, sys
+
+
+def _load(path):
+    with open(path, "r", encoding="utf-8") as f:
+        results = json.load(f)
+    if results.get("format") != 1:
+        raise SystemExit(f"{path}: unsupported results format {results.get('format')!r}")
+    return results
+
+
+def _change(old, new):
+    if old is None or new is None:
+        return "      n/a"
+    if old == 0:
+        return "      new"
+    return f"{(new - old) / old:+8.1%}"
+
+
+def compare(base, candidate, threshold, min_ms):
+    """Print the comparison; returns the names of regressed routes."""
+    if base["settings"] != candidate["settings"] or base["dataset"] != candidate["dataset"]:
+        print("❌ Settings or dataset differ between the runs; numbers may not be comparable")
+
+    regressed = []
+    print(f"{'route':<60} {'p50':>9} {'p95':>9} {'p99':>9}")
+    for name, new in candidate["routes"].items():
+        old = base["routes"].get(name)
+        if old is None:
+            print(f"{name:<60} (new route)")
+            continue
+        line = " ".join(_change(old[p], new[p]) for p in ("p50_ms", "p95_ms", "p99_ms"))
+        slower = (
+            old["p95_ms"] is not None and new["p95_ms"] is not None
+            and new["p95_ms"] - old["p95_ms"] > max(min_ms, old["p95_ms"] * threshold)
+        )
+        if slower or new["errors"] > old["errors"]:
+            regressed.append(name)
+        print(f"{'❌' if name in regressed else '  '}{name:<58} {line}")
+
+    print(f"peak RSS: {base['peak_rss_mb']} MB -> {candidate['peak_rss_mb']} MB "
+          f"({_change(base['peak_rss_mb'], candidate['peak_rss_mb']).strip()})")
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=0.10)
+    parser.add_argument("--min-ms", type=float, default=0.5)
+    args = parser.parse_args()
+
+    base, candidate = _load(args.baseline), _load(args.candidate)
+    print(f"baseline  {base.get('commit')}  {base['createdAt']}")
+    print(f"candidate {candidate.get('commit')}  {candidate['createdAt']}")
+    regressed = compare(base, candidate, args.threshold, args.min_ms)
+    if regressed:
+        print(f"❌ {len(regressed)} route(s) regressed")
+        sys.exit(1)
+    print("✅ No regressions")
+
+
+if __name__ == "__main__":
+    main()
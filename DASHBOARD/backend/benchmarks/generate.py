@@ -0,0 +1,246 @@
+"""
+Synthetic dataset generator for the benchmarks.
+
+    python -m benchmarks.generate --scale 100k --out bench-data [--seed 1]
+    python -m benchmarks.generate --releases 5000 --out bench-data
+
+Writes every collection the backend reads (products.json, releases.json
+with nested artifacts / updateLogs / dependencies, licenses.json with long
+audit histories, clients.json, data/client_product.json, ...) into --out,
+in the same shape as the files shipped with the app. Collections are
+written one document at a time, so even the 1m scale does not have to fit
+in memory. The same seed always produces the same files.
+"""
+import argparse, json, os, random
+from datetime import datetime, timedelta, timezone
+
+SCALES = {"1k": 1_000, "100k": 100_000, "1m": 1_000_000}
+
+EPOCH = datetime(2023, 1, 1, tzinfo=timezone.utc)
+RELEASE_TYPES = ["major", "minor", "patch", "hotfix"]
+RELEASE_STATUSES = ["draft", "Published", "deprecated"]
+LOG_STATUSES = ["completed", "failed", "pending", "rolled_back"]
+LICENSE_TYPES = ["subscription", "perpetual", "trial"]
+LICENSE_STATUSES = ["active", "expired", "suspended"]
+AUDIT_ACTIONS = ["activated", "renewed", "regenerated key", "suspended", "reactivated"]
+WORDS = ["Analytics", "CRM", "Billing", "Insight", "Cloud", "Edge", "Secure", "Sync", "Data", "Flow"]
+
+
+def _time(rng, days=3 * 365):
+    return (EPOCH + timedelta(seconds=rng.randrange(days * 86400))).isoformat()
+
+
+class ArrayWriter:
+    """Writes a JSON array to disk one document at a time."""
+
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(path, "w", encoding="utf-8")
+        self._file.write("[")
+        self.count = 0
+
+    def write(self, doc):
+        self._file.write(("," if self.count else "") + "\n" + json.dumps(doc))
+        self.count += 1
+
+    def close(self):
+        self._file.write("\n]")
+        self._file.close()
+
+
+def _write_array(path, docs):
+    writer = ArrayWriter(path)
+    for doc in docs:
+        writer.write(doc)
+    writer.close()
+
+
+def _write_object(path, doc):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(doc, f, indent=2)
+
+
+def counts_for(releases: int) -> dict:
+    """Collection sizes derived from the number of releases."""
+    return {
+        "releases": releases,
+        "products": max(1, releases // 10),
+        "clients": max(10, releases // 20),
+        "licenses": max(1, releases // 2),
+        "assignments": max(1, releases // 5),
+        "notifications": min(500, max(5, releases // 100)),
+    }
+
+
+def _releases(rng, n, products, clients):
+    artifact_id = log_id = dep_id = 0
+    for rid in range(1, n + 1):
+        pid = rng.randint(1, products)
+        artifacts = []
+        for _ in range(rng.randint(1, 3)):
+            artifact_id += 1
+            artifacts.append({
+                "artifactId": artifact_id,
+                "releaseId": rid,
+                "fileUrl": f"https://downloads.example.com/{pid}/{rid}/build-{artifact_id}.bin",
+                "hash": f"sha256:{rng.getrandbits(256):064x}",
+                "signature": None,
+                "size": rng.randint(100_000, 500_000_000),
+                "createdAt": _time(rng),
+            })
+        logs = []
+        for _ in range(rng.randint(0, 10)):
+            log_id += 1
+            cid = rng.randint(1, clients)
+            logs.append({
+                "updateLogId": log_id,
+                "clientId": cid,
+                "releaseId": rid,
+                "clientLocationId": cid,
+                "installedAt": _time(rng),
+                "status": rng.choice(LOG_STATUSES),
+                "client": {"clientId": cid, "name": f"Client {cid}"},
+                "location": {"clientLocationId": cid, "name": f"Site {cid}"},
+            })
+        deps = []
+        for _ in range(rng.randint(0, 2) if rid > 1 else 0):
+            dep_id += 1
+            target = rng.randint(1, rid - 1)
+            deps.append({
+                "releaseDependencyId": dep_id,
+                "releaseId": rid,
+                "dependsOnReleaseId": target,
+                "dependsOn": {"releaseId": target},
+            })
+        yield {
+            "releaseId": rid,
+            "productId": pid,
+            "version": f"{rng.randint(0, 9)}.{rng.randint(0, 30)}.{rng.randint(0, 99)}",
+            "releaseType": rng.choice(RELEASE_TYPES),
+            "status": rng.choice(RELEASE_STATUSES),
+            "releaseDate": _time(rng),
+            "title": f"Release {rid}",
+            "notes": " ".join(rng.choice(WORDS) for _ in range(12)),
+            "changelog": [f"Change {i}" for i in range(rng.randint(0, 5))],
+            "artifacts": artifacts,
+            "updateLogs": logs,
+            "dependencies": deps,
+            "lastModified": _time(rng),
+        }
+
+
+def _licenses(rng, n, products, clients):
+    audit_id = 0
+    for lid in range(1, n + 1):
+        start = EPOCH + timedelta(days=rng.randrange(3 * 365))
+        audits = []
+        for _ in range(rng.randint(5, 60)):
+            audit_id += 1
+            audits.append({"licenseAuditId": audit_id, "action": rng.choice(AUDIT_ACTIONS), "timestamp": _time(rng)})
+        cid, pid = rng.randint(1, clients), rng.randint(1, products)
+        yield {
+            "licenseId": lid,
+            "clientId": cid,
+            "productId": pid,
+            "licenseKey": f"{rng.getrandbits(40):010X}-{rng.getrandbits(40):010X}",
+            "type": rng.choice(LICENSE_TYPES),
+            "startDate": start.date().isoformat(),
+            "endDate": (start + timedelta(days=rng.choice([30, 365, 730]))).date().isoformat(),
+            "status": rng.choice(LICENSE_STATUSES),
+            "client": {"id": cid, "name": f"Client {cid}"},
+            "product": {"id": pid, "name": f"Product {pid}"},
+            "audits": audits,
+            "lastModified": _time(rng),
+        }
+
+
+def generate(out: str, releases: int, seed: int = 1) -> dict:
+    """Write a dataset with `releases` releases into `out`; returns the collection sizes."""
+    rng = random.Random(seed)
+    n = counts_for(releases)
+    os.makedirs(out, exist_ok=True)
+    at = lambda name: os.path.join(out, name)
+
+    _write_array(at("products.json"), (
+        {
+            "productId": pid,
+            "name": f"{rng.choice(WORDS)} {rng.choice(WORDS)} {pid}",
+            "sku": f"SKU-{pid:06d}",
+            "description": " ".join(rng.choice(WORDS) for _ in range(20)),
+            "createdAt": _time(rng),
+            "lastModified": _time(rng),
+        }
+        for pid in range(1, n["products"] + 1)
+    ))
+
+    # the flat artifact / update log collections mirror the nested ones, as create_product keeps them
+    writers = [ArrayWriter(at(p)) for p in ("releases.json", "artifacts.json", "update_logs.json")]
+    release_out, artifact_out, log_out = writers
+    for release in _releases(rng, n["releases"], n["products"], n["clients"]):
+        release_out.write(release)
+        for a in release["artifacts"]:
+            artifact_out.write(a)
+        for l in release["updateLogs"]:
+            log_out.write(l)
+    for writer in writers:
+        writer.close()
+
+    _write_array(at("clients.json"), (
+        {
+            "clientId": cid,
+            "name": f"Client {cid}",
+            "primaryContact": f"Contact {cid}",
+            "email": f"client{cid}@example.com",
+            "billingInfo": "Standard monthly billing",
+            "createdAt": _time(rng)[:10],
+            "locations": [{"clientLocationId": cid, "address": f"{cid} Street", "city": "Springfield", "country": "USA"}],
+            "productIds": [],
+            "releaseIds": [],
+            "updateLogIds": [],
+            "lastModified": _time(rng),
+        }
+        for cid in range(1, n["clients"] + 1)
+    ))
+
+    _write_array(at("licenses.json"), _licenses(rng, n["licenses"], n["products"], n["clients"]))
+
+    pairs = set()
+    while len(pairs) < min(n["assignments"], n["clients"] * n["products"]):
+        pairs.add((rng.randint(1, n["clients"]), rng.randint(1, n["products"])))
+    _write_array(at(os.path.join("data", "client_product.json")), (
+        {"id": i, "clientId": c, "productId": p, "assignedAt": _time(rng)}
+        for i, (c, p) in enumerate(sorted(pairs), 1)
+    ))
+
+    _write_object(at("settings.json"), {
+        "user": {"userId": 1, "clientId": 1, "name": "Bench User", "email": "bench@example.com", "role": "admin"},
+        "notifications": [
+            {"notificationId": i, "userId": 1, "type": "update_available", "message": f"Notification {i}",
+             "isRead": bool(i % 2), "createdAt": _time(rng)}
+            for i in range(1, n["notifications"] + 1)
+        ],
+    })
+    _write_object(at("sequences.json"), {})
+    _write_array(at("updates.json"), [])
+    return n
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    size = parser.add_mutually_exclusive_group()
+    size.add_argument("--scale", choices=SCALES, default="1k")
+    size.add_argument("--releases", type=int, help="exact number of releases instead of a preset scale")
+    parser.add_argument("--out", default="bench-data")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    n = generate(args.out, args.releases or SCALES[args.scale], args.seed)
+    for name, count in n.items():
+        print(f"✅ {name}: {count}")
+    print(f"✅ Dataset written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,485 @@
+"""
+Benchmark driver: runs every API route in-process against the ASGI app and
+writes latency percentiles, throughput and peak RSS as JSON.
+
+    python -m benchmarks.generate --scale 1k --out bench-data
+    python -m benchmarks.run --data bench-data --requests 200 --concurrency 8 --out results.json
+
+The dataset is copied to a scratch directory first (the routes create and
+delete documents), unless --in-place is given. Storage settings come from
+the usual DASHBOARD_* environment variables; with DASHBOARD_STORAGE=sqlite
+the copy is imported into a fresh database before the run.
+
+Requests are prepared (including any untimed setup such as creating the
+document a DELETE removes) before each route's timed phase. /api/events is
+left out: it is an open-ended stream, not a request/response route.
+"""
+import argparse, asyncio, json, os, platform, random, resource, shutil, subprocess, sys, tempfile, time
+from bisect import bisect_left
+from datetime import datetime, timezone
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+RESULTS_FORMAT = 1
+NOT_MEASURED = {"/api/events"}
+
+
+# -----------------------------------------------------
+# IN-PROCESS ASGI CLIENT
+# -----------------------------------------------------
+class ASGIClient:
+    """Just enough of an HTTP client to call the app without sockets."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def request(self, method, path, body=None, headers=None):
+        path, _, query = path.partition("?")
+        payload = json.dumps(body).encode() if body is not None else b""
+        raw_headers = [(b"host", b"bench"), (b"content-type", b"application/json")]
+        raw_headers += [(k.lower().encode(), v.encode()) for k, v in (headers or {}).items()]
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+            "method": method, "scheme": "http", "path": path, "raw_path": path.encode(),
+            "query_string": query.encode(), "root_path": "", "headers": raw_headers,
+            "server": ("bench", 80), "client": ("bench", 1),
+        }
+
+        done = asyncio.Event()
+        sent = False
+        response = {"status": 0, "headers": {}, "body": bytearray()}
+
+        async def receive():
+            nonlocal sent
+            if not sent:
+                sent = True
+                return {"type": "http.request", "body": payload, "more_body": False}
+            await done.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                response["headers"] = {k.decode(): v.decode() for k, v in message["headers"]}
+            elif message["type"] == "http.response.body":
+                response["body"] += message.get("body", b"")
+                if not message.get("more_body"):
+                    done.set()
+
+        await self.app(scope, receive, send)
+        return response
+
+    async def json(self, method, path, body=None):
+        response = await self.request(method, path, body)
+        return json.loads(response["body"]) if response["body"] else None
+
+
+class Lifespan:
+    """Runs the app's startup / shutdown handlers through the ASGI lifespan protocol."""
+
+    def __init__(self, app):
+        self.app = app
+        self._inbox = asyncio.Queue()
+        self._outbox = asyncio.Queue()
+        self._task = None
+
+    async def startup(self):
+        self._task = asyncio.create_task(self.app({"type": "lifespan"}, self._inbox.get, self._outbox.put))
+        await self._inbox.put({"type": "lifespan.startup"})
+        await self._expect("lifespan.startup.complete")
+
+    async def shutdown(self):
+        await self._inbox.put({"type": "lifespan.shutdown"})
+        await self._expect("lifespan.shutdown.complete")
+        await self._task
+
+    async def _expect(self, kind):
+        message = await self._outbox.get()
+        if message["type"] != kind:
+            raise RuntimeError(f"lifespan: expected {kind}, got {message}")
+
+
+# -----------------------------------------------------
+# ROUTES
+# -----------------------------------------------------
+class Context:
+    def __init__(self, client, main, seed):
+        self.client = client
+        self.main = main
+        self.rng = random.Random(seed)
+        self._next_id = 10 ** 12       # ids for client-supplied children, above any generated id
+        self._ids = {}                 # path -> ids present when the run started
+
+    def new_id(self):
+        self._next_id += 1
+        return self._next_id
+
+    def ids(self, path, key):
+        if path not in self._ids:
+            self._ids[path] = sorted(
+                (d.get(key) for d in self.main.store.load(path) if isinstance(d.get(key), int)),
+            )
+            if not self._ids[path]:
+                raise RuntimeError(f"benchmark dataset has no documents in {path}")
+        return self._ids[path]
+
+    def pick(self, path, key):
+        return self.rng.choice(self.ids(path, key))
+
+    def now(self):
+        return datetime.now(timezone.utc).isoformat()
+
+    def artifact(self, rid):
+        return {"artifactId": self.new_id(), "releaseId": rid, "fileUrl": "https://bench/a.bin",
+                "hash": "sha256:bench", "size": 1024, "createdAt": self.now()}
+
+    def update_log(self, rid):
+        return {"updateLogId": self.new_id(), "clientId": 1, "releaseId": rid, "installedAt": self.now(),
+                "status": "completed", "client": {"clientId": 1, "name": "Bench"}}
+
+    def dependency(self, rid):
+        # point at an older release so the dependency graph stays acyclic
+        ids = self.ids("releases.json", "releaseId")
+        older = ids[:bisect_left(ids, rid)] or [i for i in ids if i != rid] or ids
+        target = self.rng.choice(older)
+        return {"releaseDependencyId": self.new_id(), "releaseId": rid, "dependsOnReleaseId": target,
+                "dependsOn": {"releaseId": target}}
+
+    def release(self):
+        return {"releaseId": self.new_id(), "productId": self.pick("products.json", "productId"),
+                "version": "9.9.9", "releaseType": "patch", "status": "draft", "releaseDate": self.now()}
+
+
+def _release(ctx):
+    return ctx.pick("releases.json", "releaseId")
+
+
+async def _created(ctx, method, path, body, key):
+    return (await ctx.client.json(method, path, body))[key]
+
+
+def routes(ctx):
+    """(name, build) pairs; build() returns (method, path, body, headers) for one timed request."""
+    m = ctx.main
+
+    async def get(path, headers=None):
+        return "GET", path, None, headers
+
+    async def cached_releases():
+        tag = (await ctx.client.request("GET", "/api/releases"))["headers"]["etag"]
+        return "GET", "/api/releases", None, {"If-None-Match": tag}
+
+    async def add_child(kind, make):
+        rid = _release(ctx)
+        return "POST", f"/api/releases/{rid}/{kind}", make(rid), None
+
+    async def delete_child(kind, make, key):
+        rid = _release(ctx)
+        doc = make(rid)
+        await ctx.client.json("POST", f"/api/releases/{rid}/{kind}", doc)
+        return "DELETE", f"/api/releases/{rid}/{kind}/{doc[key]}", None, None
+
+    async def bulk_add(kind, make, size=100):
+        return "POST", f"/api/bulk/{kind}", [make(_release(ctx)) for _ in range(size)], None
+
+    async def bulk_delete(kind, make, key, size=100):
+        docs = [make(_release(ctx)) for _ in range(size)]
+        await ctx.client.json("POST", f"/api/bulk/{kind}", docs)
+        return "POST", f"/api/bulk/{kind}/delete", [{"releaseId": d["releaseId"], "id": d[key]} for d in docs], None
+
+    async def delete_created(collection, body, key):
+        id = await _created(ctx, "POST", f"/api/{collection}", body, key)
+        return "DELETE", f"/api/{collection}/{id}", None, None
+
+    async def delete_release():
+        release = ctx.release()
+        await ctx.client.json("POST", "/api/releases", release)
+        return "DELETE", f"/api/releases/{release['releaseId']}", None, None
+
+    async def put_license():
+        lid = ctx.pick(m.LICENSES_PATH, "licenseId")
+        doc = dict(m.store.find(m.LICENSES_PATH, "licenseId", lid))
+        doc["status"] = ctx.rng.choice(["active", "suspended"])
+        return "PUT", f"/api/licenses/{lid}", doc, None
+
+    async def put_client():
+        cid = ctx.pick(m.CLIENTS_PATH, "clientId")
+        doc = dict(m.store.find(m.CLIENTS_PATH, "clientId", cid))
+        doc["billingInfo"] = "Updated by benchmark"
+        return "PUT", f"/api/clients/{cid}", doc, None
+
+    async def delete_notification():
+        created = await ctx.client.json("POST", "/api/settings/notifications", {"message": "bench"})
+        return "DELETE", f"/api/settings/notifications/{created['notification']['notificationId']}", None, None
+
+    async def assign():
+        return "POST", f"/clients/{ctx.new_id()}/assign/{ctx.pick(m.PRODUCTS_PATH, 'productId')}", None, None
+
+    async def assign_many(size=50):
+        return "POST", f"/clients/{ctx.new_id()}/assign", list(range(1, size + 1)), None
+
+    async def unassign():
+        id = await _created(ctx, "POST", f"/clients/{ctx.new_id()}/assign/1", None, "id")
+        return "DELETE", f"/client-products/{id}", None, None
+
+    async def unassign_many(size=50):
+        created = await ctx.client.json("POST", f"/clients/{ctx.new_id()}/assign", list(range(1, size + 1)))
+        return "POST", "/client-products/delete", [r["id"] for r in created["results"] if "id" in r], None
+
+    async def verification_job():
+        job = await ctx.client.json("POST", f"/api/releases/{_release(ctx)}/verify")
+        return "GET", f"/api/verification-jobs/{job['jobId']}", None, None
+
+    async def sync_delta():
+        return "GET", f"/api/sync?since={m.change_feed.token(max(0, m.change_feed.seq - 50))}", None, None
+
+    product = {"name": "Bench product", "sku": "BENCH"}
+    client = {"name": "Bench client", "email": "bench@example.com"}
+    license_doc = {"clientId": 1, "productId": 1, "type": "trial", "status": "active", "endDate": "2030-01-01"}
+
+    return [
+        ("GET /api/products", lambda: get("/api/products")),
+        ("POST /api/products", lambda: _static("POST", "/api/products", product)),
+        ("PUT /api/products/{product_id}", lambda: _put(ctx, m.PRODUCTS_PATH, "productId", "/api/products", {"name": "Renamed"})),
+        ("DELETE /api/products/{product_id}", lambda: delete_created("products", product, "productId")),
+
+        ("GET /api/releases", lambda: get("/api/releases")),
+        ("GET /api/releases (304)", cached_releases),
+        ("GET /api/releases (gzip)", lambda: get("/api/releases", {"Accept-Encoding": "gzip"})),
+        ("GET /api/releases?limit=50&sort=-releaseDate", lambda: get("/api/releases?limit=50&sort=-releaseDate")),
+        ("GET /api/releases?stream=1", lambda: get("/api/releases?stream=1")),
+        ("POST /api/releases", lambda: _static("POST", "/api/releases", ctx.release())),
+        ("DELETE /api/releases/{release_id}", delete_release),
+        ("POST /api/releases/{release_id}/artifacts", lambda: add_child("artifacts", ctx.artifact)),
+        ("DELETE /api/releases/{release_id}/artifacts/{artifact_id}", lambda: delete_child("artifacts", ctx.artifact, "artifactId")),
+        ("POST /api/releases/{release_id}/update-logs", lambda: add_child("update-logs", ctx.update_log)),
+        ("DELETE /api/releases/{release_id}/update-logs/{log_id}", lambda: delete_child("update-logs", ctx.update_log, "updateLogId")),
+        ("POST /api/releases/{release_id}/dependencies", lambda: add_child("dependencies", ctx.dependency)),
+        ("DELETE /api/releases/{release_id}/dependencies/{dep_id}", lambda: delete_child("dependencies", ctx.dependency, "releaseDependencyId")),
+        ("GET /api/releases/{release_id}/update-logs",
+         lambda: get(f"/api/releases/{_release(ctx)}/update-logs?offset=40&limit=20")),
+        ("GET /api/releases/{release_id}/install-order", lambda: get(f"/api/releases/{_release(ctx)}/install-order")),
+        ("GET /api/releases/{release_id}/dependents",
+         lambda: get(f"/api/releases/{_release(ctx)}/dependents?transitive=true")),
+        ("POST /api/releases/{release_id}/verify", lambda: _static("POST", f"/api/releases/{_release(ctx)}/verify", None)),
+        ("GET /api/verification-jobs", lambda: get("/api/verification-jobs")),
+        ("GET /api/verification-jobs/{job_id}", verification_job),
+
+        ("POST /api/bulk/artifacts", lambda: bulk_add("artifacts", ctx.artifact)),
+        ("POST /api/bulk/artifacts/delete", lambda: bulk_delete("artifacts", ctx.artifact, "artifactId")),
+        ("POST /api/bulk/update-logs", lambda: bulk_add("update-logs", ctx.update_log)),
+        ("POST /api/bulk/update-logs/delete", lambda: bulk_delete("update-logs", ctx.update_log, "updateLogId")),
+        ("POST /api/bulk/dependencies", lambda: bulk_add("dependencies", ctx.dependency)),
+        ("POST /api/bulk/dependencies/delete", lambda: bulk_delete("dependencies", ctx.dependency, "releaseDependencyId")),
+
+        ("GET /api/clients", lambda: get("/api/clients")),
+        ("GET /api/clients/{client_id}", lambda: get(f"/api/clients/{ctx.pick(m.CLIENTS_PATH, 'clientId')}")),
+        ("POST /api/clients", lambda: _static("POST", "/api/clients", dict(client))),
+        ("PUT /api/clients/{client_id}", put_client),
+        ("DELETE /api/clients/{client_id}", lambda: delete_created("clients", dict(client), "clientId")),
+
+        ("GET /api/sync", sync_delta),
+        ("GET /api/time", lambda: get("/api/time")),
+
+        ("GET /api/settings", lambda: get("/api/settings")),
+        ("POST /api/settings/user", lambda: _static("POST", "/api/settings/user", {"userId": 1, "name": "Bench"})),
+        ("POST /api/settings/notifications", lambda: _static("POST", "/api/settings/notifications", {"message": "bench"})),
+        ("DELETE /api/settings/notifications/{notification_id}", delete_notification),
+
+        ("GET /api/updates", lambda: get("/api/updates")),
+
+        ("GET /api/licenses", lambda: get("/api/licenses")),
+        ("GET /api/licenses/{license_id}", lambda: get(f"/api/licenses/{ctx.pick(m.LICENSES_PATH, 'licenseId')}")),
+        ("POST /api/licenses", lambda: _static("POST", "/api/licenses", dict(license_doc))),
+        ("PUT /api/licenses/{license_id}", put_license),
+        ("DELETE /api/licenses/{license_id}", lambda: delete_created("licenses", dict(license_doc), "licenseId")),
+        ("GET /api/licenses/{license_id}/audits",
+         lambda: get(f"/api/licenses/{ctx.pick(m.LICENSES_PATH, 'licenseId')}/audits?offset=40&limit=20")),
+        ("GET /api/licenses/expiring", lambda: get("/api/licenses/expiring?days=90")),
+        ("GET /api/licenses/counts", lambda: get("/api/licenses/counts?by=clientId&status=active")),
+        ("GET /api/clients/{client_id}/licenses",
+         lambda: get(f"/api/clients/{ctx.pick(m.CLIENTS_PATH, 'clientId')}/licenses")),
+        ("GET /api/products/{product_id}/licenses",
+         lambda: get(f"/api/products/{ctx.pick(m.PRODUCTS_PATH, 'productId')}/licenses")),
+        ("POST /api/licenses/expire", lambda: _static("POST", "/api/licenses/expire", None)),
+
+        ("GET /api/search", lambda: get("/api/search?q=cloud%20ins&limit=20")),
+        ("GET /api/search (fuzzy)", lambda: get("/api/search?q=sprngfield&type=client")),
+        ("GET /api/stats", lambda: get("/api/stats")),
+        ("POST /api/stats/rebuild", lambda: _static("POST", "/api/stats/rebuild", None)),
+        ("GET /metrics", lambda: get("/metrics")),
+        ("GET /metrics/profile", lambda: get("/metrics/profile")),
+        ("POST /metrics/profiler", lambda: _static("POST", "/metrics/profiler", {"enabled": False})),
+
+        ("GET /client-products", lambda: get("/client-products")),
+        ("GET /clients/{client_id}/products", lambda: get(f"/clients/{ctx.pick(m.CLIENTS_PATH, 'clientId')}/products")),
+        ("GET /products/{product_id}/clients", lambda: get(f"/products/{ctx.pick(m.PRODUCTS_PATH, 'productId')}/clients")),
+        ("POST /clients/{client_id}/assign/{product_id}", assign),
+        ("POST /clients/{client_id}/assign", assign_many),
+        ("DELETE /client-products/{id}", unassign),
+        ("POST /client-products/delete", unassign_many),
+    ]
+
+
+async def _static(method, path, body):
+    return method, path, body, None
+
+
+async def _put(ctx, path, key, url, changes):
+    id = ctx.pick(path, key)
+    return "PUT", f"{url}/{id}", changes, None
+
+
+# -----------------------------------------------------
+# MEASUREMENT
+# -----------------------------------------------------
+def _percentile(ordered, p):
+    if not ordered:
+        return None
+    rank = max(0, min(len(ordered) - 1, int(round(p / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[rank]
+
+
+async def measure(ctx, build, requests, concurrency):
+    prepared = [await build() for _ in range(requests)]
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, errors = [], 0
+
+    async def one(method, path, body, headers):
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            response = await ctx.client.request(method, path, body, headers)
+            latencies.append(time.perf_counter() - start)
+            if response["status"] >= 400:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(*r) for r in prepared))
+    wall = time.perf_counter() - start
+
+    ordered = sorted(latencies)
+    ms = lambda s: round(s * 1000, 3) if s is not None else None
+    return {
+        "requests": requests,
+        "errors": errors,
+        "mean_ms": ms(sum(ordered) / len(ordered)) if ordered else None,
+        "p50_ms": ms(_percentile(ordered, 50)),
+        "p95_ms": ms(_percentile(ordered, 95)),
+        "p99_ms": ms(_percentile(ordered, 99)),
+        "rps": round(requests / wall, 1) if wall else None,
+    }
+
+
+def _peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def _commit():
+    try:
+        rev = subprocess.run(["git", "rev-parse", "HEAD"], cwd=BACKEND, capture_output=True, text=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--", "."], cwd=BACKEND,
+                                    capture_output=True, text=True).stdout.strip())
+        return rev or None, dirty
+    except OSError:
+        return None, None
+
+
+async def run(args):
+    sys.path.insert(0, BACKEND)
+    import config
+
+    if config.STORAGE == "sqlite" and not os.path.exists(config.SQLITE_PATH):
+        import import_json
+        import_json.import_json(config.SQLITE_PATH)
+
+    import main
+
+    started = time.perf_counter()
+    lifespan = Lifespan(main.app)
+    await lifespan.startup()
+    startup_s = time.perf_counter() - started
+
+    ctx = Context(ASGIClient(main.app), main, args.seed)
+    dataset = {}
+    for path in main.DATA_PATHS:
+        data = main.store.load(path)
+        dataset[path] = len(data) if isinstance(data, list) else 1
+    rss_loaded = _peak_rss_mb()
+
+    results = {}
+    for name, build in routes(ctx):
+        if args.only and not any(s in name for s in args.only):
+            continue
+        results[name] = await measure(ctx, build, args.requests, args.concurrency)
+        r = results[name]
+        flag = "❌" if r["errors"] else "✅"
+        print(f"{flag} {name:<60} p50 {r['p50_ms']:>9} ms  p95 {r['p95_ms']:>9} ms  p99 {r['p99_ms']:>9} ms  {r['rps']:>9} req/s")
+
+    await lifespan.shutdown()
+
+    covered = {name.split(" ")[1].split("?")[0] for name in results}
+    missing = sorted(set(main.app.openapi()["paths"]) - covered - NOT_MEASURED)
+    if missing and not args.only:
+        print("❌ Routes without a benchmark:", ", ".join(missing))
+
+    commit, dirty = _commit()
+    return {
+        "format": RESULTS_FORMAT,
+        "commit": commit,
+        "dirty": dirty,
+        "createdAt": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "settings": {
+            "storage": config.STORAGE,
+            "persistence": config.PERSISTENCE,
+            "flushInterval": config.FLUSH_INTERVAL,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "seed": args.seed,
+        },
+        "dataset": dataset,
+        "startup_s": round(startup_s, 3),
+        "rss_after_load_mb": rss_loaded,
+        "peak_rss_mb": _peak_rss_mb(),
+        "routes": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data", default="bench-data", help="dataset directory (see benchmarks.generate)")
+    parser.add_argument("--requests", type=int, default=200, help="timed requests per route")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--only", action="append", help="only routes whose name contains this (repeatable)")
+    parser.add_argument("--in-place", action="store_true", help="run against --data itself instead of a copy")
+    parser.add_argument("--out", default="bench-results.json")
+    args = parser.parse_args()
+
+    out = os.path.abspath(args.out)
+    source = os.path.abspath(args.data)
+    scratch = None
+    if not args.in_place:
+        scratch = tempfile.mkdtemp(prefix="dashboard-bench-")
+        shutil.copytree(source, scratch, dirs_exist_ok=True)
+        source = scratch
+
+    # the backend resolves its data files against the working directory
+    os.chdir(source)
+    try:
+        results = asyncio.run(run(args))
+    finally:
+        if scratch:
+            shutil.rmtree(scratch, ignore_errors=True)
+
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"✅ Results written to {out} (peak RSS {results['peak_rss_mb']} MB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Startup benchmark: time and peak RSS of loading every collection from the
+JSON files versus from a binary snapshot (see binary_snapshot.py).
+
+    python -m benchmarks.generate --scale 100k --out bench-data
+    python -m benchmarks.startup --data bench-data --repeat 3 --out startup.json
+
+The dataset is copied to a scratch directory and a snapshot is built there.
+Each load runs in a fresh interpreter so peak RSS is its own; the median
+time of --repeat runs is reported. RSS before loading (interpreter plus the
+backend modules) is reported too, so the cost of the data itself is the
+difference.
+"""
+import argparse, json, os, shutil, subprocess, sys, tempfile, time
+from statistics import median
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+LOADERS = ("json", "binary")
+
+
+def child(loader: str):
+    """Load everything once in this process and print the measurements as JSON."""
+    sys.path.insert(0, BACKEND)
+    import config
+    from main import DATA_PATHS
+    from binary_snapshot import BinarySnapshot
+    from benchmarks.run import _peak_rss_mb
+    from store import CollectionStore
+
+    snapshot_path = config.BINARY_SNAPSHOT_PATH if loader == "binary" else None
+    store = CollectionStore(flush_interval=0, journal_path=None, snapshot_path=snapshot_path)
+    result = {}
+
+    if loader == "binary":
+        # one document of the largest collection, cold: open, check and decode its chunk only
+        largest = max(DATA_PATHS, key=lambda p: os.path.getsize(p) if os.path.exists(p) else 0)
+        started = time.perf_counter()
+        snapshot = BinarySnapshot(snapshot_path)
+        snapshot.record(largest, snapshot.count(largest) // 2)
+        result["one_record_ms"] = round((time.perf_counter() - started) * 1000, 3)
+        snapshot.close()
+
+    rss_before = _peak_rss_mb()
+    started = time.perf_counter()
+    store.preload(DATA_PATHS)
+    seconds = time.perf_counter() - started
+    result.update(seconds=round(seconds, 3), rss_before_mb=rss_before, peak_rss_mb=_peak_rss_mb())
+    print(json.dumps(result))
+
+
+def run(args, directory):
+    env = {**os.environ, "PYTHONPATH": BACKEND}
+    subprocess.run([sys.executable, os.path.join(BACKEND, "convert_snapshot.py"), "build"],
+                   cwd=directory, env=env, check=True, stdout=subprocess.DEVNULL)
+
+    import config
+    from binary_snapshot import BinarySnapshot
+    snapshot = BinarySnapshot(os.path.join(directory, config.BINARY_SNAPSHOT_PATH))
+    dataset = {path: entry["count"] for path, entry in snapshot.directory.items()}
+    snapshot_bytes = os.path.getsize(snapshot.path)
+    json_bytes = sum(os.path.getsize(os.path.join(directory, p)) for p in dataset)
+    snapshot.close()
+
+    loaders = {}
+    for loader in LOADERS:
+        runs = []
+        for _ in range(args.repeat):
+            out = subprocess.run(
+                [sys.executable, "-m", "benchmarks.startup", "--child", loader],
+                cwd=directory, env=env, check=True, capture_output=True, text=True,
+            ).stdout
+            runs.append(json.loads(out.strip().splitlines()[-1]))
+        loaders[loader] = {
+            "seconds": median(r["seconds"] for r in runs),
+            "rss_before_mb": median(r["rss_before_mb"] for r in runs),
+            "peak_rss_mb": median(r["peak_rss_mb"] for r in runs),
+            "runs": runs,
+        }
+        if loader == "binary":
+            loaders[loader]["one_record_ms"] = median(r["one_record_ms"] for r in runs)
+        r = loaders[loader]
+        print(f"✅ {loader:<7} load {r['seconds']:>8.3f} s   RSS {r['rss_before_mb']:>8} MB before, {r['peak_rss_mb']:>8} MB peak")
+
+    return {
+        "format": 1,
+        "dataset": dataset,
+        "json_bytes": json_bytes,
+        "snapshot_bytes": snapshot_bytes,
+        "loaders": loaders,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data", default="bench-data", help="dataset directory (see benchmarks.generate)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--out", default="startup-results.json")
+    parser.add_argument("--child", choices=LOADERS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(args.child)
+        return
+
+    sys.path.insert(0, BACKEND)
+    out = os.path.abspath(args.out)
+    scratch = tempfile.mkdtemp(prefix="dashboard-startup-")
+    try:
+        shutil.copytree(os.path.abspath(args.data), scratch, dirs_exist_ok=True)
+        results = run(args, scratch)
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    json_s, binary_s = results["loaders"]["json"]["seconds"], results["loaders"]["binary"]["seconds"]
+    print(f"✅ Results written to {out} (binary snapshot loads {json_s / binary_s:.1f}x faster)")
+
+
+if __name__ == "__main__":
+    main()
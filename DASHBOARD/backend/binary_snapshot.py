@@ -0,0 +1,191 @@
+import gc, json, marshal, mmap, os, struct, time, zlib
+
+MAGIC = b"DASHSNAP"
+FORMAT_VERSION = 1
+# magic, format version, marshal version, directory offset, length and crc32
+HEADER = struct.Struct("<8sHHQII")
+BLOCKS_START = 32
+# one per chunk of a list block: blob offset within the block, blob crc32
+CHUNK_ENTRY = struct.Struct("<QQ")
+# documents per marshal blob: a blob shares repeated strings (dict keys) the
+# way one json.loads call does, and a single document costs one blob to decode
+CHUNK = 256
+
+
+class SnapshotError(ValueError):
+    """The file is not a binary snapshot this process can read."""
+
+
+class BinarySnapshot:
+    """
+    Read side of a binary snapshot: every collection in one file, opened
+    with mmap and decoded on demand.
+
+    Layout: a header, one 8-byte aligned block per collection, then a JSON
+    directory ({path: {"offset", "length", "count", "kind", "crc",
+    "source"}}) that the header points to. A list block starts with a
+    table of (offset, crc32) per chunk of CHUNK documents, followed by one
+    marshal blob per chunk, so a single record can be decoded and checked
+    without touching the rest; an object block (settings.json) is one blob.
+    The directory crc covers the table, or the object blob.
+
+    marshal is specific to the Python release that wrote it: the header
+    records its version and a file written by another one is rejected, as
+    is one whose checksums do not match. Callers then fall back to the JSON
+    files, which stay the source of truth. "source" is the (mtime_ns, size)
+    of the JSON file a collection was taken from; fresh() compares it with
+    the file on disk.
+
+    Like the JSON files, snapshots are only read from the server's own data
+    directory: marshal must not be fed untrusted input.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._map)
+        try:
+            self.directory = self._parse()
+        except Exception:
+            self.close()
+            raise
+
+    def _parse(self):
+        if len(self._map) < BLOCKS_START:
+            raise SnapshotError(f"{self.path}: truncated header")
+        magic, version, codec, offset, length, crc = HEADER.unpack_from(self._map)
+        if magic != MAGIC:
+            raise SnapshotError(f"{self.path}: not a binary snapshot")
+        if version != FORMAT_VERSION or codec != marshal.version:
+            raise SnapshotError(
+                f"{self.path}: format {version} / marshal {codec}, "
+                f"this build reads format {FORMAT_VERSION} / marshal {marshal.version}"
+            )
+        raw = self._view[offset:offset + length]
+        if len(raw) != length or zlib.crc32(raw) != crc:
+            raise SnapshotError(f"{self.path}: directory checksum mismatch")
+        return json.loads(bytes(raw))["collections"]
+
+    def __contains__(self, path):
+        return path in self.directory
+
+    def fresh(self, path: str) -> bool:
+        """True if path is in the snapshot and its JSON file is unchanged since."""
+        entry = self.directory.get(path)
+        source = source_of(path)
+        return entry is not None and source is not None and list(source) == entry["source"]
+
+    def size(self, path: str) -> int:
+        return self.directory[path]["length"]
+
+    def count(self, path: str) -> int:
+        return self.directory[path]["count"]
+
+    def load(self, path: str):
+        """Decode a whole collection."""
+        entry = self.directory[path]
+        # decoding only allocates acyclic containers; a collection pass per
+        # few hundred of them is what makes json.loads of large files slow
+        enabled = gc.isenabled()
+        gc.disable()
+        try:
+            if entry["kind"] == "object":
+                return marshal.loads(self._checked(path, 0, entry["length"], entry["crc"]))
+            docs = []
+            for chunk in range(_chunks(entry)):
+                docs += self._chunk(path, chunk)
+            return docs
+        finally:
+            if enabled:
+                gc.enable()
+            self._drop_pages(entry)
+
+    def record(self, path: str, i: int):
+        """Decode document i of a list collection only."""
+        entry = self.directory[path]
+        if entry["kind"] != "list" or not 0 <= i < entry["count"]:
+            raise IndexError(i)
+        return self._chunk(path, i // CHUNK)[i % CHUNK]
+
+    def _chunk(self, path, chunk):
+        entry = self.directory[path]
+        table = self._checked(path, 0, (_chunks(entry) + 1) * CHUNK_ENTRY.size, entry["crc"])
+        start, crc = CHUNK_ENTRY.unpack_from(table, chunk * CHUNK_ENTRY.size)
+        end, _ = CHUNK_ENTRY.unpack_from(table, (chunk + 1) * CHUNK_ENTRY.size)
+        return marshal.loads(self._checked(path, start, end, crc))
+
+    def _checked(self, path, start, end, crc):
+        offset = self.directory[path]["offset"]
+        data = self._view[offset + start:offset + end]
+        if zlib.crc32(data) != crc:
+            raise SnapshotError(f"{self.path}: checksum mismatch in {path}")
+        return data
+
+    def _drop_pages(self, entry):
+        # the decoded copy is what stays resident; the mapped pages of a block
+        # are read again from the page cache if someone asks for it later
+        start = entry["offset"] - entry["offset"] % mmap.PAGESIZE
+        if hasattr(self._map, "madvise") and hasattr(mmap, "MADV_DONTNEED"):
+            self._map.madvise(mmap.MADV_DONTNEED, start, entry["offset"] + entry["length"] - start)
+
+    def close(self):
+        self._view.release()
+        self._map.close()
+
+
+def write_snapshot(path: str, collections: dict, sources: dict) -> int:
+    """
+    Write collections ({path: list or dict}) as a binary snapshot, swapped
+    in atomically, and return its size. sources maps each path to the
+    (mtime_ns, size) of the JSON file the data matches, or None.
+    Collections are encoded and written one at a time.
+    """
+    directory = {}
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(b"\0" * BLOCKS_START)
+        for name, data in collections.items():
+            if isinstance(data, list):
+                blobs = [marshal.dumps(data[i:i + CHUNK]) for i in range(0, len(data), CHUNK)]
+                table, position = bytearray(), (len(blobs) + 1) * CHUNK_ENTRY.size
+                for blob in blobs:
+                    table += CHUNK_ENTRY.pack(position, zlib.crc32(blob))
+                    position += len(blob)
+                table += CHUNK_ENTRY.pack(position, 0)
+                block, crc = bytes(table) + b"".join(blobs), zlib.crc32(table)
+                kind, count = "list", len(data)
+            else:
+                block = marshal.dumps(data)
+                block += b"\0" * (-len(block) % 8)
+                crc, kind, count = zlib.crc32(block), "object", 1
+            block += b"\0" * (-len(block) % 8)
+            source = sources.get(name)
+            directory[name] = {
+                "offset": f.tell(), "length": len(block), "count": count, "kind": kind,
+                "crc": crc, "source": list(source) if source else None,
+            }
+            f.write(block)
+
+        raw = json.dumps({"collections": directory, "createdAt": time.time()}).encode()
+        offset = f.tell()
+        f.write(raw)
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, marshal.version, offset, len(raw), zlib.crc32(raw)))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    return offset + len(raw)
+
+
+def source_of(path: str):
+    """(mtime_ns, size) of a JSON file, None if it does not exist."""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def _chunks(entry):
+    return -(-entry["count"] // CHUNK)
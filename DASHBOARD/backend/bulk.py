@@ -0,0 +1,36 @@
+from fastapi import HTTPException
+
+import config
+
+
+def check_size(items):
+    if len(items) > config.BULK_MAX_ITEMS:
+        raise HTTPException(413, f"At most {config.BULK_MAX_ITEMS} items per request")
+
+
+def report(results, ids, missing="Not found", empty=None, errors=None):
+    """
+    Per-item outcome of a store.batch() call, in request order.
+
+    A None result means the item matched nothing (`missing`); an empty dict
+    from delete_child means the parent exists but the child did not (`empty`).
+    `errors` ({position: (status, detail)}) marks items rejected before the batch.
+    """
+    items = []
+    errors = errors or {}
+    for i, (id, result) in enumerate(zip(ids, results)):
+        if i in errors:
+            status, detail = errors[i]
+            items.append({"index": i, "id": id, "status": status, "detail": detail})
+        elif result is None:
+            items.append({"index": i, "id": id, "status": 404, "detail": missing})
+        elif result == {} and empty:
+            items.append({"index": i, "id": id, "status": 404, "detail": empty})
+        else:
+            items.append({"index": i, "id": id, "status": 200})
+    return summary(items)
+
+
+def summary(items):
+    applied = sum(1 for x in items if x["status"] == 200)
+    return {"applied": applied, "failed": len(items) - applied, "results": items}
@@ -0,0 +1,137 @@
+import os
+
+# -----------------------------------------------------
+# STORAGE
+# -----------------------------------------------------
+# Seconds between background flushes of dirty collections.
+# 0 disables write-behind and writes every change through immediately.
+FLUSH_INTERVAL = float(os.environ.get("DASHBOARD_FLUSH_INTERVAL", "1.0"))
+
+# Flush early once this many writes are pending, regardless of the interval.
+FLUSH_BATCH = int(os.environ.get("DASHBOARD_FLUSH_BATCH", "100"))
+
+# "snapshot" rewrites whole JSON files on flush.
+# "journal" appends each mutation to JOURNAL_PATH and only rewrites the
+# JSON snapshots when the journal grows past JOURNAL_COMPACT_BYTES.
+PERSISTENCE = os.environ.get("DASHBOARD_PERSISTENCE", "snapshot")
+JOURNAL_PATH = os.environ.get("DASHBOARD_JOURNAL_PATH", "journal.log")
+JOURNAL_COMPACT_BYTES = int(os.environ.get("DASHBOARD_JOURNAL_COMPACT_BYTES", str(8 * 1024 * 1024)))
+JOURNAL_FSYNC = os.environ.get("DASHBOARD_JOURNAL_FSYNC", "0") == "1"
+
+# Set to 1 when several worker processes share the data directory
+# (uvicorn --workers N, or replicas on one host). JSON collections are then
+# persisted through SHARED_LOG_PATH instead: every mutation is appended
+# under a file lock and each worker replays the others' mutations, and the
+# snapshots are rewritten once the log passes JOURNAL_COMPACT_BYTES. With
+# sqlite, workers follow a change table instead. See shared_store.py.
+SHARED = os.environ.get("DASHBOARD_SHARED", "0") == "1"
+SHARED_LOG_PATH = os.environ.get("DASHBOARD_SHARED_LOG_PATH", "shared.log")
+SHARED_LOCK_PATH = os.environ.get("DASHBOARD_SHARED_LOCK_PATH", "dashboard.lock")
+
+# Seconds between checks for other workers' changes while a worker is idle
+# (every request checks before it runs).
+SHARED_POLL_INTERVAL = float(os.environ.get("DASHBOARD_SHARED_POLL_INTERVAL", "0.2"))
+
+# Changes the sqlite change table keeps for workers to catch up from.
+SHARED_CHANGES_KEEP = int(os.environ.get("DASHBOARD_SHARED_CHANGES_KEEP", "10000"))
+
+# Set to 1 to keep a binary snapshot of all JSON collections next to them
+# (written on shutdown, or with `python convert_snapshot.py build`). At
+# startup each collection whose JSON file is unchanged since is decoded
+# from it instead of parsed, which is several times faster. The JSON files
+# stay the source of truth. See binary_snapshot.py.
+BINARY_SNAPSHOT = os.environ.get("DASHBOARD_BINARY_SNAPSHOT", "0") == "1"
+BINARY_SNAPSHOT_PATH = os.environ.get("DASHBOARD_BINARY_SNAPSHOT_PATH", "dashboard.snap")
+
+# Storage backend: "json" (the files above) or "sqlite".
+# Run `python import_json.py` once before switching to sqlite.
+STORAGE = os.environ.get("DASHBOARD_STORAGE", "json")
+SQLITE_PATH = os.environ.get("DASHBOARD_SQLITE_PATH", "dashboard.db")
+
+# -----------------------------------------------------
+# RESPONSES
+# -----------------------------------------------------
+# Documents encoded per chunk when a list endpoint streams its response.
+STREAM_CHUNK_SIZE = int(os.environ.get("DASHBOARD_STREAM_CHUNK_SIZE", "200"))
+
+# gzip (and brotli/zstd when installed) for the large list responses, by
+# Accept-Encoding; bodies below COMPRESSION_MIN_BYTES are sent as they are.
+COMPRESSION = os.environ.get("DASHBOARD_COMPRESSION", "1") == "1"
+COMPRESSION_MIN_BYTES = int(os.environ.get("DASHBOARD_COMPRESSION_MIN_BYTES", "1024"))
+
+# Encoded (and compressed) list bodies kept per collection version; 0 turns the cache off.
+COMPRESSION_CACHE_BYTES = int(os.environ.get("DASHBOARD_COMPRESSION_CACHE_BYTES", str(64 * 1024 * 1024)))
+
+# -----------------------------------------------------
+# BULK ENDPOINTS
+# -----------------------------------------------------
+# Largest array a bulk endpoint accepts in one request.
+BULK_MAX_ITEMS = int(os.environ.get("DASHBOARD_BULK_MAX_ITEMS", "10000"))
+
+# -----------------------------------------------------
+# CHANGE FEED
+# -----------------------------------------------------
+# Changes kept in memory for /api/events clients resuming with Last-Event-ID.
+EVENTS_BUFFER = int(os.environ.get("DASHBOARD_EVENTS_BUFFER", "1000"))
+
+# Seconds of silence before an idle event stream gets a keep-alive comment.
+EVENTS_HEARTBEAT = float(os.environ.get("DASHBOARD_EVENTS_HEARTBEAT", "15"))
+
+# Sequence numbers a delete stays in /api/sync as a tombstone; a token older
+# than the newest expired tombstone gets 410 and the client syncs in full.
+SYNC_TOMBSTONES_KEEP = int(os.environ.get("DASHBOARD_SYNC_TOMBSTONES_KEEP", "100000"))
+
+# -----------------------------------------------------
+# INSTRUMENTATION
+# -----------------------------------------------------
+# Seconds between event-loop lag probes (reported on /metrics).
+LOOP_LAG_INTERVAL = float(os.environ.get("DASHBOARD_LOOP_LAG_INTERVAL", "0.5"))
+
+# Start the sampling profiler at boot; it can also be toggled through
+# POST /metrics/profiler while the server runs.
+PROFILER = os.environ.get("DASHBOARD_PROFILER", "0") == "1"
+PROFILER_INTERVAL = float(os.environ.get("DASHBOARD_PROFILER_INTERVAL", "0.01"))
+
+# -----------------------------------------------------
+# LICENSES
+# -----------------------------------------------------
+# Seconds between sweeps that mark active licenses past their endDate as
+# expired (with an audit entry). 0 disables the background sweep.
+LICENSE_SWEEP_INTERVAL = float(os.environ.get("DASHBOARD_LICENSE_SWEEP_INTERVAL", "3600"))
+
+# -----------------------------------------------------
+# HISTORY TIERING
+# -----------------------------------------------------
+# License audits and release update logs keep their newest entries inline;
+# older ones move to append-only segments under HISTORY_DIR.
+HISTORY_DIR = os.environ.get("DASHBOARD_HISTORY_DIR", "archive")
+HISTORY_HOT_ENTRIES = int(os.environ.get("DASHBOARD_HISTORY_HOT_ENTRIES", "50"))
+
+# A list is archived once it holds this many entries beyond the inline ones,
+# so the archive is appended in chunks.
+HISTORY_ARCHIVE_BATCH = int(os.environ.get("DASHBOARD_HISTORY_ARCHIVE_BATCH", "25"))
+
+# Seconds between archiving passes. 0 disables tiering.
+HISTORY_ARCHIVE_INTERVAL = float(os.environ.get("DASHBOARD_HISTORY_ARCHIVE_INTERVAL", "5"))
+
+# -----------------------------------------------------
+# ARTIFACT VERIFICATION
+# -----------------------------------------------------
+# Local copies of artifact files, laid out by fileUrl host and path
+# (https://example.com/a/b.bin -> ARTIFACT_STORE_DIR/example.com/a/b.bin).
+ARTIFACT_STORE_DIR = os.environ.get("DASHBOARD_ARTIFACT_STORE_DIR", "artifact-store")
+
+# Digests per (path, mtime, size), so unchanged files are not hashed again.
+ARTIFACT_HASH_CACHE = os.environ.get("DASHBOARD_ARTIFACT_HASH_CACHE", "artifact-hashes.json")
+
+# Hashing processes, and bytes read per chunk of a file.
+ARTIFACT_VERIFY_WORKERS = int(os.environ.get("DASHBOARD_ARTIFACT_VERIFY_WORKERS", str(os.cpu_count() or 1)))
+ARTIFACT_HASH_CHUNK = int(os.environ.get("DASHBOARD_ARTIFACT_HASH_CHUNK", str(1024 * 1024)))
+
+# Replace identical verified artifact files by hard links to one
+# content-addressed blob. Off by default: linked files share an inode, so a
+# tool writing into one of them in place changes them all.
+ARTIFACT_DEDUP = os.environ.get("DASHBOARD_ARTIFACT_DEDUP", "0") == "1"
+
+# Verification jobs kept in memory for progress and results.
+ARTIFACT_JOBS_KEEP = int(os.environ.get("DASHBOARD_ARTIFACT_JOBS_KEEP", "50"))
@@ -0,0 +1,85 @@
+"""
+Convert between the JSON data files and a binary snapshot.
+
+    python convert_snapshot.py build  [--snapshot dashboard.snap]
+    python convert_snapshot.py export [--snapshot dashboard.snap] [--out DIR]
+    python convert_snapshot.py info   [--snapshot dashboard.snap]
+
+build parses the JSON files in the backend directory and writes a snapshot
+the server reads at startup with DASHBOARD_BINARY_SNAPSHOT=1 (the server
+also writes one itself on shutdown). export writes every collection of a
+snapshot back out as JSON files, e.g. to restore them from one; stop the
+server before exporting into its own directory. build can run while the
+server keeps serving: a snapshot only counts for collections whose JSON file
+has not changed since it was built.
+"""
+import argparse, json, os, time
+
+import config
+from binary_snapshot import BinarySnapshot, source_of, write_snapshot
+from main import DATA_PATHS
+from store import CollectionStore
+
+
+def build(snapshot_path: str):
+    source = CollectionStore(flush_interval=0, journal_path=None, snapshot_path=None)
+    collections, sources = {}, {}
+    for path in DATA_PATHS:
+        # the file as it is on disk; a journal on top is replayed at startup as usual
+        before = source_of(path)
+        if before is None:
+            continue
+        data = source.load(path)
+        if source_of(path) != before:
+            print(f"❌ {path} changed while reading it, left out")
+            continue
+        collections[path], sources[path] = data, before
+
+    size = write_snapshot(snapshot_path, collections, sources)
+    for path, data in collections.items():
+        print(f"✅ {path}: {len(data) if isinstance(data, list) else 1} records")
+    print(f"✅ Wrote {snapshot_path} ({size} bytes)")
+
+
+def export(snapshot_path: str, out: str):
+    snapshot = BinarySnapshot(snapshot_path)
+    try:
+        for path in snapshot.directory:
+            target = os.path.join(out, path)
+            os.makedirs(os.path.dirname(target) or ".", exist_ok=True)
+            tmp = f"{target}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(snapshot.load(path), f, indent=2)
+            os.replace(tmp, target)
+            print(f"✅ {target}: {snapshot.count(path)} records")
+    finally:
+        snapshot.close()
+
+
+def info(snapshot_path: str):
+    snapshot = BinarySnapshot(snapshot_path)
+    try:
+        for path, entry in snapshot.directory.items():
+            started = time.perf_counter()
+            snapshot.load(path)
+            state = "fresh" if snapshot.fresh(path) else "stale"
+            print(
+                f"{path}: {entry['count']} records, {entry['length']} bytes, {state}, "
+                f"decoded in {time.perf_counter() - started:.3f}s"
+            )
+    finally:
+        snapshot.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["build", "export", "info"])
+    parser.add_argument("--snapshot", default=config.BINARY_SNAPSHOT_PATH)
+    parser.add_argument("--out", default=".", help="directory export writes the JSON files into")
+    args = parser.parse_args()
+    if args.command == "build":
+        build(args.snapshot)
+    elif args.command == "export":
+        export(args.snapshot, args.out)
+    else:
+        info(args.snapshot)
@@ -0,0 +1,114 @@
+import asyncio, fcntl, os, threading
+
+import config
+
+
+class ProcessLockBusy(Exception):
+    """Raised instead of blocking the event loop on the cross-process lock."""
+
+
+class ProcessLock:
+    """
+    Exclusive lock between worker processes, a flock() on a lock file.
+
+    The lock is held by a process, not by a thread or a request: while one
+    worker holds it, its other writers only count up (they are serialized by
+    that worker's own locks), and the file lock is released when the count
+    drops back to zero. Other workers block until then.
+
+    Waiting happens outside the internal mutex, so threads of this process
+    that already hold the lock are never stuck behind one that waits. On the
+    event loop acquire() does not wait at all: it raises ProcessLockBusy and
+    run_io() takes the lock in a thread and calls again.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._fd = None
+        self._wait_fd = None
+        self._depth = 0
+        self._mutex = threading.Lock()
+
+    @property
+    def held(self) -> bool:
+        return self._depth > 0
+
+    def acquire(self, blocking: bool = True) -> bool:
+        """Take the lock; blocking=False returns False if another process holds it."""
+        while True:
+            with self._mutex:
+                if self._depth == 0:
+                    if self._fd is None:
+                        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+                        self._wait_fd = os.open(self.path, os.O_RDWR)
+                    try:
+                        fcntl.flock(self._fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except BlockingIOError:
+                        if not blocking:
+                            return False
+                        if _on_event_loop():
+                            raise ProcessLockBusy(self.path)
+                        wait_fd = self._wait_fd
+                    else:
+                        self._depth = 1
+                        return True
+                else:
+                    self._depth += 1
+                    return True
+            # a second descriptor of the file: it only gets a shared lock once
+            # the holder lets go; then try again (someone else may be faster)
+            fcntl.flock(wait_fd, fcntl.LOCK_SH)
+            fcntl.flock(wait_fd, fcntl.LOCK_UN)
+
+    def release(self):
+        with self._mutex:
+            self._depth -= 1
+            if self._depth == 0:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+def _on_event_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+class Leadership:
+    """
+    Picks the one worker that runs the background jobs (license sweep,
+    history archiving): whoever holds a non-blocking flock on `path`. The
+    lock dies with its process, so another worker takes over on its next
+    attempt. Without shared mode there is only one worker, which always leads.
+    """
+
+    def __init__(self, path: str, enabled: bool):
+        self.path = path
+        self.enabled = enabled
+        self._fd = None
+        self._held = False
+
+    def held(self) -> bool:
+        if not self.enabled or self._held:
+            return True
+        if self._fd is None:
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(self._fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return False
+        self._held = True
+        print(f"✅ Worker {os.getpid()} runs the background jobs")
+        return True
+
+
+process_lock = ProcessLock(config.SHARED_LOCK_PATH)
+leadership = Leadership(f"{config.SHARED_LOCK_PATH}.leader", enabled=config.SHARED)
@@ -0,0 +1,180 @@
+import asyncio, json, threading
+from bisect import bisect_right
+from collections import deque
+
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+
+import config
+from store import store
+from versions import versions
+
+
+class ChangeFeed:
+    """
+    Sequence-numbered change events built from store change events, kept in
+    a bounded replay buffer so a reconnecting client can resume where it
+    stopped.
+
+    Event ids are "<epoch>:<seq>"; the epoch changes on restart, and a client
+    holding an id from another epoch or one that already fell out of the
+    buffer is told to reset (refetch) instead of silently missing changes.
+
+    With a shared backend a change keeps the global sequence number of its
+    store event, so an id means the same on every worker (numbers then skip
+    the changes to collections outside the feed).
+    """
+
+    def __init__(self, entities: dict, size: int = config.EVENTS_BUFFER):
+        self.entities = entities          # collection path -> entity type
+        self._buffer = deque(maxlen=max(1, size))
+        self._seq = 0
+        self._floor = 0                   # changes up to here may be missing from the buffer
+        self._lock = threading.Lock()
+        self._waiters = set()             # (loop, asyncio.Event) of connected streams
+        self._listeners = []
+
+    def subscribe(self, listener):
+        """Call listener(change) for every numbered change, inside the store's write path."""
+        self._listeners.append(listener)
+
+    @property
+    def seq(self) -> int:
+        return self._seq
+
+    # -------------------------
+    # PUBLISH
+    # -------------------------
+    def on_change(self, event):
+        entity = self.entities.get(event["path"])
+        if entity is None:
+            return
+        change = _describe(entity, event)
+        with self._lock:
+            if not store.shared:
+                self._seq += 1
+            elif event.get("seq") is None:
+                # reloaded from the snapshots: changes before the base may have been missed
+                change["seq"] = store.base_seq
+                self._floor = max(self._floor, store.base_seq)
+            elif event["seq"] > self._seq:
+                if not self._seq:
+                    # the first change this worker sees: it only knows those after the base
+                    self._floor = store.base_seq
+                self._seq = event["seq"]
+            else:
+                # replayed into a collection loaded late; clients were given newer ids already
+                return
+            if "seq" not in change:
+                change["seq"] = self._seq
+                if len(self._buffer) == self._buffer.maxlen:
+                    self._floor = self._buffer[0]["seq"]
+                self._buffer.append(change)
+            for listener in self._listeners:
+                listener(change)
+            waiters = list(self._waiters)
+        for loop, wake in waiters:
+            loop.call_soon_threadsafe(wake.set)
+
+    # -------------------------
+    # READ
+    # -------------------------
+    def since(self, seq: int):
+        """Changes after `seq`, or None when some of them are no longer buffered."""
+        with self._lock:
+            if seq >= self._seq:
+                return []
+            if seq < self._floor:
+                return None
+            start = bisect_right(self._buffer, seq, key=lambda c: c["seq"])
+            return [self._buffer[i] for i in range(start, len(self._buffer))]
+
+    def parse_token(self, token):
+        """Sequence number a client may resume from, or None if the token is from another epoch."""
+        if token is None or token == "":
+            return self._seq
+        epoch, _, seq = token.rpartition(":")
+        if epoch and epoch != versions.epoch:
+            return None
+        try:
+            return int(seq)
+        except ValueError:
+            return None
+
+    def token(self, seq: int) -> str:
+        return f"{versions.epoch}:{seq}"
+
+    # -------------------------
+    # SERVER-SENT EVENTS
+    # -------------------------
+    def stream(self, request: Request, since=None, docs=False):
+        token = request.headers.get("last-event-id") or since
+        return StreamingResponse(
+            self._events(request, self.parse_token(token), docs),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+    async def _events(self, request, seq, docs):
+        wake = asyncio.Event()
+        waiter = (asyncio.get_running_loop(), wake)
+        with self._lock:
+            self._waiters.add(waiter)
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                changes = self.since(seq) if seq is not None else None
+                if changes is None:
+                    # gap: the client has to refetch, then follow from here
+                    seq = self._seq
+                    yield _sse("reset", {"seq": seq}, self.token(seq))
+                    continue
+
+                for change in changes:
+                    payload = change if docs else {k: v for k, v in change.items() if k != "doc"}
+                    yield _sse("change", payload, self.token(change["seq"]))
+                if changes:
+                    seq = changes[-1]["seq"]
+                    continue
+
+                wake.clear()
+                if self._seq > seq:
+                    continue
+                try:
+                    await asyncio.wait_for(wake.wait(), config.EVENTS_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        return
+                    yield ": keep-alive\n\n"
+        finally:
+            with self._lock:
+                self._waiters.discard(waiter)
+
+
+def _describe(entity, event):
+    op = event["op"]
+    change = {"entity": entity, "id": event.get("id"), "op": op}
+
+    if op == "upsert":
+        change["lastModified"] = event["doc"].get("lastModified")
+        change["doc"] = event["doc"]
+    elif op in ("upsert_child", "delete_child"):
+        # the parent changed: report it, with the child that caused it
+        change["op"] = "update"
+        change["lastModified"] = (event.get("touch") or {}).get("lastModified")
+        change["child"] = {
+            "field": event["field"],
+            "id": event["doc"].get(event["childKey"]) if op == "upsert_child" else event["childId"],
+            "op": "upsert" if op == "upsert_child" else "delete",
+        }
+        if op == "upsert_child":
+            change["doc"] = event["doc"]
+    elif op == "set":
+        change["op"] = "update"
+        change["field"] = event["field"]
+        change["doc"] = {event["field"]: event["value"]}
+    return change
+
+
+def _sse(kind, data, id):
+    return f"id: {id}\nevent: {kind}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
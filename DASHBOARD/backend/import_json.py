@@ -0,0 +1,46 @@
+"""
+One-shot import of the JSON data files into the SQLite storage backend.
+
+    python import_json.py [--db dashboard.db]
+
+Run it from the backend directory while the JSON-backed server keeps serving.
+The database is built under a temporary name and swapped in atomically; then
+restart the server with DASHBOARD_STORAGE=sqlite.
+"""
+import argparse, os
+
+import config
+from journal import read_records
+from main import DATA_PATHS
+from sqlite_store import SqliteStore
+from store import CollectionStore
+
+
+def import_json(db_path: str):
+    source = CollectionStore(flush_interval=0, journal_path=None)
+    source.preload(DATA_PATHS)
+
+    # a journaled server may not have compacted its latest changes yet
+    source.replay(read_records(config.JOURNAL_PATH))
+
+    tmp = f"{db_path}.importing"
+    for leftover in (tmp, f"{tmp}-wal", f"{tmp}-shm"):
+        if os.path.exists(leftover):
+            os.remove(leftover)
+
+    target = SqliteStore(tmp)
+    for path in DATA_PATHS:
+        data = source.load(path)
+        target.save(path, data)
+        count = len(data) if isinstance(data, list) else 1
+        print(f"✅ {path}: {count} records")
+    target.stop()
+
+    os.replace(tmp, db_path)
+    print(f"✅ Imported into {db_path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default=config.SQLITE_PATH)
+    import_json(parser.parse_args().db)
@@ -0,0 +1,53 @@
+def id_key(value):
+    # ids arrive as ints from the API but some older records hold strings,
+    # so every index is keyed on the text form
+    return None if value is None else str(value)
+
+
+class PositionIndex:
+    """
+    id -> list position maps for resident lists (top-level collections and
+    the lists nested in their documents), kept in step with every mutation
+    so lookups and in-place replacements skip the linear scan.
+
+    Maps are built on first use and keyed by the list object itself.
+    """
+
+    def __init__(self):
+        self._maps = {}   # id(list) -> (list, key, {id_key: position})
+
+    def lookup(self, items: list, key: str) -> dict:
+        entry = self._maps.get(id(items))
+        if entry is None or entry[0] is not items or entry[1] != key:
+            entry = (items, key, {id_key(x.get(key)): i for i, x in enumerate(items)})
+            self._maps[id(items)] = entry
+        return entry[2]
+
+    def position(self, items: list, key: str, value) -> int:
+        return self.lookup(items, key).get(id_key(value), -1)
+
+    def appended(self, items: list, key: str):
+        self.lookup(items, key)[id_key(items[-1].get(key))] = len(items) - 1
+
+    def removed(self, items: list, key: str, pos: int, doc: dict):
+        positions = self.lookup(items, key)
+        positions.pop(id_key(doc.get(key)), None)
+        for i in range(pos, len(items)):
+            positions[id_key(items[i].get(key))] = i
+        self.forget(doc)
+
+    def replaced(self, old: dict):
+        self.forget(old)
+
+    def invalidate(self, items: list):
+        self._maps.pop(id(items), None)
+
+    def forget(self, doc):
+        """Drop the maps of lists nested in a document that left the collection."""
+        if isinstance(doc, dict):
+            for value in doc.values():
+                if isinstance(value, list):
+                    self.invalidate(value)
+
+    def clear(self):
+        self._maps.clear()
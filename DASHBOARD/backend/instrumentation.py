@@ -0,0 +1,92 @@
+import asyncio, contextvars, functools, inspect, time
+
+from fastapi.exceptions import RequestValidationError
+from fastapi.routing import APIRoute
+
+import config
+from metrics import LOOP_LAG_LAST, LOOP_LAG_SECONDS, PHASE_SECONDS, REQUEST_SECONDS
+
+# endpoint start / end times of the request being handled
+_endpoint_times = contextvars.ContextVar("endpoint_times", default=None)
+
+
+class InstrumentedRoute(APIRoute):
+    """
+    APIRoute that records per-route latency and splits it into phases:
+    validate (everything FastAPI does before the endpoint runs), handler
+    (the endpoint itself) and serialize (turning its result into a response).
+
+    Use as the route_class of the app's router and of every APIRouter.
+    """
+
+    def __init__(self, path, endpoint, **kwargs):
+        super().__init__(path, _timed_endpoint(endpoint), **kwargs)
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+        route = self.path
+
+        async def timed_handler(request):
+            times = {}
+            token = _endpoint_times.set(times)
+            start = time.perf_counter()
+            status = 500
+            try:
+                response = await handler(request)
+                status = response.status_code
+                return response
+            except RequestValidationError:
+                status = 422
+                raise
+            except Exception as e:
+                status = getattr(e, "status_code", 500)
+                raise
+            finally:
+                end = time.perf_counter()
+                _endpoint_times.reset(token)
+                REQUEST_SECONDS.observe(end - start, method=request.method, route=route, status=status)
+                if "start" in times:
+                    labels = {"method": request.method, "route": route}
+                    PHASE_SECONDS.observe(times["start"] - start, phase="validate", **labels)
+                    PHASE_SECONDS.observe(times.get("end", end) - times["start"], phase="handler", **labels)
+                    if "end" in times:
+                        PHASE_SECONDS.observe(end - times["end"], phase="serialize", **labels)
+
+        return timed_handler
+
+
+def _timed_endpoint(endpoint):
+    # functools.wraps keeps the signature FastAPI reads the parameters from
+    if inspect.iscoroutinefunction(endpoint):
+        @functools.wraps(endpoint)
+        async def timed(*args, **kwargs):
+            times = _endpoint_times.get()
+            if times is not None:
+                times["start"] = time.perf_counter()
+            try:
+                return await endpoint(*args, **kwargs)
+            finally:
+                if times is not None:
+                    times["end"] = time.perf_counter()
+    else:
+        @functools.wraps(endpoint)
+        def timed(*args, **kwargs):
+            times = _endpoint_times.get()
+            if times is not None:
+                times["start"] = time.perf_counter()
+            try:
+                return endpoint(*args, **kwargs)
+            finally:
+                if times is not None:
+                    times["end"] = time.perf_counter()
+    return timed
+
+
+async def watch_loop_lag(interval: float = config.LOOP_LAG_INTERVAL):
+    """Sleep `interval` seconds at a time and record how late each wake-up is."""
+    while True:
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lag = max(0.0, time.perf_counter() - start - interval)
+        LOOP_LAG_SECONDS.observe(lag)
+        LOOP_LAG_LAST.set(lag)
@@ -0,0 +1,145 @@
+import threading
+from bisect import bisect_left, bisect_right, insort
+
+from indexes import id_key
+from store import store
+
+GROUPS = ("status", "clientId", "productId")
+
+
+class LicenseIndex:
+    """
+    Secondary indexes over licenses.json, kept up to date from store change
+    events: licenses sorted by endDate, and license ids grouped by status,
+    clientId and productId (with per-status counts per group).
+
+    Expiry windows are a bisect into the endDate order and counts are read
+    straight off the groups, so neither scans the collection. endDate is
+    compared on its date part (YYYY-MM-DD); licenses without one (perpetual)
+    never expire.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.RLock()
+        self._stale = True
+        self._changes = 0     # relevant events seen, to detect writes racing a rebuild
+
+        self._rows = {}       # licenseId -> {"endDate", "status", "clientId", "productId", "id"}
+        self._by_end = []     # ascending (endDate, licenseId)
+        self._groups = {}     # field -> value -> {licenseId}
+        self._counts = {}     # field -> value -> {status: count}
+
+    # -------------------------
+    # READ
+    # -------------------------
+    def _ready(self):
+        while self._stale:
+            # read storage without holding our lock, as UpdatesView does
+            seen = self._changes
+            licenses = store.load(self.path)
+            with self._lock:
+                if self._changes == seen:
+                    self._rebuild(licenses)
+
+    def ending(self, start=None, end=None, status=None) -> list:
+        """Ids of licenses whose endDate lies in [start, end], soonest first."""
+        self._ready()
+        with self._lock:
+            lo = 0 if start is None else bisect_left(self._by_end, (start,))
+            hi = len(self._by_end) if end is None else bisect_right(self._by_end, (end, "￿"))
+            return [
+                self._rows[lid]["id"] for _, lid in self._by_end[lo:hi]
+                if status is None or self._rows[lid]["status"] == status
+            ]
+
+    def ids(self, field: str, value, status=None) -> list:
+        """Ids of the licenses whose `field` (clientId / productId / status) equals value."""
+        self._ready()
+        with self._lock:
+            members = self._groups[field].get(id_key(value), ())
+            return [
+                self._rows[lid]["id"] for lid in members
+                if status is None or self._rows[lid]["status"] == status
+            ]
+
+    def counts(self, field: str, status=None) -> dict:
+        """{value: number of licenses} grouped by field, optionally for one status only."""
+        self._ready()
+        with self._lock:
+            return {
+                value: (sum(by_status.values()) if status is None else by_status.get(status, 0))
+                for value, by_status in self._counts[field].items()
+                if status is None or by_status.get(status)
+            }
+
+    # -------------------------
+    # MAINTENANCE
+    # -------------------------
+    def on_change(self, event):
+        if event["path"] != self.path:
+            return
+        with self._lock:
+            self._changes += 1
+            if self._stale:
+                return
+            if event["op"] == "replace":
+                self._stale = True
+                return
+            self._remove(id_key(event.get("id")))
+            if event["op"] == "upsert":
+                self._add(event["result"])
+            elif event["op"] != "delete":
+                # child ops (audits) only carry the child, so read the license back
+                license_obj = store.find(self.path, "licenseId", event.get("id"))
+                if license_obj:
+                    self._add(license_obj)
+
+    def _rebuild(self, licenses):
+        self._rows, self._by_end = {}, []
+        self._groups = {f: {} for f in GROUPS}
+        self._counts = {f: {} for f in GROUPS}
+        for license_obj in licenses:
+            self._add(license_obj)
+        self._stale = False
+
+    def _add(self, license_obj):
+        lid = id_key(license_obj.get("licenseId"))
+        row = {
+            "id": license_obj.get("licenseId"),
+            "endDate": _day(license_obj.get("endDate")),
+            "status": license_obj.get("status"),
+            "clientId": id_key(license_obj.get("clientId")),
+            "productId": id_key(license_obj.get("productId")),
+        }
+        self._rows[lid] = row
+        if row["endDate"]:
+            insort(self._by_end, (row["endDate"], lid))
+        for field in GROUPS:
+            value = id_key(row[field])
+            self._groups[field].setdefault(value, set()).add(lid)
+            by_status = self._counts[field].setdefault(value, {})
+            by_status[row["status"]] = by_status.get(row["status"], 0) + 1
+
+    def _remove(self, lid):
+        row = self._rows.pop(lid, None)
+        if row is None:
+            return
+        if row["endDate"]:
+            del self._by_end[bisect_left(self._by_end, (row["endDate"], lid))]
+        for field in GROUPS:
+            value = id_key(row[field])
+            members = self._groups[field][value]
+            members.discard(lid)
+            by_status = self._counts[field][value]
+            by_status[row["status"]] -= 1
+            if not by_status[row["status"]]:
+                del by_status[row["status"]]
+            if not members:
+                del self._groups[field][value]
+                del self._counts[field][value]
+
+
+def _day(value):
+    # "2024-12-31" and "2024-12-31T00:00:00Z" both index as 2024-12-31
+    return value[:10] if isinstance(value, str) and value else None
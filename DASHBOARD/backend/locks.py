@@ -0,0 +1,149 @@
+import asyncio, weakref
+from contextlib import AsyncExitStack, asynccontextmanager
+
+import config
+from coordination import ProcessLockBusy, process_lock
+from store import store
+
+
+class RWLock:
+    """
+    asyncio reader/writer lock: any number of readers or one writer.
+
+    Waiting writers block new readers, so a steady stream of GETs cannot
+    starve a write.
+    """
+
+    def __init__(self):
+        self._cond = asyncio.Condition()
+        self._readers = 0
+        self._writer = False
+        self._writers_waiting = 0
+
+    @asynccontextmanager
+    async def read(self):
+        async with self._cond:
+            await self._cond.wait_for(lambda: not self._writer and not self._writers_waiting)
+            self._readers += 1
+        try:
+            yield
+        finally:
+            async with self._cond:
+                self._readers -= 1
+                self._cond.notify_all()
+
+    @asynccontextmanager
+    async def write(self):
+        async with self._cond:
+            self._writers_waiting += 1
+            try:
+                await self._cond.wait_for(lambda: not self._writer and not self._readers)
+            finally:
+                self._writers_waiting -= 1
+            self._writer = True
+        try:
+            yield
+        finally:
+            async with self._cond:
+                self._writer = False
+                self._cond.notify_all()
+
+
+class CollectionLocks:
+    """
+    One RWLock per collection path. Handlers hold the write lock across a
+    whole read-modify-write (existence check, If-Match, upsert) so concurrent
+    requests on the same collection cannot interleave between the steps.
+
+    Several paths are always acquired in sorted order to rule out deadlocks.
+    Locks are kept per event loop, since asyncio primitives bind to the loop
+    they are first awaited on.
+
+    In shared mode a writer also holds the cross-process lock (taken last,
+    waited for in a thread) and catches up with the other workers first, so
+    the read-modify-write is atomic across worker processes too.
+    """
+
+    def __init__(self):
+        self._locks = weakref.WeakKeyDictionary()   # loop -> {path: RWLock}
+
+    def _lock(self, path: str) -> RWLock:
+        per_loop = self._locks.setdefault(asyncio.get_running_loop(), {})
+        if path not in per_loop:
+            per_loop[path] = RWLock()
+        return per_loop[path]
+
+    @asynccontextmanager
+    async def read(self, *paths):
+        async with AsyncExitStack() as stack:
+            for path in sorted(set(paths)):
+                await stack.enter_async_context(self._lock(path).read())
+            yield
+
+    @asynccontextmanager
+    async def write(self, *paths):
+        async with AsyncExitStack() as stack:
+            for path in sorted(set(paths)):
+                await stack.enter_async_context(self._lock(path).write())
+            if config.SHARED:
+                await _acquire_process_lock()
+                stack.callback(process_lock.release)
+                await run_io(store.sync)
+            yield
+
+
+async def _acquire_process_lock():
+    acquiring = asyncio.ensure_future(asyncio.to_thread(process_lock.acquire))
+    try:
+        await asyncio.shield(acquiring)
+    except asyncio.CancelledError:
+        # the thread still gets the lock: hand it back as soon as it does
+        acquiring.add_done_callback(lambda f: f.exception() or process_lock.release())
+        raise
+
+
+locks = CollectionLocks()
+
+
+async def run_io(fn, *args, **kwargs):
+    """
+    Call a storage function without stalling the event loop: backends that
+    wait on disk in the calling thread run in a worker thread. The in-memory
+    JSON store is called directly and hands its disk writes to a thread of
+    its own; changes the call made are awaited until they are durable, so a
+    request is still only answered once its write reached the disk. A call
+    that finds the cross-process lock taken (shared mode) is retried once
+    the lock was acquired off the loop.
+    """
+    if store.blocking:
+        return await asyncio.to_thread(fn, *args, **kwargs)
+    mark = store.durable_mark()
+    try:
+        result = fn(*args, **kwargs)
+    except ProcessLockBusy:
+        # shared mode: the call needs the cross-process lock and another
+        # worker has it; wait for it in a thread, then call again holding it
+        await _acquire_process_lock()
+        try:
+            result = fn(*args, **kwargs)
+        finally:
+            process_lock.release()
+    if store.durable_mark() != mark:
+        await _durable(store.durable_mark())
+    return result
+
+
+async def _durable(mark):
+    loop = asyncio.get_running_loop()
+    done = loop.create_future()
+
+    def settle(error):
+        if done.done():
+            return
+        if error is None:
+            done.set_result(None)
+        else:
+            done.set_exception(error)
+
+    if store.when_durable(mark, lambda error: loop.call_soon_threadsafe(settle, error)):
+        await done
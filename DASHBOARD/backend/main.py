@@ -1,13 +1,41 @@
-from fastapi import FastAPI, HTTPException, Request, Body
+from fastapi import FastAPI, HTTPException, Request, Response, Body, Depends, Query
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import PlainTextResponse
 from pydantic import BaseModel
 from typing import List, Optional
-from datetime import datetime, timezone
-import json, os
-from routers.client_product import router as client_product_router
+from datetime import datetime, timedelta, timezone
+import asyncio
+import config
+from routers.client_product import (
+    router as client_product_router, DATA_FILE as CLIENT_PRODUCT_PATH, assignments, sync_records, unassign_records,
+)
+from assignments import relinked
+from store import store
+from query import ListQuery
+from compressed import compressed
+from sequences import sequences, max_id
+from locks import locks, run_io
+from coordination import leadership
+import bulk
+from updates_view import UpdatesView
+from licenses import LicenseIndex, GROUPS as LICENSE_GROUPS
+from release_graph import ReleaseGraph, DependencyCycle
+from stats import DashboardStats
+from archive import HistoryArchive, HistoryTier
+from search import SearchIndex
+from events import ChangeFeed
+from sync import SyncIndex
+from instrumentation import InstrumentedRoute, watch_loop_lag
+from metrics import registry, on_store_change
+from profiler import profiler
+from verification import ArtifactFiles, HashCache, VerificationJobs
+from versions import (
+    NotModified, not_modified_handler, conditional, conditional_entity,
+    check_if_match, entity_headers,
+)
 
 app = FastAPI()
+app.router.route_class = InstrumentedRoute
 
 # -----------------------------------------------------
 # CORS
@@ -18,6 +46,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Total-Count", "X-Next-Cursor"],
 )
 
 
@@ -25,14 +54,29 @@ app.add_middleware(
 
 @app.middleware("http")
 async def no_cache_middleware(request: Request, call_next):
+    # responses with a validator (ETag) may be cached but are revalidated on
+    # every use; everything else stays uncacheable as before
     response = await call_next(request)
-    if isinstance(response, JSONResponse):
+    if "etag" in response.headers:
+        response.headers.setdefault("Cache-Control", "no-cache")
+    elif response.headers.get("content-type", "").startswith("application/json"):
         response.headers["Cache-Control"] = "no-store, no-cache, must-revalidate, max-age=0"
         response.headers["Pragma"] = "no-cache"
         response.headers["Expires"] = "0"
     return response
 
 
+app.add_exception_handler(NotModified, not_modified_handler)
+
+
+if config.SHARED:
+    @app.middleware("http")
+    async def follow_other_workers(request: Request, call_next):
+        # apply what the other worker processes changed before serving anything
+        await run_io(store.sync)
+        return await call_next(request)
+
+
 # -----------------------------------------------------
 # FILE PATHS
 # -----------------------------------------------------
@@ -45,24 +89,214 @@ SETTINGS_PATH = "settings.json"
 ARTIFACTS_PATH = "artifacts.json"
 UPDATE_LOGS_PATH = "update_logs.json"
 
+DATA_PATHS = [
+    PRODUCTS_PATH, RELEASES_PATH, CLIENTS_PATH, LICENSES_PATH,
+    SETTINGS_PATH, ARTIFACTS_PATH, UPDATE_LOGS_PATH, CLIENT_PRODUCT_PATH,
+    sequences.path,
+]
+
+sequences.register("productId", lambda: max_id(load_json(PRODUCTS_PATH), "productId"))
+sequences.register("releaseId", lambda: max_id(load_json(RELEASES_PATH), "releaseId"))
+sequences.register("artifactId", lambda: max_id(load_json(ARTIFACTS_PATH), "artifactId"))
+sequences.register("updateLogId", lambda: max_id(load_json(UPDATE_LOGS_PATH), "updateLogId"))
+sequences.register("clientId", lambda: max_id(load_json(CLIENTS_PATH), "clientId"))
+sequences.register("licenseId", lambda: max_id(load_json(LICENSES_PATH), "licenseId"))
+sequences.register(
+    "licenseAuditId",
+    lambda: max(
+        (max_id(l.get("audits") or [], "licenseAuditId") for l in load_json(LICENSES_PATH)), default=0,
+    ),
+)
+sequences.register(
+    "notificationId",
+    lambda: max_id(store.load(SETTINGS_PATH, default=dict).get("notifications", []), "notificationId"),
+)
+
+
+updates_view = UpdatesView(RELEASES_PATH, PRODUCTS_PATH)
+store.subscribe(updates_view.on_change)
+
+license_index = LicenseIndex(LICENSES_PATH)
+store.subscribe(license_index.on_change)
+
+release_graph = ReleaseGraph(RELEASES_PATH)
+store.subscribe(release_graph.on_change)
+
+verification_jobs = VerificationJobs(
+    ArtifactFiles(config.ARTIFACT_STORE_DIR, dedup=config.ARTIFACT_DEDUP),
+    HashCache(config.ARTIFACT_HASH_CACHE),
+    workers=config.ARTIFACT_VERIFY_WORKERS, chunk_size=config.ARTIFACT_HASH_CHUNK, keep=config.ARTIFACT_JOBS_KEEP,
+)
+
+history_archive = HistoryArchive(
+    config.HISTORY_DIR, {"license-audits": "action", "release-update-logs": "status"}, shared=config.SHARED,
+)
+license_audits = HistoryTier(
+    history_archive, "license-audits", LICENSES_PATH, "licenseId", "audits", "licenseAuditId",
+    keep=config.HISTORY_HOT_ENTRIES, batch=config.HISTORY_ARCHIVE_BATCH,
+)
+release_logs = HistoryTier(
+    history_archive, "release-update-logs", RELEASES_PATH, "releaseId", "updateLogs", "updateLogId",
+    keep=config.HISTORY_HOT_ENTRIES, batch=config.HISTORY_ARCHIVE_BATCH,
+)
+history_tiers = [license_audits, release_logs]
+for tier in history_tiers:
+    store.subscribe(tier.on_change)
+
+dashboard_stats = DashboardStats(
+    PRODUCTS_PATH, CLIENTS_PATH, RELEASES_PATH, LICENSES_PATH,
+    archive=history_archive, installs_kind="release-update-logs",
+)
+store.subscribe(dashboard_stats.on_change)
+history_archive.subscribe(dashboard_stats.on_archived)
+
+# entity -> (path, key, [(field, weight, index whole value too)], label)
+search_index = SearchIndex({
+    "product": (
+        PRODUCTS_PATH, "productId",
+        [("name", 3, False), ("sku", 3, True), ("description", 1, False)],
+        lambda p: p.get("name"),
+    ),
+    "client": (
+        CLIENTS_PATH, "clientId",
+        [("name", 3, False), ("primaryContact", 2, False), ("email", 2, True),
+         ("locations.city", 1, False), ("locations.country", 1, False)],
+        lambda c: c.get("name"),
+    ),
+    "license": (
+        LICENSES_PATH, "licenseId",
+        [("licenseKey", 3, True), ("client.name", 2, False), ("product.name", 2, False)],
+        lambda l: l.get("licenseKey"),
+    ),
+    "release": (
+        RELEASES_PATH, "releaseId",
+        [("version", 3, True), ("title", 2, False), ("notes", 1, False), ("changelog", 1, False)],
+        lambda r: f"{r.get('version') or ''} {r.get('title') or ''}".strip(),
+    ),
+})
+store.subscribe(search_index.on_change)
+
+change_feed = ChangeFeed({
+    PRODUCTS_PATH: "product",
+    RELEASES_PATH: "release",
+    CLIENTS_PATH: "client",
+    LICENSES_PATH: "license",
+    SETTINGS_PATH: "settings",
+    ARTIFACTS_PATH: "artifact",
+    UPDATE_LOGS_PATH: "updateLog",
+    CLIENT_PRODUCT_PATH: "clientProduct",
+})
+store.subscribe(change_feed.on_change)
+
+sync_index = SyncIndex({
+    "product": (PRODUCTS_PATH, "productId"),
+    "release": (RELEASES_PATH, "releaseId"),
+    "client": (CLIENTS_PATH, "clientId"),
+    "license": (LICENSES_PATH, "licenseId"),
+    "settings": (SETTINGS_PATH, None),
+    "artifact": (ARTIFACTS_PATH, "artifactId"),
+    "updateLog": (UPDATE_LOGS_PATH, "updateLogId"),
+    "clientProduct": (CLIENT_PRODUCT_PATH, "id"),
+})
+change_feed.subscribe(sync_index.on_change)
+
+store.subscribe(on_store_change)
+background_tasks = set()
+
+
+@app.on_event("startup")
+async def start_store():
+    await run_io(store.preload, DATA_PATHS)
+    await run_io(store.start)
+    await run_io(updates_view.rows)
+    await run_io(license_index.counts, "status")
+    await run_io(release_graph.ready)
+    await run_io(dashboard_stats.snapshot)
+    await run_io(search_index.ready)
+
+    background_tasks.add(asyncio.create_task(watch_loop_lag()))
+    if config.SHARED:
+        background_tasks.add(asyncio.create_task(follow_other_workers_loop(config.SHARED_POLL_INTERVAL)))
+    if config.LICENSE_SWEEP_INTERVAL > 0:
+        background_tasks.add(asyncio.create_task(sweep_licenses(config.LICENSE_SWEEP_INTERVAL)))
+    if config.HISTORY_ARCHIVE_INTERVAL > 0:
+        for tier in history_tiers:
+            await run_io(tier.scan)
+        background_tasks.add(asyncio.create_task(archive_history_loop(config.HISTORY_ARCHIVE_INTERVAL)))
+    if config.PROFILER:
+        profiler.start()
+
+@app.on_event("shutdown")
+async def stop_store():
+    for task in background_tasks:
+        task.cancel()
+    background_tasks.clear()
+    profiler.stop()
+    verification_jobs.stop()
+    await run_io(store.stop)
 
 
 # -----------------------------------------------------
 # HELPERS
 # -----------------------------------------------------
 def load_json(path: str):
-    if not os.path.exists(path):
-        return []
-    with open(path, "r", encoding="utf-8") as f:
-        return json.load(f)
+    return store.load(path)
 
 def save_json(path: str, data):
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2)
+    store.save(path, data)
 
 def current_time():
     return datetime.now(timezone.utc).isoformat()
 
+async def follow_other_workers_loop(interval: float):
+    # an idle worker still moves its views and wakes its event streams
+    while True:
+        try:
+            await run_io(store.sync)
+        except Exception as e:
+            print("❌ Following other workers failed:", e)
+        await asyncio.sleep(interval)
+
+
+# -----------------------------------------------------
+# HISTORY TIERING
+# -----------------------------------------------------
+async def archive_history():
+    """Move the overflow of every history list queued since the last pass to the archive."""
+    moved = 0
+    for tier in history_tiers:
+        for id in tier.take():
+            cold = await run_io(tier.overflow, id)
+            if not cold:
+                continue
+            # the archive is appended off the loop and without the collection
+            # lock; only dropping the moved entries from the document takes it
+            await asyncio.to_thread(tier.archive_entries, id, cold)
+            async with locks.write(tier.path):
+                moved += await run_io(tier.trim, id, cold)
+    if moved:
+        print(f"✅ Archived {moved} history entries")
+    return moved
+
+async def archive_history_loop(interval: float):
+    while True:
+        try:
+            # with several workers only the one holding the leadership archives
+            if leadership.held():
+                await archive_history()
+        except Exception as e:
+            print("❌ History archiving failed:", e)
+        await asyncio.sleep(interval)
+
+async def history_page(tier, id, response: Response, offset: int, limit: int, missing: str):
+    async with locks.read(tier.path):
+        hot = await run_io(tier.hot, id)
+    if hot is None:
+        raise HTTPException(status_code=404, detail=missing)
+    total, entries = await asyncio.to_thread(tier.page, id, hot, offset, limit)
+    response.headers["X-Total-Count"] = str(total)
+    return entries
+
 
 # -----------------------------------------------------
 # MODELS (ONE COPY ONLY)
@@ -110,6 +344,10 @@ class ReleaseDependency(BaseModel):
     dependsOnReleaseId: int
     dependsOn: dict
 
+class ReleaseChildRef(BaseModel):
+    releaseId: int
+    id: int
+
 class Release(BaseModel):
     releaseId: int
     productId: int
@@ -129,23 +367,21 @@ class Release(BaseModel):
 # PRODUCTS ENDPOINTS
 # --------------------------
 
-@app.get("/api/products")
-async def get_products():
-    return load_json(PRODUCTS_PATH)
+@app.get("/api/products", dependencies=[Depends(conditional(PRODUCTS_PATH))])
+async def get_products(response: Response, q: ListQuery = Depends()):
+    async with locks.read(PRODUCTS_PATH):
+        products = await run_io(load_json, PRODUCTS_PATH)
+    return q.apply(
+        products, response, key="productId",
+        filterable=("productId", "clientId", "sku"), date_field="createdAt",
+    )
 
 
 @app.post("/api/products")
 async def create_product(product: dict):
-    print("\n✅ Incoming product:", product)
-
     try:
-        products = load_json(PRODUCTS_PATH)
-        releases = load_json(RELEASES_PATH)
-        artifacts = load_json(ARTIFACTS_PATH)
-        update_logs = load_json(UPDATE_LOGS_PATH)
-
         # ✅ Generate productId
-        new_pid = max([p.get("productId", 0) for p in products], default=0) + 1
+        new_pid = await run_io(sequences.next, "productId")
         product["productId"] = new_pid
         product["createdAt"] = current_time()
         product["lastModified"] = current_time()
@@ -155,7 +391,7 @@ async def create_product(product: dict):
         product["clientName"] = product.get("clientName") or None
 
         # ✅ Default Release
-        new_rid = max([r.get("releaseId", 0) for r in releases], default=0) + 1
+        new_rid = await run_io(sequences.next, "releaseId")
         default_release = {
             "releaseId": new_rid,
             "productId": new_pid,
@@ -171,7 +407,7 @@ async def create_product(product: dict):
         }
 
         # ✅ Default Artifact
-        new_aid = max([a.get("artifactId", 0) for a in artifacts], default=0) + 1
+        new_aid = await run_io(sequences.next, "artifactId")
         default_artifact = {
             "artifactId": new_aid,
             "releaseId": new_rid,
@@ -183,7 +419,7 @@ async def create_product(product: dict):
         }
 
         # ✅ Default Update Log
-        new_log_id = max([l.get("updateLogId", 0) for l in update_logs], default=0) + 1
+        new_log_id = await run_io(sequences.next, "updateLogId")
         default_log = {
             "updateLogId": new_log_id,
             "clientId": 1,
@@ -197,16 +433,11 @@ async def create_product(product: dict):
         default_release["artifacts"].append(default_artifact)
         default_release["updateLogs"].append(default_log)
 
-        releases.append(default_release)
-        artifacts.append(default_artifact)
-        update_logs.append(default_log)
-
-        save_json(RELEASES_PATH, releases)
-        save_json(ARTIFACTS_PATH, artifacts)
-        save_json(UPDATE_LOGS_PATH, update_logs)
-
-        products.append(product)
-        save_json(PRODUCTS_PATH, products)
+        async with locks.write(PRODUCTS_PATH, RELEASES_PATH, ARTIFACTS_PATH, UPDATE_LOGS_PATH):
+            await run_io(store.upsert, RELEASES_PATH, "releaseId", default_release)
+            await run_io(store.upsert, ARTIFACTS_PATH, "artifactId", default_artifact)
+            await run_io(store.upsert, UPDATE_LOGS_PATH, "updateLogId", default_log)
+            await run_io(store.upsert, PRODUCTS_PATH, "productId", product)
 
         return {**product, "releases": [default_release]}
 
@@ -216,28 +447,31 @@ async def create_product(product: dict):
 
 
 @app.put("/api/products/{product_id}")
-async def update_product(product_id: int, updated: dict):
-    products = load_json(PRODUCTS_PATH)
-
-    for p in products:
-        if p["productId"] == product_id:
-            p.update(updated)
-            p["lastModified"] = current_time()
-            save_json(PRODUCTS_PATH, products)
-            return p
+async def update_product(product_id: int, updated: dict, request: Request, response: Response):
+    async with locks.write(PRODUCTS_PATH):
+        p = await run_io(store.find, PRODUCTS_PATH, "productId", product_id)
+        if not p:
+            raise HTTPException(404, "Product not found")
 
-    raise HTTPException(404, "Product not found")
+        check_if_match(request, PRODUCTS_PATH, product_id)
+        p = {**p, **updated, "productId": product_id, "lastModified": current_time()}
+        p = await run_io(store.upsert, PRODUCTS_PATH, "productId", p)
+        entity_headers(response, PRODUCTS_PATH, product_id)
+    return p
 
 
 @app.delete("/api/products/{product_id}")
-async def delete_product(product_id: int):
-    products = load_json(PRODUCTS_PATH)
-    new_list = [p for p in products if p["productId"] != product_id]
+async def delete_product(product_id: int, request: Request):
+    async with locks.write(PRODUCTS_PATH, CLIENT_PRODUCT_PATH, CLIENTS_PATH):
+        check_if_match(request, PRODUCTS_PATH, product_id)
+        if not await run_io(store.find, PRODUCTS_PATH, "productId", product_id):
+            raise HTTPException(404, "Product not found")
+        # its assignments go too, and with them the product's rows on the clients
+        records = [{"path": PRODUCTS_PATH, "op": "delete", "key": "productId", "id": product_id}]
+        assigned = await run_io(assignments.of_product, product_id)
+        records += await run_io(unassign_records, assigned.values())
+        await run_io(store.batch, records)
 
-    if len(new_list) == len(products):
-        raise HTTPException(404, "Product not found")
-
-    save_json(PRODUCTS_PATH, new_list)
     return {"message": "Product deleted"}
 
 
@@ -247,119 +481,154 @@ async def delete_product(product_id: int):
 # RELEASES ENDPOINTS
 # --------------------------
 
-def _load_releases():
-    data = load_json(RELEASES_PATH)
+async def _load_releases():
+    async with locks.read(RELEASES_PATH):
+        data = await run_io(load_json, RELEASES_PATH)
     return data if isinstance(data, list) else []
 
-def _save_releases(data):
-    save_json(RELEASES_PATH, data)
-
-def _find_release_index(items, rid):
-    for i, r in enumerate(items):
-        if int(r["releaseId"]) == int(rid):
-            return i
-    return -1
+async def _find_release(rid):
+    return await run_io(store.find, RELEASES_PATH, "releaseId", rid)
+
+async def _upsert_release_child(rid, field, child_key, doc, validate=None):
+    async with locks.write(RELEASES_PATH):
+        if validate:
+            await run_io(validate)
+        saved = await run_io(
+            store.upsert_child, RELEASES_PATH, "releaseId", rid, field, child_key, doc,
+            touch={"lastModified": current_time()},
+        )
+    if saved is None:
+        raise HTTPException(404, "Release not found")
+    return saved
+
+async def _delete_release_child(rid, field, child_key, child_id):
+    async with locks.write(RELEASES_PATH):
+        removed = await run_io(
+            store.delete_child, RELEASES_PATH, "releaseId", rid, field, child_key, child_id,
+            touch={"lastModified": current_time()},
+        )
+    if removed is None:
+        raise HTTPException(404, "Release not found")
+    return removed
 
 
-@app.get("/api/releases")
-async def get_releases():
-    return _load_releases()
+@app.get("/api/releases", dependencies=[Depends(conditional(RELEASES_PATH))])
+async def get_releases(request: Request, response: Response, q: ListQuery = Depends()):
+    async def releases():
+        return q.apply(
+            await _load_releases(), response, key="releaseId",
+            filterable=("releaseId", "productId", "status", "releaseType"), date_field="releaseDate",
+        )
+    return await compressed(request, response, releases)
 
 @app.post("/api/releases")
 async def create_release(release: Release):
-    releases = _load_releases()
     data = release.dict()
     data["lastModified"] = current_time()
-
-    idx = _find_release_index(releases, release.releaseId)
-    if idx >= 0:
-        releases[idx] = data
-    else:
-        releases.append(data)
-
-    _save_releases(releases)
-    return data
+    async with locks.write(RELEASES_PATH):
+        await run_io(_check_dependencies, release.releaseId, [d.dependsOnReleaseId for d in release.dependencies])
+        return await run_io(store.upsert, RELEASES_PATH, "releaseId", data)
 
 @app.delete("/api/releases/{release_id}")
-async def delete_release(release_id: int):
-    releases = _load_releases()
-    new_list = [r for r in releases if int(r["releaseId"]) != release_id]
-    _save_releases(new_list)
+async def delete_release(release_id: int, request: Request, force: bool = False):
+    """Refuses (409) while other releases depend on this one, unless force=true."""
+    async with locks.write(RELEASES_PATH):
+        check_if_match(request, RELEASES_PATH, release_id)
+        dependents = await run_io(release_graph.dependents, release_id)
+        if dependents and not force:
+            raise HTTPException(409, {"message": "Other releases depend on this release", "dependents": dependents})
+        if await run_io(store.delete, RELEASES_PATH, "releaseId", release_id):
+            await asyncio.to_thread(release_logs.drop, release_id)
     return {"message": "deleted"}
 
 
-########  ARTIFACTS  ########
+########  DEPENDENCY GRAPH  ########
 
-@app.post("/api/releases/{release_id}/artifacts")
-async def add_artifact(release_id: int, artifact: Artifact):
-    releases = _load_releases()
-    idx = _find_release_index(releases, release_id)
-    if idx < 0:
-        raise HTTPException(404, "Release not found")
+def _check_dependencies(rid, targets):
+    # caller holds the releases write lock
+    try:
+        release_graph.check(rid, targets)
+    except DependencyCycle as e:
+        raise HTTPException(409, f"Dependency cycle: {e}")
+
+@app.get("/api/releases/{release_id}/install-order")
+async def get_install_order(release_id: int):
+    """The release and everything it needs (transitively), dependencies first."""
+    async with locks.read(RELEASES_PATH):
+        if not await run_io(release_graph.exists, release_id):
+            raise HTTPException(404, "Release not found")
+        try:
+            plan = await run_io(release_graph.install_order, release_id)
+        except DependencyCycle as e:
+            raise HTTPException(409, f"Dependency cycle: {e}")
+    return {"releaseId": release_id, **plan}
+
+@app.get("/api/releases/{release_id}/dependents")
+async def get_dependents(release_id: int, transitive: bool = False):
+    """Releases that depend on this one; transitive=true follows the whole chain (what breaks on delete)."""
+    async with locks.read(RELEASES_PATH):
+        dependents = await run_io(release_graph.dependents, release_id, transitive)
+    return {"releaseId": release_id, "transitive": transitive, "dependents": dependents}
 
-    releases[idx].setdefault("artifacts", [])
-    artifacts = releases[idx]["artifacts"]
 
-    # upsert
-    for i, a in enumerate(artifacts):
-        if a["artifactId"] == artifact.artifactId:
-            artifacts[i] = artifact.dict()
-            break
-    else:
-        artifacts.append(artifact.dict())
+########  ARTIFACTS  ########
 
-    releases[idx]["lastModified"] = current_time()
-    _save_releases(releases)
+@app.post("/api/releases/{release_id}/artifacts")
+async def add_artifact(release_id: int, artifact: Artifact):
+    await _upsert_release_child(release_id, "artifacts", "artifactId", artifact.dict())
     return artifact
 
 
 @app.delete("/api/releases/{release_id}/artifacts/{artifact_id}")
 async def delete_artifact(release_id: int, artifact_id: int):
-    releases = _load_releases()
-    idx = _find_release_index(releases, release_id)
-
-    artifacts = releases[idx].get("artifacts", [])
-    releases[idx]["artifacts"] = [
-        a for a in artifacts if a["artifactId"] != artifact_id
-    ]
-    releases[idx]["lastModified"] = current_time()
-    _save_releases(releases)
+    await _delete_release_child(release_id, "artifacts", "artifactId", artifact_id)
     return {"deleted": artifact_id}
 
+@app.post("/api/releases/{release_id}/verify", status_code=202)
+async def verify_release_artifacts(release_id: int):
+    """Start checking the release's artifact files against their hash and size; poll the returned job."""
+    async with locks.read(RELEASES_PATH):
+        release = await run_io(store.find, RELEASES_PATH, "releaseId", release_id)
+        if release is None:
+            raise HTTPException(404, "Release not found")
+        artifacts = [dict(a) for a in release.get("artifacts") or []]
+    job = verification_jobs.start(release_id, artifacts)
+    return _job_summary(job)
+
+@app.get("/api/verification-jobs")
+def list_verification_jobs():
+    """Verification jobs of this worker, newest first, without per-artifact results."""
+    return [_job_summary(j) for j in verification_jobs.list()]
+
+@app.get("/api/verification-jobs/{job_id}")
+def get_verification_job(job_id: str):
+    job = verification_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(404, "Verification job not found")
+    return {**job, "results": list(job["results"])}
+
+def _job_summary(job):
+    return {k: v for k, v in job.items() if k != "results"}
+
 
 ########  UPDATE LOGS  ########
 
 @app.post("/api/releases/{release_id}/update-logs")
 async def add_update_log(release_id: int, log: UpdateLog):
-    releases = _load_releases()
-    idx = _find_release_index(releases, release_id)
-
-    releases[idx].setdefault("updateLogs", [])
-    logs = releases[idx]["updateLogs"]
-
-    # upsert
-    for i, l in enumerate(logs):
-        if l["updateLogId"] == log.updateLogId:
-            logs[i] = log.dict()
-            break
-    else:
-        logs.append(log.dict())
-
-    releases[idx]["lastModified"] = current_time()
-    _save_releases(releases)
+    await _upsert_release_child(release_id, "updateLogs", "updateLogId", log.dict())
     return log
 
+@app.get("/api/releases/{release_id}/update-logs")
+async def get_update_log_history(
+    release_id: int, response: Response,
+    offset: int = Query(0, ge=0), limit: int = Query(50, ge=1, le=1000),
+):
+    """Full update log history, newest first; older pages come from the archive."""
+    return await history_page(release_logs, release_id, response, offset, limit, "Release not found")
+
 @app.delete("/api/releases/{release_id}/update-logs/{log_id}")
 async def delete_log(release_id: int, log_id: int):
-    releases = _load_releases()
-    idx = _find_release_index(releases, release_id)
-
-    logs = releases[idx].get("updateLogs", [])
-    releases[idx]["updateLogs"] = [
-        l for l in logs if l["updateLogId"] != log_id
-    ]
-    releases[idx]["lastModified"] = current_time()
-    _save_releases(releases)
+    await _delete_release_child(release_id, "updateLogs", "updateLogId", log_id)
     return {"deleted": log_id}
 
 
@@ -367,36 +636,78 @@ async def delete_log(release_id: int, log_id: int):
 
 @app.post("/api/releases/{release_id}/dependencies")
 async def add_dep(release_id: int, dep: ReleaseDependency):
-    releases = _load_releases()
-    idx = _find_release_index(releases, release_id)
-
-    releases[idx].setdefault("dependencies", [])
-    deps = releases[idx]["dependencies"]
-
-    # upsert
-    for i, d in enumerate(deps):
-        if d["releaseDependencyId"] == dep.releaseDependencyId:
-            deps[i] = dep.dict()
-            break
-    else:
-        deps.append(dep.dict())
-
-    releases[idx]["lastModified"] = current_time()
-    _save_releases(releases)
+    await _upsert_release_child(
+        release_id, "dependencies", "releaseDependencyId", dep.dict(),
+        validate=lambda: _check_dependencies(release_id, [dep.dependsOnReleaseId]),
+    )
     return dep
 
 @app.delete("/api/releases/{release_id}/dependencies/{dep_id}")
 async def delete_dep(release_id: int, dep_id: int):
-    releases = _load_releases()
-    idx = _find_release_index(releases, release_id)
+    await _delete_release_child(release_id, "dependencies", "releaseDependencyId", dep_id)
+    return {"deleted": dep_id}
+
 
-    releases[idx]["dependencies"] = [
-        d for d in releases[idx].get("dependencies", [])
-        if d["releaseDependencyId"] != dep_id
+########  BULK  ########
+# Arrays of children spread over any number of releases (each item names its
+# releaseId). A batch is validated as a whole, applied in one storage commit
+# and answered with one result per item.
+
+async def _bulk_upsert_children(field, child_key, docs, rejected=None):
+    # rejected(docs) -> {position: (status, detail)} runs under the lock and skips those items
+    bulk.check_size(docs)
+    touch = {"lastModified": current_time()}
+    async with locks.write(RELEASES_PATH):
+        errors = await run_io(rejected, docs) if rejected else {}
+        records = [
+            {"path": RELEASES_PATH, "op": "upsert_child", "key": "releaseId", "id": d["releaseId"],
+             "field": field, "childKey": child_key, "doc": d, "touch": touch}
+            for i, d in enumerate(docs) if i not in errors
+        ]
+        applied = iter(await run_io(store.batch, records))
+    results = [None if i in errors else next(applied) for i in range(len(docs))]
+    return bulk.report(results, [d[child_key] for d in docs], missing="Release not found", errors=errors)
+
+async def _bulk_delete_children(field, child_key, refs):
+    bulk.check_size(refs)
+    touch = {"lastModified": current_time()}
+    records = [
+        {"path": RELEASES_PATH, "op": "delete_child", "key": "releaseId", "id": r.releaseId,
+         "field": field, "childKey": child_key, "childId": r.id, "touch": touch}
+        for r in refs
     ]
-    releases[idx]["lastModified"] = current_time()
-    _save_releases(releases)
-    return {"deleted": dep_id}
+    async with locks.write(RELEASES_PATH):
+        results = await run_io(store.batch, records)
+    return bulk.report(results, [r.id for r in refs], missing="Release not found", empty="Not found in release")
+
+
+@app.post("/api/bulk/artifacts")
+async def bulk_add_artifacts(artifacts: List[Artifact]):
+    return await _bulk_upsert_children("artifacts", "artifactId", [a.dict() for a in artifacts])
+
+@app.post("/api/bulk/artifacts/delete")
+async def bulk_delete_artifacts(refs: List[ReleaseChildRef]):
+    return await _bulk_delete_children("artifacts", "artifactId", refs)
+
+@app.post("/api/bulk/update-logs")
+async def bulk_add_update_logs(logs: List[UpdateLog]):
+    return await _bulk_upsert_children("updateLogs", "updateLogId", [l.dict() for l in logs])
+
+@app.post("/api/bulk/update-logs/delete")
+async def bulk_delete_update_logs(refs: List[ReleaseChildRef]):
+    return await _bulk_delete_children("updateLogs", "updateLogId", refs)
+
+@app.post("/api/bulk/dependencies")
+async def bulk_add_deps(deps: List[ReleaseDependency]):
+    def cycles(docs):
+        problems = release_graph.rejected([(d["releaseId"], d["dependsOnReleaseId"]) for d in docs])
+        return {i: (409, f"Dependency cycle: {reason}") for i, reason in problems.items()}
+
+    return await _bulk_upsert_children("dependencies", "releaseDependencyId", [d.dict() for d in deps], cycles)
+
+@app.post("/api/bulk/dependencies/delete")
+async def bulk_delete_deps(refs: List[ReleaseChildRef]):
+    return await _bulk_delete_children("dependencies", "releaseDependencyId", refs)
 
 
 
@@ -407,16 +718,21 @@ async def delete_dep(release_id: int, dep_id: int):
 
 from fastapi import HTTPException
 
-@app.get("/api/clients")
-async def get_clients():
-    """Return the full list of clients"""
-    return load_json(CLIENTS_PATH)
+@app.get("/api/clients", dependencies=[Depends(conditional(CLIENTS_PATH))])
+async def get_clients(response: Response, q: ListQuery = Depends()):
+    """Return the list of clients (whole list unless query parameters are given)"""
+    async with locks.read(CLIENTS_PATH):
+        clients = await run_io(load_json, CLIENTS_PATH)
+    return q.apply(
+        clients, response, key="clientId",
+        filterable=("clientId", "email"), date_field="createdAt",
+    )
 
 
-@app.get("/api/clients/{client_id}")
+@app.get("/api/clients/{client_id}", dependencies=[Depends(conditional_entity(CLIENTS_PATH, "clientId", "client_id"))])
 async def get_client(client_id: int):
-    clients = load_json(CLIENTS_PATH)
-    client = next((c for c in clients if c["clientId"] == client_id), None)
+    async with locks.read(CLIENTS_PATH):
+        client = await run_io(store.find, CLIENTS_PATH, "clientId", client_id)
     if not client:
         raise HTTPException(status_code=404, detail="Client not found")
     return client
@@ -429,10 +745,10 @@ async def create_client(client: dict):
     - Auto assigns clientId
     - Auto sets createdAt and lastModified
     - Ensures required arrays exist
+    - Assigns the products in productIds, in the same commit
     """
 
-    clients = load_json(CLIENTS_PATH)
-    new_id = max([c["clientId"] for c in clients], default=0) + 1
+    new_id = await run_io(sequences.next, "clientId")
 
     client["clientId"] = new_id
     client["createdAt"] = current_time()
@@ -443,63 +759,180 @@ async def create_client(client: dict):
     client.setdefault("releaseIds", [])
     client.setdefault("updateLogIds", [])
     client.setdefault("locations", [])
+    # the linked lists are rows by index: keep them the same length
+    client.update(relinked(client) or {})
 
-    clients.append(client)
-    save_json(CLIENTS_PATH, clients)
-    return client
+    async with locks.write(CLIENTS_PATH, CLIENT_PRODUCT_PATH):
+        records = [{"path": CLIENTS_PATH, "op": "upsert", "key": "clientId", "doc": client}]
+        records += await run_io(sync_records, new_id, client["productIds"])
+        return (await run_io(store.batch, records))[0]
 
 
 @app.put("/api/clients/{client_id}")
-async def update_client(client_id: int, updated_client: dict):
+async def update_client(client_id: int, updated_client: dict, request: Request, response: Response):
     """
     Replace full client object (as clients.tsx does)
-    and update lastModified timestamp.
+    and update lastModified timestamp. Products added to or dropped from
+    productIds are assigned / unassigned in the same commit.
     """
 
-    clients = load_json(CLIENTS_PATH)
-    found = False
+    async with locks.write(CLIENTS_PATH, CLIENT_PRODUCT_PATH):
+        client = await run_io(store.find, CLIENTS_PATH, "clientId", client_id)
+        if not client:
+            raise HTTPException(status_code=404, detail="Client not found")
+
+        check_if_match(request, CLIENTS_PATH, client_id)
+        updated_client["clientId"] = client_id
+        updated_client["createdAt"] = client.get("createdAt", current_time())
+        updated_client["lastModified"] = current_time()
+
+        # Ensure arrays exist
+        updated_client.setdefault("productIds", [])
+        updated_client.setdefault("releaseIds", [])
+        updated_client.setdefault("updateLogIds", [])
+        updated_client.setdefault("locations", [])
+        # the linked lists are rows by index: keep them the same length
+        updated_client.update(relinked(updated_client) or {})
+
+        records = [{"path": CLIENTS_PATH, "op": "upsert", "key": "clientId", "doc": updated_client}]
+        records += await run_io(sync_records, client_id, updated_client["productIds"])
+        updated_client = (await run_io(store.batch, records))[0]
+        entity_headers(response, CLIENTS_PATH, client_id)
+    return updated_client
 
-    for idx, client in enumerate(clients):
-        if client["clientId"] == client_id:
-            found = True
 
-            updated_client["clientId"] = client_id
-            updated_client["createdAt"] = client.get("createdAt", current_time())
-            updated_client["lastModified"] = current_time()
+@app.delete("/api/clients/{client_id}")
+async def delete_client(client_id: int, request: Request):
+    """Delete a client by ID."""
 
-            # Ensure arrays exist
-            updated_client.setdefault("productIds", [])
-            updated_client.setdefault("releaseIds", [])
-            updated_client.setdefault("updateLogIds", [])
-            updated_client.setdefault("locations", [])
+    async with locks.write(CLIENTS_PATH, CLIENT_PRODUCT_PATH):
+        check_if_match(request, CLIENTS_PATH, client_id)
+        if not await run_io(store.find, CLIENTS_PATH, "clientId", client_id):
+            raise HTTPException(status_code=404, detail="Client not found")
+        assigned = await run_io(assignments.of_client, client_id)
+        records = [{"path": CLIENTS_PATH, "op": "delete", "key": "clientId", "id": client_id}]
+        records += [{"path": CLIENT_PRODUCT_PATH, "op": "delete", "key": "id", "id": id} for id in assigned.values()]
+        await run_io(store.batch, records)
 
-            clients[idx] = updated_client
-            break
+    return {"message": "Client deleted"}
 
-    if not found:
-        raise HTTPException(status_code=404, detail="Client not found")
 
-    save_json(CLIENTS_PATH, clients)
-    return updated_client
 
 
-@app.delete("/api/clients/{client_id}")
-async def delete_client(client_id: int):
-    """Delete a client by ID."""
 
-    clients = load_json(CLIENTS_PATH)
-    updated = [c for c in clients if c["clientId"] != client_id]
 
-    if len(updated) == len(clients):
-        raise HTTPException(status_code=404, detail="Client not found")
+# --------------------------
+# CHANGE FEED ENDPOINT
+# --------------------------
+@app.get("/api/events")
+async def get_events(request: Request, since: Optional[str] = None, docs: bool = False):
+    """
+    Server-Sent Events stream with one "change" event per mutation
+    (entity, id, op, lastModified, seq; the document too with docs=true).
+    Reconnecting clients resume through Last-Event-ID or ?since=<event id>;
+    a "reset" event means the gap is gone from the buffer and the client
+    should refetch before following the stream again.
+    """
+    return change_feed.stream(request, since, docs)
 
-    save_json(CLIENTS_PATH, updated)
-    return {"message": "Client deleted"}
 
+@app.get("/api/sync")
+async def sync_changes(since: Optional[str] = None):
+    """
+    Everything changed since a token from a previous call (current documents
+    under "upserted", tombstone ids under "deleted"). Without a token, or
+    with one from before a restart, every collection is sent ("full"). A
+    token older than the tombstones still kept gets 410: sync again without
+    one. The returned token also works as ?since= for /api/events.
+    """
+    seq = change_feed.seq
+    start = change_feed.parse_token(since) if since else None
+    changes = await run_io(sync_index.changes, start)
+    if changes is None:
+        raise HTTPException(410, "Deletes since this token are no longer kept; sync again without since")
+    return {"token": change_feed.token(seq), "full": start is None, **changes}
 
 
+# --------------------------
+# SEARCH
+# --------------------------
+@app.get("/api/search")
+async def search(
+    q: str = Query(..., min_length=1, max_length=200),
+    type: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=200),
+    fuzzy: bool = True,
+):
+    """
+    Ranked full-text search over products, clients, licenses and releases.
+    Every word must match, exactly, as a prefix or (fuzzy=true) with one typo.
+    type=client,license limits the entity types searched.
+    """
+    types = {t.strip() for t in type.split(",") if t.strip()} if type else None
+    unknown = (types or set()) - set(search_index.entities)
+    if unknown:
+        raise HTTPException(400, f"Unknown type: {', '.join(sorted(unknown))}")
+    return await run_io(search_index.search, q, types, limit, fuzzy)
+
+
+# --------------------------
+# DASHBOARD STATS
+# --------------------------
+@app.get("/api/stats")
+async def get_stats(perRelease: bool = False):
+    """
+    Dashboard summary counters (products, clients, releases by status / type,
+    installs by status with the completed / (completed + failed) ratio,
+    licenses by status). perRelease=true adds install counts per releaseId.
+    """
+    return await run_io(dashboard_stats.snapshot, perRelease)
 
 
+@app.post("/api/stats/rebuild")
+async def rebuild_stats():
+    """Recount every aggregate from storage; "consistent" is false if the running counters had drifted."""
+    async with locks.read(PRODUCTS_PATH, CLIENTS_PATH, RELEASES_PATH, LICENSES_PATH):
+        result = await run_io(dashboard_stats.rebuild)
+    if not result["consistent"]:
+        print("❌ Dashboard stats drifted from storage; counters rebuilt")
+    return result
+
+
+# --------------------------
+# METRICS ENDPOINTS
+# --------------------------
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Prometheus text format: route latency and phases, storage bytes and timings, loop lag."""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@app.get("/metrics/profile", response_class=PlainTextResponse)
+async def get_profile(reset: bool = False):
+    """Folded stacks collected by the sampling profiler (feed to flamegraph.pl / speedscope)."""
+    folded = profiler.collapsed()
+    if reset:
+        profiler.reset()
+    return PlainTextResponse(folded)
+
+
+@app.post("/metrics/profiler")
+async def toggle_profiler(settings: dict = Body(...)):
+    """{"enabled": true, "interval": 0.005} starts sampling, {"enabled": false} stops it."""
+    if settings.get("enabled"):
+        interval = settings.get("interval")
+        if interval is not None:
+            try:
+                interval = float(interval)
+            except (TypeError, ValueError):
+                raise HTTPException(status_code=400, detail="interval must be a number of seconds")
+            if not (0.0005 <= interval <= 1):
+                raise HTTPException(status_code=400, detail="interval must be between 0.0005 and 1 second")
+        profiler.start(interval)
+    else:
+        await asyncio.to_thread(profiler.stop)
+    return profiler.status()
+
 
 # --------------------------
 # SERVER TIME ENDPOINT
@@ -517,53 +950,54 @@ async def get_server_time():
 # --------------------------
 SETTINGS_PATH = "settings.json"
 
-@app.get("/api/settings")
+@app.get("/api/settings", dependencies=[Depends(conditional(SETTINGS_PATH))])
 async def get_settings():
-    data = load_json(SETTINGS_PATH)
+    async with locks.read(SETTINGS_PATH):
+        data = await run_io(load_json, SETTINGS_PATH)
     if not data:
         raise HTTPException(status_code=404, detail="Settings not found")
     return data
 
 @app.post("/api/settings/user")
 async def update_user(user: dict):
-    data = load_json(SETTINGS_PATH)
-    if not data:
-        raise HTTPException(status_code=404, detail="Settings not found")
+    async with locks.write(SETTINGS_PATH):
+        data = await run_io(load_json, SETTINGS_PATH)
+        if not data:
+            raise HTTPException(status_code=404, detail="Settings not found")
 
-    data["user"] = user
-    save_json(SETTINGS_PATH, data)
+        await run_io(store.set_field, SETTINGS_PATH, "user", user)
     return {"message": "User updated successfully", "user": user}
 
 
 @app.post("/api/settings/notifications")
 async def add_notification(notification: dict):
-    data = load_json(SETTINGS_PATH)
-    if not data:
-        raise HTTPException(status_code=404, detail="Settings not found")
-
-    notifications = data.get("notifications", [])
-    new_id = max([n["notificationId"] for n in notifications], default=0) + 1
-    notification["notificationId"] = new_id
-    notification["createdAt"] = current_time()
-    notifications.insert(0, notification)
-    data["notifications"] = notifications
-    save_json(SETTINGS_PATH, data)
+    async with locks.write(SETTINGS_PATH):
+        data = await run_io(load_json, SETTINGS_PATH)
+        if not data:
+            raise HTTPException(status_code=404, detail="Settings not found")
+
+        new_id = await run_io(sequences.next, "notificationId")
+        notification["notificationId"] = new_id
+        notification["createdAt"] = current_time()
+        await run_io(
+            store.upsert_child,
+            SETTINGS_PATH, None, None, "notifications", "notificationId", notification, front=True,
+        )
 
     return {"message": "Notification added successfully", "notification": notification}
 
 
 @app.delete("/api/settings/notifications/{notification_id}")
 async def delete_notification(notification_id: int):
-    data = load_json(SETTINGS_PATH)
-    if not data:
-        raise HTTPException(status_code=404, detail="Settings not found")
-
-    notifications = [
-        n for n in data.get("notifications", [])
-        if n["notificationId"] != notification_id
-    ]
-    data["notifications"] = notifications
-    save_json(SETTINGS_PATH, data)
+    async with locks.write(SETTINGS_PATH):
+        data = await run_io(load_json, SETTINGS_PATH)
+        if not data:
+            raise HTTPException(status_code=404, detail="Settings not found")
+
+        await run_io(
+            store.delete_child,
+            SETTINGS_PATH, None, None, "notifications", "notificationId", notification_id,
+        )
     return {"message": f"Notification {notification_id} deleted successfully"}
 
 
@@ -572,107 +1006,158 @@ async def delete_notification(notification_id: int):
 # --------------------------
 # UPDATES ENDPOINTS
 # --------------------------
-@app.get("/api/updates")
-async def get_updates():
-    releases = load_json(RELEASES_PATH)
-    products = load_json(PRODUCTS_PATH)
-
-    merged = []
-    for r in releases:
-        prod = next((p for p in products if p.get("productId") == r.get("productId")), None)
-
-        # ✅ guarantee safe fields
-        changelog = r.get("changelog")
-        if not isinstance(changelog, list):
-            changelog = []
-
-        notes = r.get("notes")
-        if notes is None:
-            notes = ""
-
-        merged.append({
-            "releaseId": r.get("releaseId", 0),
-            "productId": r.get("productId", 0),
-            "productName": prod["name"] if prod else "Unknown Product",
-            "version": r.get("version", ""),
-            "releaseType": r.get("releaseType", "minor"),
-            "status": r.get("status", "draft"),
-            "releaseDate": r.get("releaseDate", ""),
-            "title": r.get("title", "(No Title Provided)"),   # ✅ always exists
-            "notes": notes,                                   # ✅ always string
-            "changelog": changelog,                           # ✅ always list
-            "artifacts": r.get("artifacts", []),
-            "dependencies": r.get("dependencies", []),
-            "updateLogs": r.get("updateLogs", []),
-            "lastModified": r.get("lastModified", "")
-        })
-
-    merged.sort(key=lambda x: x["releaseDate"], reverse=True)
-    return merged
+@app.get("/api/updates", dependencies=[Depends(conditional(RELEASES_PATH, PRODUCTS_PATH))])
+async def get_updates(request: Request, response: Response, q: ListQuery = Depends()):
+    async def merged():
+        async with locks.read(RELEASES_PATH, PRODUCTS_PATH):
+            rows = await run_io(updates_view.rows)
+        return q.apply(
+            rows, response, key="releaseId",
+            filterable=("releaseId", "productId", "status", "releaseType"), date_field="releaseDate",
+        )
+    return await compressed(request, response, merged)
 
 # --------------------------
 # LICENSES ENDPOINTS
 # --------------------------
 
-@app.get("/api/licenses")
-async def get_licenses():
-    with open("licenses.json", "r") as f:
-        licenses = json.load(f)
-    return licenses
+@app.get("/api/licenses", dependencies=[Depends(conditional(LICENSES_PATH))])
+async def get_licenses(request: Request, response: Response, q: ListQuery = Depends()):
+    async def licenses():
+        async with locks.read(LICENSES_PATH):
+            rows = await run_io(load_json, LICENSES_PATH)
+        return q.apply(
+            rows, response, key="licenseId",
+            filterable=("licenseId", "clientId", "productId", "status", "type"), date_field="endDate",
+        )
+    return await compressed(request, response, licenses)
+
+
+async def _licenses_by_id(ids):
+    async with locks.read(LICENSES_PATH):
+        found = await run_io(lambda: [store.find(LICENSES_PATH, "licenseId", i) for i in ids])
+    return [l for l in found if l]
 
 
-@app.get("/api/licenses/{license_id}")
+@app.get("/api/licenses/expiring")
+async def get_expiring_licenses(days: int = Query(30, ge=0, le=3650), status: Optional[str] = "active"):
+    """Licenses whose endDate falls within the next `days` days (today included), soonest first."""
+    today = datetime.now(timezone.utc).date()
+    ids = await run_io(
+        license_index.ending, today.isoformat(), (today + timedelta(days=days)).isoformat(), status or None,
+    )
+    return await _licenses_by_id(ids)
+
+
+@app.get("/api/licenses/counts")
+async def get_license_counts(by: str = "status", status: Optional[str] = None):
+    """Number of licenses per status, clientId or productId (optionally of one status only)."""
+    if by not in LICENSE_GROUPS:
+        raise HTTPException(status_code=400, detail=f"by must be one of: {', '.join(LICENSE_GROUPS)}")
+    counts = await run_io(license_index.counts, by, status)
+    return {"by": by, "status": status, "total": sum(counts.values()), "counts": counts}
+
+
+@app.get("/api/clients/{client_id}/licenses")
+async def get_client_licenses(client_id: int, status: Optional[str] = None):
+    return await _licenses_by_id(await run_io(license_index.ids, "clientId", client_id, status))
+
+
+@app.get("/api/products/{product_id}/licenses")
+async def get_product_licenses(product_id: int, status: Optional[str] = None):
+    return await _licenses_by_id(await run_io(license_index.ids, "productId", product_id, status))
+
+
+@app.post("/api/licenses/expire")
+async def expire_licenses_now():
+    """Run the expiry sweep immediately instead of waiting for the next interval."""
+    expired = await expire_licenses()
+    return {"expired": expired}
+
+
+async def expire_licenses():
+    """
+    Mark every active license whose endDate has passed as expired and add an
+    "expired" audit entry to it. Candidates come from the endDate index, so
+    a sweep with nothing to do touches no documents.
+    """
+    yesterday = (datetime.now(timezone.utc).date() - timedelta(days=1)).isoformat()
+    async with locks.write(LICENSES_PATH):
+        ids = await run_io(license_index.ending, None, yesterday, "active")
+        if not ids:
+            return []
+        audit_ids = await run_io(sequences.reserve, "licenseAuditId", len(ids))
+        now = current_time()
+        records = [
+            {"path": LICENSES_PATH, "op": "upsert_child", "key": "licenseId", "id": lid,
+             "field": "audits", "childKey": "licenseAuditId",
+             "doc": {"licenseAuditId": aid, "action": "expired", "timestamp": now},
+             "touch": {"status": "expired", "lastModified": now}}
+            for lid, aid in zip(ids, audit_ids)
+        ]
+        await run_io(store.batch, records)
+    print(f"✅ Expired {len(ids)} license(s)")
+    return ids
+
+
+async def sweep_licenses(interval: float):
+    while True:
+        try:
+            if leadership.held():
+                await expire_licenses()
+        except Exception as e:
+            print("❌ License expiry sweep failed:", e)
+        await asyncio.sleep(interval)
+
+
+@app.get("/api/licenses/{license_id}", dependencies=[Depends(conditional_entity(LICENSES_PATH, "licenseId", "license_id"))])
 async def get_license(license_id: int):
     """Fetch a single license by ID."""
-    licenses = load_json(LICENSES_PATH)
-    license_obj = next((l for l in licenses if l["licenseId"] == license_id), None)
+    async with locks.read(LICENSES_PATH):
+        license_obj = await run_io(store.find, LICENSES_PATH, "licenseId", license_id)
     if not license_obj:
         raise HTTPException(status_code=404, detail="License not found")
     return license_obj
 
+@app.get("/api/licenses/{license_id}/audits")
+async def get_license_audits(
+    license_id: int, response: Response,
+    offset: int = Query(0, ge=0), limit: int = Query(50, ge=1, le=1000),
+):
+    """Full audit history, newest first; older pages come from the archive."""
+    return await history_page(license_audits, license_id, response, offset, limit, "License not found")
+
 @app.post("/api/licenses")
 async def create_license(license_data: dict):
     """Create a new license."""
-    licenses = load_json(LICENSES_PATH)
-    new_id = max([l["licenseId"] for l in licenses], default=0) + 1
+    new_id = await run_io(sequences.next, "licenseId")
     license_data["licenseId"] = new_id
     license_data["lastModified"] = current_time()
-    licenses.append(license_data)
-    save_json(LICENSES_PATH, licenses)
-    return license_data
+    async with locks.write(LICENSES_PATH):
+        return await run_io(store.upsert, LICENSES_PATH, "licenseId", license_data)
 
 @app.put("/api/licenses/{license_id}")
-async def update_license(license_id: int, updated_license: dict = Body(...)):
-    print("\n--- UPDATE REQUEST ---")
-    print("License ID:", license_id)
-    print("Data received:", updated_license)
-    print("-----------------------\n")
-
-    licenses = load_json(LICENSES_PATH)
-    found = False
-
-    for idx, l in enumerate(licenses):
-        if int(l["licenseId"]) == int(license_id):
-            found = True
-            updated_license["licenseId"] = license_id
-            updated_license["lastModified"] = current_time()
-            licenses[idx] = updated_license
-            save_json(LICENSES_PATH, licenses)
-            return updated_license
-
-    if not found:
-        print("❌ License not found in file!")
-        raise HTTPException(status_code=404, detail="License not found")
+async def update_license(license_id: int, request: Request, response: Response, updated_license: dict = Body(...)):
+    async with locks.write(LICENSES_PATH):
+        if not await run_io(store.find, LICENSES_PATH, "licenseId", license_id):
+            raise HTTPException(status_code=404, detail="License not found")
+
+        check_if_match(request, LICENSES_PATH, license_id)
+        updated_license["licenseId"] = license_id
+        updated_license["lastModified"] = current_time()
+        updated_license = await run_io(store.upsert, LICENSES_PATH, "licenseId", updated_license)
+        entity_headers(response, LICENSES_PATH, license_id)
+    return updated_license
 
 
 @app.delete("/api/licenses/{license_id}")
-async def delete_license(license_id: int):
+async def delete_license(license_id: int, request: Request):
     """Delete a license by ID."""
-    licenses = load_json(LICENSES_PATH)
-    new_licenses = [l for l in licenses if l["licenseId"] != license_id]
-    if len(new_licenses) == len(licenses):
-        raise HTTPException(status_code=404, detail="License not found")
-    save_json(LICENSES_PATH, new_licenses)
+    async with locks.write(LICENSES_PATH):
+        check_if_match(request, LICENSES_PATH, license_id)
+        if not await run_io(store.delete, LICENSES_PATH, "licenseId", license_id):
+            raise HTTPException(status_code=404, detail="License not found")
+        await asyncio.to_thread(license_audits.drop, license_id)
     return {"message": f"License {license_id} deleted successfully"}
 
 app.include_router(client_product_router)
\ No newline at end of file
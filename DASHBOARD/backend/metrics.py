@@ -0,0 +1,164 @@
+import bisect, threading, time
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}            # label values -> state
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(l, "")) for l in self.labels)
+
+    def _label_text(self, key, extra=()):
+        pairs = [*zip(self.labels, key), *extra]
+        if not pairs:
+            return ""
+        escaped = (v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+        return "{" + ",".join(f'{n}="{v}"' for (n, _), v in zip(pairs, escaped)) + "}"
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines += self._samples(key, value)
+        return lines
+
+    def _samples(self, key, value):
+        return [f"{self.name}{self._label_text(key)} {_num(value)}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0, 0.0]
+            i = bisect.bisect_left(self.buckets, value)
+            if i < len(self.buckets):
+                state[0][i] += 1
+            state[1] += 1
+            state[2] += value
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _samples(self, key, state):
+        counts, total, sum_ = state
+        lines, running = [], 0
+        for bound, count in zip(self.buckets, counts):
+            running += count
+            lines.append(f"{self.name}_bucket{self._label_text(key, [('le', _num(bound))])} {running}")
+        lines.append(f"{self.name}_bucket{self._label_text(key, [('le', '+Inf')])} {total}")
+        lines.append(f"{self.name}_sum{self._label_text(key)} {_num(sum_)}")
+        lines.append(f"{self.name}_count{self._label_text(key)} {total}")
+        return lines
+
+
+def _num(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        for metric in self._metrics:
+            lines += metric.render()
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+# -----------------------------------------------------
+# DASHBOARD METRICS
+# -----------------------------------------------------
+REQUEST_SECONDS = registry.register(Histogram(
+    "dashboard_request_duration_seconds", "Time spent in a route, validation to response",
+    labels=("method", "route", "status"),
+))
+PHASE_SECONDS = registry.register(Histogram(
+    "dashboard_request_phase_duration_seconds",
+    "Route time per phase: validate (body parsing, validation, dependencies), "
+    "handler (endpoint function), serialize (response encoding)",
+    labels=("method", "route", "phase"),
+))
+STORAGE_SECONDS = registry.register(Histogram(
+    "dashboard_storage_duration_seconds", "JSON parse (load) and serialize (flush) time per file",
+    labels=("op", "file"),
+))
+STORAGE_READ_BYTES = registry.register(Counter(
+    "dashboard_storage_read_bytes_total", "Bytes read from storage files", labels=("file",),
+))
+STORAGE_WRITTEN_BYTES = registry.register(Counter(
+    "dashboard_storage_written_bytes_total", "Bytes written to storage files", labels=("file",),
+))
+STORE_MUTATIONS = registry.register(Counter(
+    "dashboard_store_mutations_total", "Store change events by collection and op", labels=("file", "op"),
+))
+LOOP_LAG_SECONDS = registry.register(Histogram(
+    "dashboard_event_loop_lag_seconds", "How late the event loop woke up a periodic probe",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0),
+))
+LOOP_LAG_LAST = registry.register(Gauge(
+    "dashboard_event_loop_lag_last_seconds", "Lag measured by the most recent probe",
+))
+
+RESPONSE_BODY_CACHE = registry.register(Counter(
+    "dashboard_response_body_cache_total", "List responses served from / encoded into the body cache",
+    labels=("result",),
+))
+ARTIFACT_HASHED_BYTES = registry.register(Counter(
+    "dashboard_artifact_hashed_bytes_total", "Bytes of artifact files hashed (cache hits not included)",
+))
+ARTIFACT_VERIFICATIONS = registry.register(Counter(
+    "dashboard_artifact_verifications_total", "Artifact verification results by status", labels=("status",),
+))
+
+
+def on_store_change(event):
+    STORE_MUTATIONS.inc(file=event["path"], op=event["op"])
@@ -0,0 +1,88 @@
+import os, sys, threading, time
+from collections import Counter
+
+import config
+
+
+class SamplingProfiler:
+    """
+    Low-overhead sampling profiler that can be switched on and off while the
+    server runs. A background thread snapshots every other thread's stack
+    each `interval` seconds and counts identical stacks; collapsed() returns
+    them in the folded format flamegraph tools read
+    ("thread;file:function;file:function count").
+    """
+
+    def __init__(self):
+        self.interval = config.PROFILER_INTERVAL
+        self._stacks = Counter()
+        self._samples = 0
+        self._started = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def start(self, interval=None):
+        with self._lock:
+            if interval:
+                self.interval = interval
+            if self._thread is not None:
+                return
+            self._stop.clear()
+            self._started = time.time()
+            self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._stop.set()
+            thread.join()
+
+    def reset(self):
+        with self._lock:
+            self._stacks.clear()
+            self._samples = 0
+
+    def status(self) -> dict:
+        return {
+            "running": self.running,
+            "interval": self.interval,
+            "samples": self._samples,
+            "since": self._started,
+        }
+
+    def collapsed(self) -> str:
+        with self._lock:
+            stacks = self._stacks.most_common()
+        return "".join(f"{stack} {count}\n" for stack, count in stacks)
+
+    def _run(self):
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            frames = sys._current_frames()
+            with self._lock:
+                for ident, frame in frames.items():
+                    if ident == me:
+                        continue
+                    self._stacks[_fold(names.get(ident, str(ident)), frame)] += 1
+                self._samples += 1
+
+
+def _fold(thread_name, frame):
+    parts = []
+    while frame is not None:
+        code = frame.f_code
+        parts.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+        frame = frame.f_back
+    parts.append(thread_name)
+    return ";".join(reversed(parts))
+
+
+profiler = SamplingProfiler()
@@ -0,0 +1,133 @@
+import base64, json
+from typing import Optional
+
+from fastapi import HTTPException, Query, Request, Response
+
+from indexes import id_key
+
+# "stream" is read by streaming.stream_format
+RESERVED = {"limit", "offset", "cursor", "sort", "fields", "dateFrom", "dateTo", "stream"}
+
+
+class ListQuery:
+    """
+    Common query parameters for collection endpoints.
+
+    - limit / offset: offset pagination
+    - cursor: keyset pagination, pass back the X-Next-Cursor header of the previous page;
+      without a sort, paginated pages (limit or cursor) come in id order
+    - sort: field name, prefix with "-" for descending (e.g. sort=-releaseDate)
+    - fields: projection, e.g. fields=releaseId,version or fields=-artifacts,-updateLogs
+    - dateFrom / dateTo: inclusive range on the endpoint's date field
+    - any other parameter filters on an allowed field; comma separated values match any
+
+    Without parameters the whole collection comes back as before. The body is
+    always a plain JSON array; X-Total-Count carries the number of matches.
+    """
+
+    def __init__(
+        self,
+        request: Request,
+        limit: Optional[int] = Query(None, ge=1, le=1000),
+        offset: int = Query(0, ge=0),
+        cursor: Optional[str] = None,
+        sort: Optional[str] = None,
+        fields: Optional[str] = None,
+        dateFrom: Optional[str] = None,
+        dateTo: Optional[str] = None,
+    ):
+        self.limit = limit
+        self.offset = offset
+        self.cursor = cursor
+        self.sort = sort
+        self.fields = [f.strip() for f in fields.split(",") if f.strip()] if fields else []
+        self.date_from = dateFrom
+        self.date_to = dateTo
+        self.filters = {k: v for k, v in request.query_params.items() if k not in RESERVED}
+
+    def is_empty(self):
+        return not (
+            self.limit or self.offset or self.cursor or self.sort
+            or self.fields or self.date_from or self.date_to or self.filters
+        )
+
+    def apply(self, items, response: Response, key: str, filterable=(), date_field=None, default_sort=None):
+        """Filter, sort, paginate and project `items`; never mutates the documents."""
+        unknown = set(self.filters) - set(filterable)
+        if unknown:
+            raise HTTPException(400, f"Cannot filter on: {', '.join(sorted(unknown))}")
+        if (self.date_from or self.date_to) and not date_field:
+            raise HTTPException(400, "This collection has no date field to range on")
+        if self.is_empty():
+            response.headers["X-Total-Count"] = str(len(items))
+            return items
+
+        items = [x for x in items if self._matches(x, date_field)]
+
+        sort = self.sort or default_sort
+        field, reverse = (sort.lstrip("-"), sort.startswith("-")) if sort else (None, False)
+        order = lambda x: (_sortable(x.get(field)) if field else (), _sortable(x.get(key)))
+        if field or self.cursor or self.limit is not None:
+            # pages without a sort come in id order, so a cursor can always resume
+            # after its position even once the document it names is gone
+            items.sort(key=order, reverse=reverse)
+
+        response.headers["X-Total-Count"] = str(len(items))
+
+        if self.cursor:
+            after = _decode_cursor(self.cursor, sort)
+            items = [x for x in items if (order(x) < after if reverse else order(x) > after)]
+        else:
+            items = items[self.offset:]
+
+        if self.limit is not None:
+            if len(items) > self.limit:
+                response.headers["X-Next-Cursor"] = _encode_cursor(sort, order(items[self.limit - 1]))
+            items = items[:self.limit]
+
+        return [self._project(x) for x in items] if self.fields else items
+
+    def _matches(self, doc, date_field):
+        for name, raw in self.filters.items():
+            wanted = {v.strip() for v in raw.split(",")}
+            if id_key(doc.get(name)) not in wanted:
+                return False
+        if date_field:
+            value = doc.get(date_field) or ""
+            if self.date_from and value < self.date_from:
+                return False
+            # a bare date bound includes the whole day
+            if self.date_to and value[:len(self.date_to)] > self.date_to:
+                return False
+        return True
+
+    def _project(self, doc):
+        excluded = [f[1:] for f in self.fields if f.startswith("-")]
+        if excluded:
+            return {k: v for k, v in doc.items() if k not in excluded}
+        return {f: doc[f] for f in self.fields if f in doc}
+
+
+def _sortable(value):
+    # keeps mixed types (missing values, ints, legacy string ids) comparable
+    if value is None:
+        return (0, "")
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return (1, value)
+    return (2, str(value))
+
+
+def _encode_cursor(sort, position):
+    payload = json.dumps({"s": sort, "p": position}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+
+def _decode_cursor(cursor, sort):
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        position = tuple(tuple(p) for p in data["p"])
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(400, "Invalid cursor")
+    if data["s"] != sort:
+        raise HTTPException(400, "Cursor was issued for a different sort order")
+    return position
@@ -0,0 +1,221 @@
+import threading
+from collections import deque
+
+from indexes import id_key
+from store import store
+
+
+class DependencyCycle(ValueError):
+    pass
+
+
+class ReleaseGraph:
+    """
+    Release dependency graph (releaseId -> dependsOnReleaseId edges from
+    every release's "dependencies" list), kept in step with store change
+    events.
+
+    Transitive closures are memoized per release. Adding or removing an edge
+    on release A only drops the cached closures of A and of the releases that
+    (transitively) depend on A; everything else stays cached.
+    """
+
+    def __init__(self, releases_path: str):
+        self.path = releases_path
+        self._lock = threading.RLock()
+        self._stale = True
+        self._changes = 0     # relevant events seen, to detect writes racing a rebuild
+
+        self._releases = {}   # releaseId key -> releaseId as stored
+        self._edges = {}      # releaseId key -> {releaseDependencyId key: target key}
+        self._deps = {}       # releaseId key -> {target key: number of edges}
+        self._rdeps = {}      # target key -> {releaseId key}
+        self._closure = {}    # releaseId key -> frozenset of target keys
+
+    # -------------------------
+    # READ
+    # -------------------------
+    def ready(self):
+        while self._stale:
+            # read storage without holding our lock, as UpdatesView does
+            seen = self._changes
+            releases = store.load(self.path)
+            with self._lock:
+                if self._changes == seen:
+                    self._rebuild(releases)
+
+    def exists(self, release_id) -> bool:
+        self.ready()
+        return id_key(release_id) in self._releases
+
+    def closure(self, release_id) -> list:
+        """Every release `release_id` depends on, directly or not."""
+        self.ready()
+        with self._lock:
+            return sorted((self._id(k) for k in self._closure_of(id_key(release_id))), key=id_key)
+
+    def dependents(self, release_id, transitive=False) -> list:
+        """Releases that depend on `release_id` (directly, or through others)."""
+        self.ready()
+        with self._lock:
+            rid = id_key(release_id)
+            keys = self._reverse_closure(rid) - {rid} if transitive else self._rdeps.get(rid, set())
+            return sorted((self._id(k) for k in keys), key=id_key)
+
+    def install_order(self, release_id) -> dict:
+        """
+        {"order": [...], "missing": [...]}: the release and everything it
+        needs, dependencies before dependents. "missing" lists referenced
+        releases that no longer exist. Raises DependencyCycle on a cycle.
+        """
+        self.ready()
+        with self._lock:
+            root = id_key(release_id)
+            order, state = [], {}            # key -> 1 visiting / 2 done
+            stack = [(root, iter(sorted(self._deps.get(root, ()))))]
+            state[root] = 1
+            while stack:
+                node, children = stack[-1]
+                child = next(children, None)
+                if child is None:
+                    stack.pop()
+                    state[node] = 2
+                    order.append(node)
+                elif state.get(child) == 1:
+                    raise DependencyCycle(f"Release {self._id(child)} depends on itself")
+                elif child not in state:
+                    state[child] = 1
+                    stack.append((child, iter(sorted(self._deps.get(child, ())))))
+            return {
+                "order": [self._id(k) for k in order if k in self._releases],
+                "missing": [self._id(k) for k in order if k not in self._releases],
+            }
+
+    def rejected(self, edges) -> dict:
+        """
+        Check new (releaseId, dependsOnReleaseId) edges, in order, as if each
+        accepted one were already stored. Returns {position: reason} for the
+        edges that would close a cycle.
+        """
+        self.ready()
+        with self._lock:
+            pending, problems = {}, {}
+            for i, (release_id, target) in enumerate(edges):
+                rid, tid = id_key(release_id), id_key(target)
+                if rid == tid:
+                    problems[i] = "A release cannot depend on itself"
+                elif self._reaches(tid, rid, pending):
+                    problems[i] = f"Release {target} already depends on release {release_id}"
+                else:
+                    pending.setdefault(rid, set()).add(tid)
+            return problems
+
+    def check(self, release_id, targets):
+        problems = self.rejected([(release_id, t) for t in targets])
+        if problems:
+            raise DependencyCycle(next(iter(problems.values())))
+
+    # -------------------------
+    # MAINTENANCE
+    # -------------------------
+    def on_change(self, event):
+        if event["path"] != self.path:
+            return
+        with self._lock:
+            self._changes += 1
+            if self._stale:
+                return
+            op, rid = event["op"], id_key(event.get("id"))
+            if op == "replace":
+                self._stale = True
+            elif op == "upsert":
+                self._set_release(event["result"])
+            elif op == "delete":
+                self._releases.pop(rid, None)
+                self._set_edges(rid, {})
+                del self._edges[rid], self._deps[rid]
+            elif event.get("field") == "dependencies":
+                edges = dict(self._edges.get(rid, {}))
+                if op == "upsert_child" and event["doc"].get("dependsOnReleaseId") is not None:
+                    edges[id_key(event["doc"].get("releaseDependencyId"))] = id_key(event["doc"].get("dependsOnReleaseId"))
+                elif op == "delete_child":
+                    edges.pop(id_key(event.get("childId")), None)
+                self._set_edges(rid, edges)
+
+    def _rebuild(self, releases):
+        self._releases, self._edges, self._deps, self._rdeps, self._closure = {}, {}, {}, {}, {}
+        for release in releases:
+            self._set_release(release)
+        self._stale = False
+
+    def _set_release(self, release):
+        rid = id_key(release.get("releaseId"))
+        self._releases[rid] = release.get("releaseId")
+        self._set_edges(rid, {
+            id_key(d.get("releaseDependencyId")): id_key(d.get("dependsOnReleaseId"))
+            for d in release.get("dependencies") or []
+            if d.get("dependsOnReleaseId") is not None
+        })
+
+    def _set_edges(self, rid, edges):
+        old = self._deps.get(rid, {})
+        new = {}
+        for target in edges.values():
+            new[target] = new.get(target, 0) + 1
+        if new.keys() != old.keys():
+            # drop stale closures before the reverse edges change
+            for key in self._reverse_closure(rid):
+                self._closure.pop(key, None)
+            for target in old.keys() - new.keys():
+                self._rdeps[target].discard(rid)
+                if not self._rdeps[target]:
+                    del self._rdeps[target]
+            for target in new.keys() - old.keys():
+                self._rdeps.setdefault(target, set()).add(rid)
+        self._edges[rid], self._deps[rid] = edges, new
+
+    def _closure_of(self, rid):
+        cached = self._closure.get(rid)
+        if cached is not None:
+            return cached
+        seen, queue = set(), deque(self._deps.get(rid, ()))
+        while queue:
+            node = queue.popleft()
+            if node in seen:
+                continue
+            seen.add(node)
+            known = self._closure.get(node)
+            if known is not None:
+                seen |= known
+            else:
+                queue.extend(self._deps.get(node, ()))
+        result = self._closure[rid] = frozenset(seen)
+        return result
+
+    def _reverse_closure(self, rid):
+        seen, queue = {rid}, deque([rid])
+        while queue:
+            for parent in self._rdeps.get(queue.popleft(), ()):
+                if parent not in seen:
+                    seen.add(parent)
+                    queue.append(parent)
+        return seen
+
+    def _reaches(self, start, goal, pending):
+        if not pending:
+            return goal in self._closure_of(start)
+        seen, queue = {start}, deque([start])
+        while queue:
+            node = queue.popleft()
+            for nxt in (*self._deps.get(node, ()), *pending.get(node, ())):
+                if nxt == goal:
+                    return True
+                if nxt not in seen:
+                    seen.add(nxt)
+                    queue.append(nxt)
+        return False
+
+    def _id(self, key):
+        if key in self._releases:
+            return self._releases[key]
+        return int(key) if key.lstrip("-").isdigit() else key
@@ -1,59 +1,187 @@
-from fastapi import APIRouter, HTTPException
-import json, os
-from datetime import datetime
-
-router = APIRouter()
+from fastapi import APIRouter, HTTPException, Request, Response, Depends
+from typing import List
+import os
+from datetime import datetime, timezone
+import bulk
+from store import store
+from query import ListQuery
+from indexes import id_key
+from sequences import sequences, max_id
+from locks import locks, run_io
+from versions import conditional, check_if_match
+from instrumentation import InstrumentedRoute
+from assignments import AssignmentIndex, relinked
+
+router = APIRouter(route_class=InstrumentedRoute)
 
 DATA_FILE = os.path.join("data", "client_product.json")
+# client documents carry the assigned products in their productIds rows
+CLIENTS_FILE = "clients.json"
 
 def load_data():
-    if not os.path.exists(DATA_FILE):
+    try:
+        return store.load(DATA_FILE)
+    except ValueError:
         return []
-    with open(DATA_FILE, "r") as f:
-        try:
-            return json.load(f)
-        except:
-            return []
 
 def save_data(data):
-    with open(DATA_FILE, "w") as f:
-        json.dump(data, f, indent=2)
-
-
-@router.get("/client-products")
-def get_client_products():
-    return load_data()
+    store.save(DATA_FILE, data)
+
+
+sequences.register("clientProductId", lambda: max_id(load_data(), "id"))
+
+assignments = AssignmentIndex(DATA_FILE)
+store.subscribe(assignments.on_change)
+
+
+def relink_records(changes: dict) -> list:
+    """
+    Client upserts that keep productIds / releaseIds / updateLogIds in step
+    with assignments: changes maps clientId -> (added, removed) product ids.
+    Only the clients named are read; unknown clients are skipped.
+    """
+    records = []
+    for client_id, (added, removed) in changes.items():
+        client = store.find(CLIENTS_FILE, "clientId", client_id)
+        fields = relinked(client, added, removed) if client else None
+        if fields:
+            doc = {**client, **fields, "lastModified": datetime.now(timezone.utc).isoformat()}
+            records.append({"path": CLIENTS_FILE, "op": "upsert", "key": "clientId", "doc": doc})
+    return records
+
+
+def unassign_records(ids) -> list:
+    """Delete records for assignments plus the client upserts dropping their rows."""
+    records, changes = [], {}
+    for id in ids:
+        entry = store.find(DATA_FILE, "id", id)
+        records.append({"path": DATA_FILE, "op": "delete", "key": "id", "id": id})
+        if entry:
+            changes.setdefault(entry["clientId"], ([], []))[1].append(entry["productId"])
+    return records + relink_records(changes)
+
+
+def sync_records(client_id, product_ids) -> list:
+    """
+    Assignment upserts and deletes that make one client's assignments match
+    the products in its productIds rows (a full client PUT edits the rows
+    directly). Ids for new assignments are reserved here.
+    """
+    wanted = {id_key(p): p for p in product_ids if p}
+    assigned = assignments.of_client(client_id)
+    fresh = [p for key, p in wanted.items() if key not in assigned]
+    records = [
+        {"path": DATA_FILE, "op": "delete", "key": "id", "id": id}
+        for key, id in assigned.items() if key not in wanted
+    ]
+    if fresh:
+        assigned_at = datetime.utcnow().isoformat()
+        for pid, id in zip(fresh, sequences.reserve("clientProductId", len(fresh))):
+            entry = {"id": id, "clientId": client_id, "productId": pid, "assignedAt": assigned_at}
+            records.append({"path": DATA_FILE, "op": "upsert", "key": "id", "doc": entry})
+    return records
+
+
+def _entries(ids):
+    return [e for e in (store.find(DATA_FILE, "id", id) for id in ids) if e]
+
+
+@router.get("/client-products", dependencies=[Depends(conditional(DATA_FILE))])
+async def get_client_products(response: Response, q: ListQuery = Depends()):
+    async with locks.read(DATA_FILE):
+        data = await run_io(load_data)
+    return q.apply(
+        data, response, key="id",
+        filterable=("id", "clientId", "productId"), date_field="assignedAt",
+    )
+
+
+@router.get("/clients/{client_id}/products", dependencies=[Depends(conditional(DATA_FILE))])
+async def get_client_assignments(client_id: int, response: Response, q: ListQuery = Depends()):
+    """Assignments of one client, read off the client -> products index."""
+    async with locks.read(DATA_FILE):
+        assigned = await run_io(assignments.of_client, client_id)
+        data = await run_io(_entries, assigned.values())
+    return q.apply(data, response, key="id", filterable=("id", "productId"), date_field="assignedAt")
+
+
+@router.get("/products/{product_id}/clients", dependencies=[Depends(conditional(DATA_FILE))])
+async def get_product_assignments(product_id: int, response: Response, q: ListQuery = Depends()):
+    """Assignments of one product, read off the product -> clients index."""
+    async with locks.read(DATA_FILE):
+        assigned = await run_io(assignments.of_product, product_id)
+        data = await run_io(_entries, assigned.values())
+    return q.apply(data, response, key="id", filterable=("id", "clientId"), date_field="assignedAt")
 
 
 @router.post("/clients/{client_id}/assign/{product_id}")
-def assign_client_product(client_id: int, product_id: int):
-    db = load_data()
-
-     
-    for entry in db:
-        if entry["clientId"] == client_id and entry["productId"] == product_id:
+async def assign_client_product(client_id: int, product_id: int):
+    # the duplicate check and the insert must not interleave with another assign
+    async with locks.write(DATA_FILE, CLIENTS_FILE):
+        if await run_io(assignments.find, client_id, product_id) is not None:
             raise HTTPException(status_code=400, detail="Already assigned")
 
-    new_entry = {
-        "id": int(datetime.now().timestamp()),
-        "clientId": client_id,
-        "productId": product_id,
-        "assignedAt": datetime.utcnow().isoformat()
-    }
-
-    db.append(new_entry)
-    save_data(db)
-
-    return new_entry
+        new_entry = {
+            "id": await run_io(sequences.next, "clientProductId"),
+            "clientId": client_id,
+            "productId": product_id,
+            "assignedAt": datetime.utcnow().isoformat()
+        }
+
+        records = [{"path": DATA_FILE, "op": "upsert", "key": "id", "doc": new_entry}]
+        records += await run_io(relink_records, {client_id: ([product_id], [])})
+        return (await run_io(store.batch, records))[0]
+
+
+@router.post("/clients/{client_id}/assign")
+async def assign_client_products(client_id: int, product_ids: List[int]):
+    """Assign many products to a client in one commit; duplicates are reported per item."""
+    bulk.check_size(product_ids)
+    async with locks.write(DATA_FILE, CLIENTS_FILE):
+        taken = set(await run_io(assignments.of_client, client_id))
+
+        fresh = []
+        for pid in product_ids:
+            if id_key(pid) not in taken:
+                taken.add(id_key(pid))
+                fresh.append(pid)
+
+        new_ids = await run_io(sequences.reserve, "clientProductId", len(fresh)) if fresh else []
+        assigned_at = datetime.utcnow().isoformat()
+        new_entries = {
+            pid: {"id": id, "clientId": client_id, "productId": pid, "assignedAt": assigned_at}
+            for pid, id in zip(fresh, new_ids)
+        }
+        records = [{"path": DATA_FILE, "op": "upsert", "key": "id", "doc": e} for e in new_entries.values()]
+        if fresh:
+            records += await run_io(relink_records, {client_id: (fresh, [])})
+        await run_io(store.batch, records)
+
+    items = []
+    for i, pid in enumerate(product_ids):
+        entry = new_entries.pop(pid, None)
+        if entry:
+            items.append({"index": i, "id": entry["id"], "productId": pid, "status": 200})
+        else:
+            items.append({"index": i, "productId": pid, "status": 400, "detail": "Already assigned"})
+    return bulk.summary(items)
+
+
+@router.post("/client-products/delete")
+async def delete_assignments(ids: List[int]):
+    bulk.check_size(ids)
+    async with locks.write(DATA_FILE, CLIENTS_FILE):
+        records = await run_io(unassign_records, ids)
+        results = await run_io(store.batch, records)
+    return bulk.report(results[:len(ids)], ids)
 
 
 @router.delete("/client-products/{id}")
-def delete_assignment(id: int):
-    db = load_data()
-    new_db = [x for x in db if x["id"] != id]
-
-    if len(db) == len(new_db):
-        raise HTTPException(status_code=404, detail="Not found")
+async def delete_assignment(id: int, request: Request):
+    async with locks.write(DATA_FILE, CLIENTS_FILE):
+        check_if_match(request, DATA_FILE, id)
+        records = await run_io(unassign_records, [id])
+        if not (await run_io(store.batch, records))[0]:
+            raise HTTPException(status_code=404, detail="Not found")
 
-    save_data(new_db)
     return {"success": True}
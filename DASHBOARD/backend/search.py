@@ -0,0 +1,288 @@
+import heapq, math, re, threading
+from bisect import bisect_left, insort
+
+from indexes import id_key
+from store import store
+
+WORD = re.compile(r"[^\W_]+")
+
+# matches on a prefix or with a typo count for less than an exact term
+PREFIX_FACTOR = 0.6
+FUZZY_FACTOR = 0.4
+MAX_EXPANSIONS = 64     # vocabulary terms one query word may expand to
+
+
+class SearchIndex:
+    """
+    Inverted index for full-text search across collections, kept up to date
+    from store change events.
+
+    `entities` maps an entity type to (path, key, fields, label) where
+    fields is [(field, weight, keyword)]. A field path may step into nested
+    objects and lists ("locations.city"). Text is split into words; keyword
+    fields (SKUs, keys, versions, emails) are also indexed whole, so
+    "5.9.4" or a key fragment matches as typed.
+
+    Each query word matches terms exactly, by prefix (searching as you
+    type) or with one typo (a deletion-neighbourhood lookup over alphabetic
+    terms, for words of 4+ characters). Documents must match every word and
+    are ranked by the sum of field weight x idf over the matched terms.
+    Postings are also grouped by weight, so ranking walks the best matches
+    first and stops once nothing further down can reach the top `limit`.
+    """
+
+    def __init__(self, entities: dict):
+        self.entities = entities
+        self._paths = {spec[0]: entity for entity, spec in entities.items()}
+        self._lock = threading.RLock()
+        self._stale = True
+        self._changes = 0     # relevant events seen, to detect writes racing a rebuild
+
+        self._postings = {}   # term -> {(entity, id_key): weight}
+        self._tiers = {}      # term -> {weight: {(entity, id_key): None}}, the postings grouped by weight
+        self._terms = []      # sorted vocabulary, for prefix ranges
+        self._deletes = {}    # term with one character removed -> {term}
+        self._docs = {}       # (entity, id_key) -> ({term: weight}, id, label)
+
+    # -------------------------
+    # READ
+    # -------------------------
+    def ready(self):
+        while self._stale:
+            # read storage without holding our lock, as UpdatesView does
+            seen = self._changes
+            collections = {e: store.load(spec[0]) for e, spec in self.entities.items()}
+            with self._lock:
+                if self._changes == seen:
+                    self._rebuild(collections)
+
+    def search(self, query: str, types=None, limit: int = 20, fuzzy: bool = True) -> list:
+        """Ranked [{"type", "id", "label", "score"}] for documents matching every word of `query`."""
+        self.ready()
+        words = _query_words(query)
+        if not words:
+            return []
+        with self._lock:
+            per_word = []
+            for word in words:
+                terms = self._expand(word, fuzzy)
+                if not terms and not word.isalnum():
+                    # "data-insight" typed against split text: every part must match instead
+                    per_word += [self._expand(part, fuzzy) for part in WORD.findall(word)]
+                else:
+                    per_word.append(terms)
+            if not per_word or not all(per_word):
+                return []
+
+            # walk the most selective word's postings from its highest score down
+            # and look the other words up per document (threshold algorithm)
+            per_word.sort(key=lambda terms: sum(len(self._postings[t]) for t in terms))
+            boosted = [
+                [(t, self._postings[t], factor * self._idf(t)) for t, factor in terms.items()]
+                for terms in per_word
+            ]
+            others = boosted[1:]
+            rest_max = sum(max(boost * max(self._tiers[t]) for t, _, boost in word) for word in others)
+
+            levels = sorted(
+                ((boost * weight, term, weight) for term, _, boost in boosted[0] for weight in self._tiers[term]),
+                reverse=True,
+            )
+            top, seen, order = [], set(), 0   # min-heap of (score, -order, doc)
+            for level, term, weight in levels:
+                if len(top) >= limit and top[0][0] >= level + rest_max:
+                    break
+                for doc in self._tiers[term][weight]:
+                    if doc in seen or (types and doc[0] not in types):
+                        continue
+                    seen.add(doc)
+                    score = level
+                    for word in others:
+                        extra = _best(word, doc)
+                        if not extra:
+                            break
+                        score += extra
+                    else:
+                        order += 1
+                        if len(top) < limit:
+                            heapq.heappush(top, (score, -order, doc))
+                        elif (score, -order) > top[0][:2]:
+                            heapq.heapreplace(top, (score, -order, doc))
+
+            return [
+                {"type": doc[0], "id": self._docs[doc][1], "label": self._docs[doc][2], "score": round(score, 4)}
+                for score, _, doc in sorted(top, reverse=True)
+            ]
+
+    def _expand(self, word, fuzzy):
+        # {vocabulary term: factor} for the terms this word matches
+        candidates = {}
+        if word in self._postings:
+            candidates[word] = 1.0
+
+        start = bisect_left(self._terms, word)
+        for term in self._terms[start:start + MAX_EXPANSIONS + 1]:
+            if not term.startswith(word):
+                break
+            candidates.setdefault(term, PREFIX_FACTOR * len(word) / len(term))
+
+        if fuzzy and len(word) >= 4:
+            for term in self._near(word):
+                candidates.setdefault(term, FUZZY_FACTOR)
+        return candidates
+
+    def _idf(self, term):
+        return math.log(1 + (len(self._docs) or 1) / len(self._postings[term]))
+
+    def _near(self, word):
+        # terms within one insertion / deletion / substitution of word
+        found = set(self._deletes.get(word, ()))
+        for variant in _deletions(word):
+            if variant in self._postings:
+                found.add(variant)
+            found |= self._deletes.get(variant, set())
+        found.discard(word)
+        return [t for t in found if _within_one(word, t)]
+
+    # -------------------------
+    # MAINTENANCE
+    # -------------------------
+    def on_change(self, event):
+        entity = self._paths.get(event["path"])
+        if entity is None:
+            return
+        with self._lock:
+            self._changes += 1
+            if self._stale:
+                return
+            op = event["op"]
+            if op == "replace":
+                self._stale = True
+                return
+            path, key, fields, _ = self.entities[entity]
+            if op == "upsert":
+                self._index(entity, event["result"])
+            elif op == "delete":
+                self._set_terms((entity, id_key(event.get("id"))), {}, None, None)
+            elif any(f.split(".")[0] == event.get("field") for f, _, _ in fields):
+                # a child op on an indexed list (client locations): read the document back
+                doc = store.find(path, key, event.get("id"))
+                if doc:
+                    self._index(entity, doc)
+
+    def _rebuild(self, collections):
+        self._postings, self._tiers, self._terms, self._deletes, self._docs = {}, {}, None, {}, {}
+        for entity, docs in collections.items():
+            for doc in docs:
+                self._index(entity, doc)
+        # one sort instead of an insort per new term
+        self._terms = sorted(self._postings)
+        self._stale = False
+
+    def _index(self, entity, doc):
+        _, key, fields, label = self.entities[entity]
+        terms = {}
+        for field, weight, keyword in fields:
+            for value in _values(doc, field.split(".")):
+                text = str(value).lower()
+                words = WORD.findall(text)
+                if keyword and text.strip() and text.strip() not in words:
+                    words.append(text.strip())
+                for word in words:
+                    terms[word] = terms.get(word, 0) + weight
+        self._set_terms((entity, id_key(doc.get(key))), terms, doc.get(key), label(doc))
+
+    def _set_terms(self, ref, terms, id, label):
+        old = self._docs.pop(ref, ({}, None, None))[0]
+        for term in old.keys() - terms.keys():
+            self._untier(term, ref, old[term])
+            postings = self._postings[term]
+            postings.pop(ref, None)
+            if not postings:
+                self._drop_term(term)
+        for term, weight in terms.items():
+            if term not in self._postings:
+                self._add_term(term)
+            previous = self._postings[term].get(ref)
+            if previous != weight:
+                if previous is not None:
+                    self._untier(term, ref, previous)
+                self._tiers[term].setdefault(weight, {})[ref] = None
+            self._postings[term][ref] = weight
+        if terms or id is not None:
+            self._docs[ref] = (terms, id, label)
+
+    def _untier(self, term, ref, weight):
+        tier = self._tiers[term][weight]
+        del tier[ref]
+        if not tier:
+            del self._tiers[term][weight]
+
+    def _add_term(self, term):
+        self._postings[term] = {}
+        self._tiers[term] = {}
+        if self._terms is not None:
+            insort(self._terms, term)
+        if _fuzzy(term):
+            for variant in _deletions(term):
+                self._deletes.setdefault(variant, set()).add(term)
+
+    def _drop_term(self, term):
+        del self._postings[term], self._tiers[term]
+        del self._terms[bisect_left(self._terms, term)]
+        if _fuzzy(term):
+            for variant in _deletions(term):
+                terms = self._deletes.get(variant)
+                if terms is not None:
+                    terms.discard(term)
+                    if not terms:
+                        del self._deletes[variant]
+
+
+def _best(word, doc):
+    best = 0
+    for _, postings, boost in word:
+        weight = postings.get(doc)
+        if weight is not None and weight * boost > best:
+            best = weight * boost
+    return best
+
+
+def _values(value, parts):
+    # every value at a dotted path, stepping through lists
+    if isinstance(value, list):
+        for item in value:
+            yield from _values(item, parts)
+    elif not parts:
+        if value is not None and value != "":
+            yield value
+    elif isinstance(value, dict):
+        yield from _values(value.get(parts[0]), parts[1:])
+
+
+def _query_words(query):
+    words = (w.strip(".,;:!?\"'()[]{}").lower() for w in query.split())
+    return [w for w in words if w]
+
+
+def _fuzzy(term):
+    # typos are corrected against words only, not keys, numbers or versions
+    return len(term) >= 3 and term.isalpha()
+
+
+def _deletions(word):
+    return {word[:i] + word[i + 1:] for i in range(len(word))}
+
+
+def _within_one(a, b):
+    # Levenshtein distance <= 1
+    if abs(len(a) - len(b)) > 1:
+        return False
+    if len(a) > len(b):
+        a, b = b, a
+    i = 0
+    while i < len(a) and a[i] == b[i]:
+        i += 1
+    if len(a) == len(b):
+        return a[i + 1:] == b[i + 1:]
+    return a[i:] == b[i + 1:]
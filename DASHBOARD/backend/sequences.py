@@ -0,0 +1,52 @@
+import threading
+
+from store import store
+
+
+class SequenceAllocator:
+    """
+    Monotonic id sequences per entity type, persisted as one object
+    collection ({"productId": 12, ...}) through the store.
+
+    A sequence is seeded once per process with the highest id already
+    stored. Each allocation is then one atomic store bump to
+    max(persisted value, seed) + count, so ids stay unique even if the
+    counter file lags the data after a crash, and worker processes sharing
+    the data directory never hand out the same id.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._seeds = {}     # name -> callable returning the highest id in use
+        self._floors = {}    # name -> seed value, computed on first use
+        self._lock = threading.Lock()
+
+    def register(self, name: str, seed):
+        self._seeds[name] = seed
+
+    def next(self, name: str) -> int:
+        return self.reserve(name, 1).start
+
+    def reserve(self, name: str, count: int) -> range:
+        """Reserve a block of `count` consecutive ids, e.g. for bulk inserts."""
+        if count < 1:
+            raise ValueError("count must be at least 1")
+        with self._lock:
+            if name not in self._floors:
+                self._floors[name] = self._seeds[name]()
+            last = store.bump(self.path, name, count, floor=self._floors[name])
+            return range(last - count + 1, last + 1)
+
+
+def max_id(items, key: str) -> int:
+    """Highest integer id in a list of documents (non-numeric legacy ids are skipped)."""
+    best = 0
+    for item in items:
+        try:
+            best = max(best, int(item.get(key) or 0))
+        except (TypeError, ValueError):
+            pass
+    return best
+
+
+sequences = SequenceAllocator("sequences.json")
@@ -0,0 +1,373 @@
+import json, os, threading, time, uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import config
+from coordination import process_lock
+from metrics import STORAGE_READ_BYTES, STORAGE_WRITTEN_BYTES
+from store import CollectionStore, _copied, _fsync_dir, apply_mutation, empty_for
+
+
+class SharedCollectionStore(CollectionStore):
+    """
+    JSON backend for several worker processes sharing one data directory.
+
+    Every worker keeps the collections resident, as CollectionStore does,
+    and all of them persist through one append-only shared log:
+
+    - a mutation takes the cross-process lock, applies whatever the other
+      workers appended since it last looked, then applies its own record and
+      appends it, numbered with the next global sequence number ("seq")
+    - sync() (every request, plus a poll while idle) follows the log: one
+      stat() says whether anything was appended, and new records are applied
+      and emitted as ordinary change events, so derived views, version tags
+      and the change feed move incrementally in every worker
+    - the log starts with a header {"generation", "epoch", "seq", "at"}; once
+      a worker's write takes it past JOURNAL_COMPACT_BYTES, that worker
+      compacts in a background thread: it copies the collections changed in
+      this generation as far as it has applied the log (under the locks),
+      writes the copies aside (no lock), then, under the lock again, renames
+      them over the snapshots and swaps in the next generation, carrying
+      over the raw records after the copied offset. The compactor applies
+      nothing itself: every worker, this one included, finishes the old log
+      through its open descriptor on its next sync and then switches,
+      skipping the carried records by seq; a worker that missed a whole
+      generation reloads the snapshots.
+
+    Records are only applied on the calling thread (the event loop), as with
+    CollectionStore. There the cross-process lock is never waited for: a
+    call that needs it while another worker holds it raises ProcessLockBusy
+    and run_io() calls again once a thread got the lock.
+    """
+
+    shared = True
+
+    def __init__(self, log_path: str, lock=process_lock):
+        super().__init__(journal_path=None)
+        self.log_path = log_path
+        self.lock = lock
+        self._fd = None          # the log generation this worker follows
+        self._ino = None
+        self._offset = 0         # bytes of it applied so far
+        self._header_end = 0
+        self._generation = 0
+        self._seq = 0            # highest sequence number seen
+        self._touched = set()    # paths changed in the current generation
+        self._following = False
+        self._appended = 0       # appends by this worker, for when_durable()
+        self._synced = 0         # appends known to be fsynced
+        self._fsyncer = None
+        self._compactor = None   # background compaction thread
+
+    # -------------------------
+    # READ / WRITE
+    # -------------------------
+    def load(self, path: str, default=list):
+        with self._lock:
+            if path in self._data:
+                return self._data[path]
+            with self.lock:
+                self._follow()
+                return self._load_new(path, default)
+
+    def sync(self):
+        with self._lock:
+            self._follow()
+
+    def save(self, path: str, data):
+        with self.lock, self._lock:
+            self._follow()
+            record = {"path": path, "op": "replace", "data": data, "seq": self._seq + 1, "at": time.time()}
+            self._replaced(path, data, seq=record["seq"], at=record["at"])
+            self._append([record])
+        self._maybe_flush()
+
+    def batch(self, records):
+        records = [dict(r) for r in records]
+        with self.lock, self._lock:
+            self._follow()
+            at, results = time.time(), []
+            for i, record in enumerate(records):
+                record.update(seq=self._seq + 1 + i, at=at)
+                results.append(self._apply(record["path"], record))
+            applied = [r for r, result in zip(records, results) if result is not None]
+            if applied:
+                self._append(applied)
+        if applied:
+            self._maybe_flush()
+        return results
+
+    def _mutate(self, path, record):
+        record = {"path": path, **record}
+        with self.lock, self._lock:
+            self._follow()
+            record.update(seq=self._seq + 1, at=time.time())
+            result = self._apply(path, record)
+            if result is None:
+                return None
+            self._append([record])
+        self._maybe_flush()
+        return result
+
+    # -------------------------
+    # SHARED LOG
+    # -------------------------
+    def _append(self, records):
+        # caller holds both locks and has followed the log to its end
+        data = "".join(json.dumps(r, separators=(",", ":")) + "\n" for r in records).encode()
+        # the write is the commit point between workers; the fsync (JOURNAL_FSYNC)
+        # happens in a thread before the request is answered, see when_durable()
+        os.write(self._fd, data)
+        self._appended += 1
+        STORAGE_WRITTEN_BYTES.inc(len(data), file=self.log_path)
+        self._offset += len(data)
+        self._seq = records[-1]["seq"]
+        self._touched.update(r["path"] for r in records)
+
+    def durable_mark(self):
+        return self._appended
+
+    def when_durable(self, mark, callback) -> bool:
+        if not config.JOURNAL_FSYNC or self._synced >= mark:
+            return False
+        if self._fsyncer is None:
+            self._fsyncer = ThreadPoolExecutor(1, thread_name_prefix="shared-log-fsync")
+        self._fsyncer.submit(self._sync_log, mark, callback)
+        return True
+
+    def _sync_log(self, mark, callback):
+        # one thread: an fsync done for a later request already covers earlier ones
+        error = None
+        if self._synced < mark:
+            with self._lock:
+                fd, upto = os.dup(self._fd), self._appended
+            try:
+                os.fsync(fd)
+                self._synced = max(self._synced, upto)
+            except OSError as e:
+                error = e
+            finally:
+                os.close(fd)
+        callback(error)
+
+    def _follow(self):
+        # caller holds self._lock
+        if self._following:
+            return
+        if self._fd is not None:
+            try:
+                current = os.stat(self.log_path)
+            except FileNotFoundError:
+                return
+            if current.st_ino == self._ino and current.st_size == self._offset:
+                return
+
+        self._following = True
+        try:
+            if self._fd is None:
+                with self.lock:
+                    if not os.path.exists(self.log_path):
+                        self._start_log(1, uuid.uuid4().hex[:8], 0)
+                    self._attach()
+            self._read_new()
+            if os.stat(self.log_path).st_ino != self._ino:
+                # another worker compacted; the generation we hold is complete now
+                with self.lock:
+                    if self._attach():
+                        self._resync()
+                    self._read_new()
+        finally:
+            self._following = False
+
+    def _read_new(self):
+        size = os.fstat(self._fd).st_size
+        if size <= self._offset:
+            return
+        chunk = os.pread(self._fd, size - self._offset, self._offset)
+        end = chunk.rfind(b"\n") + 1
+        STORAGE_READ_BYTES.inc(end, file=self.log_path)
+
+        start = 0
+        while start < end:
+            stop = chunk.index(b"\n", start)
+            line = chunk[start:stop]
+            self._offset += stop + 1 - start
+            start = stop + 1
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                print("❌ Skipping unreadable shared log record before offset", self._offset)
+                continue
+            self._touched.add(record["path"])
+            if record["seq"] <= self._seq:
+                # carried over from the previous generation, applied there already
+                continue
+            self._seq = record["seq"]
+            # collections nobody asked for yet pick their records up when first loaded
+            if record["path"] in self._data:
+                self._replay(record)
+
+        if end < len(chunk) and self.lock.held:
+            # a torn tail from a worker that died mid-append; nobody else can be writing now
+            os.ftruncate(self._fd, self._offset)
+
+    def _replay(self, record):
+        if record["op"] == "replace":
+            self._replaced(record["path"], record["data"], seq=record["seq"], at=record["at"])
+        else:
+            self._apply(record["path"], record)
+
+    def _records(self):
+        # every record of the current generation applied so far
+        chunk = os.pread(self._fd, self._offset - self._header_end, self._header_end)
+        for line in chunk.split(b"\n"):
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
+
+    def _load_new(self, path, default):
+        # snapshot plus this generation's records for path; caller holds both locks
+        records = [r for r in self._records() if r["path"] == path]
+        if os.path.exists(path):
+            data = self._read(path)
+        else:
+            data = (empty_for(records[0]) if records else default)()
+        self._replaced(path, data)
+        for record in records:
+            self._replay(record)
+        return self._data[path]
+
+    def _start_log(self, generation, epoch, seq, carried=b""):
+        # written aside and renamed, so a log file always has its header
+        header = {"generation": generation, "epoch": epoch, "seq": seq, "at": time.time()}
+        tmp = f"{self.log_path}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(json.dumps(header).encode() + b"\n" + carried)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.log_path)
+
+    def _attach(self):
+        """Open the current log generation; returns True if whole generations were skipped."""
+        fd = os.open(self.log_path, os.O_RDWR | os.O_APPEND)
+        first = b""
+        while not first.endswith(b"\n"):
+            first += os.pread(fd, 4096, len(first))
+        first = first[:first.index(b"\n") + 1]
+        header = json.loads(first)
+
+        if self._fd is not None:
+            os.close(self._fd)
+        self._fd, self._ino = fd, os.fstat(fd).st_ino
+        self._offset = self._header_end = len(first)
+        self._touched = set()
+        skipped = bool(self._generation) and header["generation"] != self._generation + 1
+        self._generation = header["generation"]
+        self._seq = max(self._seq, header["seq"])
+        self.epoch, self.base_seq, self.base_at = header["epoch"], header["seq"], header["at"]
+        return skipped
+
+    def _resync(self):
+        # caller holds the cross-process lock, so the snapshots are complete
+        print("✅ Reloading collections: the shared log was compacted more than once since the last sync")
+        for path, current in list(self._data.items()):
+            self._replaced(path, self._read(path) if os.path.exists(path) else type(current)())
+        # the snapshots end at the header: records carried into this generation still apply
+        self._seq = self.base_seq
+
+    # -------------------------
+    # COMPACTION
+    # -------------------------
+    def flush(self, force=False):
+        """
+        Rewrite the snapshots changed in this generation and start the next
+        one. Runs in the compaction thread: it reads the collections and the
+        log file but applies no record and emits no event.
+        """
+        if not force and self._offset < config.JOURNAL_COMPACT_BYTES:
+            return
+        with self.lock, self._lock:
+            if not self._current():
+                # another worker compacted and this one has not followed yet
+                return
+            size = os.fstat(self._fd).st_size
+            if size <= self._header_end or (not force and size < config.JOURNAL_COMPACT_BYTES):
+                return
+            generation, seq, offset = self._generation, self._seq, self._offset
+            copies = {
+                path: _copied(self._data[path]) if path in self._data else self._replayed(path)
+                for path in sorted(self._touched)
+            }
+
+        # serializing and writing is the slow part: no lock, everyone keeps writing
+        try:
+            for path, data in copies.items():
+                self._write(_compacted(path), data, durable=True)
+        except Exception as e:
+            # the log still holds everything; the next write past the limit retries
+            print("❌ ERROR compacting the shared log:", e)
+            return
+
+        with self.lock, self._lock:
+            if self._generation != generation or not self._current():
+                # another worker compacted meanwhile (its snapshots are newer)
+                for path in copies:
+                    _discard(_compacted(path))
+                return
+            # everything after the copies, applied here or not; nobody appends while we hold the lock
+            tail = os.pread(self._fd, os.fstat(self._fd).st_size - offset, offset)
+            carried = tail[:tail.rfind(b"\n") + 1]
+            for path in copies:
+                os.replace(_compacted(path), path)
+                self._mtimes[path] = os.stat(path).st_mtime_ns
+            _fsync_dir(os.path.dirname(self.log_path) or ".")
+            self._start_log(generation + 1, self.epoch, seq, carried)
+        print(f"✅ Compacted the shared log, generation {generation + 1}")
+
+    def _current(self) -> bool:
+        # the log file is still the generation this worker follows
+        return self._fd is not None and os.stat(self.log_path).st_ino == self._ino
+
+    def _replayed(self, path):
+        # a collection this worker never loaded: snapshot plus the records
+        # applied so far, built aside without touching the resident data
+        records = [r for r in self._records() if r["path"] == path]
+        data = self._read(path) if os.path.exists(path) else (empty_for(records[0]) if records else list)()
+        for record in records:
+            if record["op"] == "replace":
+                data = record["data"]
+            else:
+                apply_mutation(data, record)
+        return data
+
+    def _maybe_flush(self):
+        # the worker whose write takes the log past the limit compacts it, off the event loop
+        if self._offset < config.JOURNAL_COMPACT_BYTES:
+            return
+        with self._lock:
+            if self._compactor is not None and self._compactor.is_alive():
+                return
+            self._compactor = threading.Thread(target=self.flush, name="shared-log-compact", daemon=True)
+            self._compactor.start()
+
+    def start(self):
+        self.sync()
+
+    def stop(self):
+        if self._compactor is not None:
+            self._compactor.join()
+        self.flush(force=True)
+
+
+def _compacted(path):
+    # where a compaction writes a snapshot before it is swapped in
+    return f"{path}.compact"
+
+
+def _discard(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,403 @@
+import json, os, sqlite3, threading, time, uuid
+
+import config
+from store import StorageBackend, apply_mutation, empty_for, same_id
+
+
+# -----------------------------------------------------
+# SCHEMA
+# -----------------------------------------------------
+# collection path -> (table, id field, indexed fields)
+TABLES = {
+    "products.json": ("products", "productId", []),
+    "releases.json": ("releases", "releaseId", ["productId", "status"]),
+    "clients.json": ("clients", "clientId", []),
+    "licenses.json": ("licenses", "licenseId", ["clientId", "productId", "status", "endDate"]),
+    "artifacts.json": ("artifact_records", "artifactId", ["releaseId"]),
+    "update_logs.json": ("update_log_records", "updateLogId", ["releaseId", "clientId"]),
+    os.path.join("data", "client_product.json"): ("client_products", "id", ["clientId", "productId"]),
+}
+
+# (collection path, nested list field) -> (table, id field, indexed fields)
+CHILD_TABLES = {
+    ("releases.json", "artifacts"): ("artifacts", "artifactId", []),
+    ("releases.json", "updateLogs"): ("update_logs", "updateLogId", ["clientId", "status"]),
+    ("releases.json", "dependencies"): ("release_dependencies", "releaseDependencyId", ["dependsOnReleaseId"]),
+}
+
+
+# shared mode: the change table is pruned to SHARED_CHANGES_KEEP rows every this many changes
+PRUNE_EVERY = 1000
+
+
+def _schema():
+    statements = [
+        "CREATE TABLE IF NOT EXISTS objects (path TEXT PRIMARY KEY, doc TEXT NOT NULL)",
+        # shared mode: every committed mutation, for the other worker processes to follow
+        "CREATE TABLE IF NOT EXISTS changes (seq INTEGER PRIMARY KEY AUTOINCREMENT, record TEXT NOT NULL)",
+        "CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT NOT NULL)",
+    ]
+    for table, key, cols in TABLES.values():
+        extra = "".join(f", {c}" for c in cols)
+        statements.append(
+            f"CREATE TABLE IF NOT EXISTS {table} ("
+            f"pos INTEGER PRIMARY KEY AUTOINCREMENT, {key} TEXT NOT NULL UNIQUE{extra}, doc TEXT NOT NULL)"
+        )
+        statements += [f"CREATE INDEX IF NOT EXISTS ix_{table}_{c} ON {table}({c})" for c in cols]
+
+    for (path, _), (table, key, cols) in CHILD_TABLES.items():
+        parent_key = TABLES[path][1]
+        extra = "".join(f", {c}" for c in cols)
+        statements.append(
+            f"CREATE TABLE IF NOT EXISTS {table} ("
+            f"pos INTEGER PRIMARY KEY AUTOINCREMENT, {parent_key} TEXT NOT NULL, {key} TEXT NOT NULL{extra}, "
+            f"doc TEXT NOT NULL, UNIQUE({parent_key}, {key}))"
+        )
+        statements += [f"CREATE INDEX IF NOT EXISTS ix_{table}_{c} ON {table}({c})" for c in cols]
+    return statements
+
+
+def _children_of(path):
+    return {field: spec for (p, field), spec in CHILD_TABLES.items() if p == path}
+
+
+def _id(value):
+    # ids are compared as text so legacy string ids still match int path params
+    return None if value is None else str(value)
+
+
+class SqliteStore(StorageBackend):
+    """
+    SQLite backend (WAL mode) with one table per collection.
+
+    Releases are split into normalized releases / artifacts / update_logs /
+    release_dependencies tables and stitched back into the JSON shape on read.
+    Collections without a table (settings.json) live as one document in
+    `objects`. Every statement is parameterized, so sqlite3's statement cache
+    reuses the prepared form.
+
+    Every call does disk I/O and returns freshly decoded documents, so the
+    handlers run it in a worker thread.
+
+    Several worker processes can share the database as is; shared=True adds
+    what their in-memory views need: writes take SQLite's write lock up
+    front (BEGIN IMMEDIATE) and record each mutation in the `changes` table
+    with a global sequence number, and sync() emits the changes other
+    workers committed (PRAGMA data_version tells cheaply whether there are
+    any). The table keeps the last SHARED_CHANGES_KEEP changes; a worker
+    that fell further behind gets a "replace" event per collection.
+    """
+
+    blocking = True
+
+    def __init__(self, path: str, shared: bool = False):
+        super().__init__()
+        self.path = path
+        self.shared = shared
+        self._conn = None
+        self._lock = threading.RLock()
+        self._seq = 0                # last change emitted (shared mode)
+        self._data_version = None
+
+    def _db(self):
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False, cached_statements=256)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            with conn:
+                for stmt in _schema():
+                    conn.execute(stmt)
+                if self.shared:
+                    conn.execute("INSERT OR IGNORE INTO meta VALUES ('epoch', ?)", (uuid.uuid4().hex[:8],))
+                    conn.execute(
+                        "INSERT OR IGNORE INTO meta VALUES ('base', ?)",
+                        (json.dumps({"seq": 0, "at": time.time()}),),
+                    )
+            if self.shared:
+                self.epoch = conn.execute("SELECT value FROM meta WHERE name = 'epoch'").fetchone()[0]
+            self._conn = conn
+        return self._conn
+
+    # -------------------------
+    # READ
+    # -------------------------
+    def load(self, path: str, default=list):
+        with self._lock:
+            db = self._db()
+            if path not in TABLES:
+                row = db.execute("SELECT doc FROM objects WHERE path = ?", (path,)).fetchone()
+                return json.loads(row[0]) if row else default()
+
+            table, key, _ = TABLES[path]
+            docs = [json.loads(d) for (d,) in db.execute(f"SELECT doc FROM {table} ORDER BY pos")]
+
+            for field, (child_table, _, _) in _children_of(path).items():
+                grouped = {}
+                for parent_id, doc in db.execute(f"SELECT {key}, doc FROM {child_table} ORDER BY pos"):
+                    grouped.setdefault(parent_id, []).append(json.loads(doc))
+                for d in docs:
+                    if field in d or _id(d.get(key)) in grouped:
+                        d[field] = grouped.get(_id(d.get(key)), [])
+            return docs
+
+    def find(self, path: str, key: str, value):
+        if path not in TABLES or key != TABLES[path][1]:
+            return super().find(path, key, value)
+        with self._lock:
+            return self._get(path, value)
+
+    def _get(self, path, id):
+        db = self._db()
+        table, key, _ = TABLES[path]
+        row = db.execute(f"SELECT doc FROM {table} WHERE {key} = ?", (_id(id),)).fetchone()
+        if not row:
+            return None
+
+        doc = json.loads(row[0])
+        for field, (child_table, _, _) in _children_of(path).items():
+            children = [
+                json.loads(d) for (d,) in db.execute(
+                    f"SELECT doc FROM {child_table} WHERE {key} = ? ORDER BY pos", (_id(id),)
+                )
+            ]
+            if field in doc or children:
+                doc[field] = children
+        return doc
+
+    # -------------------------
+    # WRITE
+    # -------------------------
+    def save(self, path: str, data):
+        with self._lock:
+            record = {"path": path, "op": "replace", "data": data}
+            with self._db() as db:
+                self._begin(db)
+                if path in TABLES:
+                    table, key, _ = TABLES[path]
+                    db.execute(f"DELETE FROM {table}")
+                    for child_table, _, _ in _children_of(path).values():
+                        db.execute(f"DELETE FROM {child_table}")
+                    for doc in data:
+                        self._put(db, path, doc)
+                else:
+                    self._put_object(db, path, data)
+                self._log(db, [record])
+            self._emit({k: v for k, v in record.items() if k != "data"})
+
+    def upsert(self, path: str, key: str, doc: dict):
+        return self._mutate(path, {"op": "upsert", "key": key, "doc": doc})
+
+    def delete(self, path: str, key: str, id):
+        return self._mutate(path, {"op": "delete", "key": key, "id": id})
+
+    def upsert_child(self, path, key, parent_id, field, child_key, doc, touch=None, front=False):
+        return self._mutate(path, {
+            "op": "upsert_child", "key": key, "id": parent_id, "field": field,
+            "childKey": child_key, "doc": doc, "touch": touch or {}, "front": front,
+        })
+
+    def delete_child(self, path, key, parent_id, field, child_key, child_id, touch=None):
+        return self._mutate(path, {
+            "op": "delete_child", "key": key, "id": parent_id, "field": field,
+            "childKey": child_key, "childId": child_id, "touch": touch or {},
+        })
+
+    def set_field(self, path: str, field: str, value):
+        return self._mutate(path, {"op": "set", "field": field, "value": value})
+
+    def bump(self, path: str, field: str, by: int, floor: int = 0) -> int:
+        return self._mutate(path, {"op": "bump", "field": field, "by": by, "floor": floor})
+
+    def batch(self, records):
+        records = [dict(r) for r in records]
+        with self._lock:
+            with self._db() as db:
+                self._begin(db)
+                results = [self._apply(db, r["path"], r) for r in records]
+                self._log(db, [r for r, result in zip(records, results) if result is not None])
+            for record, result in zip(records, results):
+                if result is not None:
+                    self._emit(record, result)
+            return results
+
+    def _mutate(self, path, record):
+        record = {"path": path, **record}
+        with self._lock:
+            with self._db() as db:
+                self._begin(db)
+                result = self._apply(db, path, record)
+                if result is not None:
+                    self._log(db, [record])
+            if result is not None:
+                self._emit(record, result)
+            return result
+
+    def _apply(self, db, path, record):
+        op = record["op"]
+        if path not in TABLES:
+            return self._apply_object(db, path, record)
+        if op in ("upsert_child", "delete_child") and (path, record["field"]) not in CHILD_TABLES:
+            return self._apply_nested(db, path, record)
+
+        table, key, _ = TABLES[path]
+        if op == "upsert":
+            self._put(db, path, record["doc"])
+            return record["doc"]
+
+        if op == "delete":
+            doc = self._get(path, record["id"])
+            if doc is not None:
+                db.execute(f"DELETE FROM {table} WHERE {key} = ?", (_id(record["id"]),))
+                for child_table, _, _ in _children_of(path).values():
+                    db.execute(f"DELETE FROM {child_table} WHERE {key} = ?", (_id(record["id"]),))
+            return doc
+
+        parent_id = record["id"]
+        if not self._touch(db, path, parent_id, record["touch"]):
+            return None
+
+        if op == "upsert_child":
+            self._put_child(db, path, record["field"], parent_id, record["doc"])
+            return record["doc"]
+
+        if op == "delete_child":
+            child_table, child_key, _ = CHILD_TABLES[(path, record["field"])]
+            where = f"WHERE {key} = ? AND {child_key} = ?"
+            params = (_id(parent_id), _id(record["childId"]))
+            row = db.execute(f"SELECT doc FROM {child_table} {where}", params).fetchone()
+            db.execute(f"DELETE FROM {child_table} {where}", params)
+            return json.loads(row[0]) if row else {}
+
+        raise ValueError(f"Unknown mutation: {op}")
+
+    # -------------------------
+    # SHARED MODE
+    # -------------------------
+    def sync(self):
+        if self.shared:
+            with self._lock:
+                self._follow(self._db())
+
+    def start(self):
+        self.sync()
+
+    def _begin(self, db):
+        # take the write lock before reading anything, then emit what other workers did first
+        if self.shared:
+            db.execute("BEGIN IMMEDIATE")
+            self._follow(db)
+
+    def _log(self, db, records):
+        if not self.shared or not records:
+            return
+        at = time.time()
+        for record in records:
+            stored = {k: v for k, v in record.items() if k != "result"}
+            cur = db.execute("INSERT INTO changes (record) VALUES (?)", (json.dumps({**stored, "at": at}),))
+            record.update(seq=cur.lastrowid, at=at)
+        self._seq = records[-1]["seq"]
+
+        if self._seq % PRUNE_EVERY < len(records):
+            base = self._seq - config.SHARED_CHANGES_KEEP
+            if base > 0:
+                db.execute("DELETE FROM changes WHERE seq <= ?", (base,))
+                db.execute("UPDATE meta SET value = ? WHERE name = 'base'", (json.dumps({"seq": base, "at": at}),))
+                self.base_seq, self.base_at = base, at
+
+    def _follow(self, db):
+        version = db.execute("PRAGMA data_version").fetchone()[0]
+        if version == self._data_version:
+            return
+        self._data_version = version
+
+        base = json.loads(db.execute("SELECT value FROM meta WHERE name = 'base'").fetchone()[0])
+        self.base_seq, self.base_at = base["seq"], base["at"]
+        if self._seq < self.base_seq:
+            # the changes we missed were pruned: only whole collections can tell
+            self._seq = self.base_seq
+            paths = [*TABLES, *(p for (p,) in db.execute("SELECT path FROM objects"))]
+            for path in paths:
+                self._emit({"path": path, "op": "replace"})
+
+        rows = db.execute("SELECT seq, record FROM changes WHERE seq > ? ORDER BY seq", (self._seq,)).fetchall()
+        for seq, text in rows:
+            record = json.loads(text)
+            record["seq"] = self._seq = seq
+            # deletes arrive without the removed document
+            self._emit(record, record.get("doc", record.get("value")))
+
+    # -------------------------
+    # INTERNALS
+    # -------------------------
+    def _put(self, db, path, doc):
+        table, key, cols = TABLES[path]
+        children = _children_of(path)
+
+        # nested lists keep their position in the document but live in their own tables
+        stored = {k: ([] if k in children else v) for k, v in doc.items()}
+        names = [key, *cols, "doc"]
+        values = [_id(doc.get(key)), *(doc.get(c) for c in cols), json.dumps(stored)]
+        updates = ", ".join(f"{n} = excluded.{n}" for n in names[1:])
+        db.execute(
+            f"INSERT INTO {table} ({', '.join(names)}) VALUES ({', '.join('?' * len(names))}) "
+            f"ON CONFLICT({key}) DO UPDATE SET {updates}",
+            values,
+        )
+
+        for field, (child_table, _, _) in children.items():
+            db.execute(f"DELETE FROM {child_table} WHERE {key} = ?", (_id(doc.get(key)),))
+            for child in doc.get(field) or []:
+                self._put_child(db, path, field, doc.get(key), child)
+
+    def _put_child(self, db, path, field, parent_id, doc):
+        table, key, cols = CHILD_TABLES[(path, field)]
+        parent_key = TABLES[path][1]
+        names = [parent_key, key, *cols, "doc"]
+        values = [_id(parent_id), _id(doc.get(key)), *(doc.get(c) for c in cols), json.dumps(doc)]
+        updates = ", ".join(f"{n} = excluded.{n}" for n in names[2:])
+        db.execute(
+            f"INSERT INTO {table} ({', '.join(names)}) VALUES ({', '.join('?' * len(names))}) "
+            f"ON CONFLICT({parent_key}, {key}) DO UPDATE SET {updates}",
+            values,
+        )
+
+    def _touch(self, db, path, parent_id, touch):
+        """Set fields on a parent row; returns False when the parent does not exist."""
+        table, key, _ = TABLES[path]
+        doc_expr, params = "doc", []
+        for field, value in (touch or {}).items():
+            doc_expr = f"json_set({doc_expr}, ?, ?)"
+            params += [f"$.{field}", value]
+        cur = db.execute(f"UPDATE {table} SET doc = {doc_expr} WHERE {key} = ?", (*params, _id(parent_id)))
+        return cur.rowcount > 0
+
+    def _put_object(self, db, path, data):
+        db.execute(
+            "INSERT INTO objects (path, doc) VALUES (?, ?) "
+            "ON CONFLICT(path) DO UPDATE SET doc = excluded.doc",
+            (path, json.dumps(data)),
+        )
+
+    def _apply_object(self, db, path, record):
+        # collections without a table are small: read, apply, write back
+        data = self.load(path, default=empty_for(record))
+        result = apply_mutation(data, record)
+        if result is not None:
+            self._put_object(db, path, data)
+        return result
+
+    def _apply_nested(self, db, path, record):
+        # nested list without its own table (e.g. license audits): rewrite the parent row
+        parent = self._get(path, record["id"])
+        if parent is None or not same_id(parent.get(record["key"]), record["id"]):
+            return None
+        result = apply_mutation([parent], record)
+        self._put(db, path, parent)
+        return result
+
+    def stop(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
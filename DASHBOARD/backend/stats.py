@@ -0,0 +1,204 @@
+import threading
+from collections import Counter
+
+from indexes import id_key
+from store import store
+
+_MISSING = object()
+
+
+class DashboardStats:
+    """
+    Dashboard summary numbers kept as counters that move with every store
+    change event: products and clients, releases per status and type,
+    installs (release updateLogs, archived ones included) per status and per
+    release, licenses per status.
+
+    Each document's last contribution is remembered, so an update subtracts
+    the old one and adds the new one; reads only copy the counters.
+    rebuild() recounts everything from storage and reports whether the
+    running counters had drifted.
+    """
+
+    def __init__(self, products_path, clients_path, releases_path, licenses_path, archive=None, installs_kind=None):
+        self.products_path = products_path
+        self.clients_path = clients_path
+        self.releases_path = releases_path
+        self.licenses_path = licenses_path
+        self.archive = archive              # HistoryArchive holding older update logs
+        self.installs_kind = installs_kind
+        self._paths = {
+            products_path: "productId", clients_path: "clientId",
+            releases_path: "releaseId", licenses_path: "licenseId",
+        }
+        self._lock = threading.RLock()
+        self._stale = True
+        self._changes = 0     # relevant events seen, to detect writes racing a rebuild
+        self._snapshot = None
+        self._reset()
+
+    def _reset(self):
+        self._rows = {path: {} for path in self._paths}   # path -> id key -> contribution
+        self._logs = {}                                    # releaseId key -> {updateLogId key: status}
+        self._release_status, self._release_type = Counter(), Counter()
+        self._install_status, self._license_status = Counter(), Counter()
+        self._snapshot = None
+
+    # -------------------------
+    # READ
+    # -------------------------
+    def snapshot(self, per_release=False) -> dict:
+        self._ready()
+        with self._lock:
+            if self._snapshot is None:
+                self._snapshot = self._render()
+            if not per_release:
+                return self._snapshot
+            return {**self._snapshot, "installsPerRelease": self._per_release()}
+
+    def rebuild(self) -> dict:
+        """Recount from storage; returns {"consistent": ..., "before": ..., "after": ...}."""
+        self._ready()
+        while True:
+            seen = self._changes
+            collections = {path: store.load(path) for path in self._paths}
+            with self._lock:
+                if self._changes != seen:
+                    continue
+                before = {**self.snapshot(), "installsPerRelease": self._per_release()}
+                self._load(collections)
+                after = {**self.snapshot(), "installsPerRelease": self._per_release()}
+                return {"consistent": before == after, "before": before, "after": after}
+
+    def _ready(self):
+        while self._stale:
+            # read storage without holding our lock, as UpdatesView does
+            seen = self._changes
+            collections = {path: store.load(path) for path in self._paths}
+            with self._lock:
+                if self._changes == seen:
+                    self._load(collections)
+
+    def _render(self):
+        completed, failed = self._install_status["completed"], self._install_status["failed"]
+        return {
+            "products": len(self._rows[self.products_path]),
+            "clients": len(self._rows[self.clients_path]),
+            "releases": {
+                "total": len(self._rows[self.releases_path]),
+                "byStatus": _positive(self._release_status),
+                "byType": _positive(self._release_type),
+            },
+            "installs": {
+                "total": sum(self._install_status.values()),
+                "byStatus": _positive(self._install_status),
+                "successRatio": completed / (completed + failed) if completed + failed else None,
+            },
+            "licenses": {
+                "total": len(self._rows[self.licenses_path]),
+                "active": self._license_status["active"],
+                "byStatus": _positive(self._license_status),
+            },
+        }
+
+    def _per_release(self):
+        rows = self._rows[self.releases_path]
+        installs = {k: len(logs) + sum(rows[k][2].values()) for k, logs in self._logs.items()}
+        return {k: n for k, n in installs.items() if n}
+
+    # -------------------------
+    # MAINTENANCE
+    # -------------------------
+    def on_change(self, event):
+        path = event["path"]
+        if path not in self._paths:
+            return
+        with self._lock:
+            self._changes += 1
+            if self._stale:
+                return
+            self._snapshot = None
+            op, key = event["op"], id_key(event.get("id"))
+            if op == "replace":
+                self._stale = True
+            elif op == "upsert":
+                self._remove(path, key)
+                self._add(path, event["result"])
+            elif op == "delete":
+                self._remove(path, key)
+            elif path == self.releases_path and event.get("field") == "updateLogs":
+                self._log_changed(key, event)
+            elif path == self.licenses_path:
+                # child ops can "touch" the status (e.g. the expiry sweep)
+                self._remove(path, key)
+                license_obj = store.find(path, "licenseId", event.get("id"))
+                if license_obj:
+                    self._add(path, license_obj)
+
+    def _load(self, collections):
+        self._reset()
+        for path, docs in collections.items():
+            for doc in docs:
+                self._add(path, doc)
+        self._stale = False
+
+    def _add(self, path, doc):
+        key = id_key(doc.get(self._paths[path]))
+        if key in self._rows[path]:
+            self._remove(path, key)
+        if path == self.releases_path:
+            archived = Counter(self.archive.tally(self.installs_kind, key)) if self.archive else Counter()
+            row = (doc.get("status"), doc.get("releaseType"), archived)
+            self._release_status[row[0]] += 1
+            self._release_type[row[1]] += 1
+            logs = {id_key(l.get("updateLogId")): l.get("status") for l in doc.get("updateLogs") or []}
+            self._install_status.update(logs.values())
+            self._install_status.update(archived)
+            self._logs[key] = logs
+        elif path == self.licenses_path:
+            row = doc.get("status")
+            self._license_status[row] += 1
+        else:
+            row = True
+        self._rows[path][key] = row
+
+    def _remove(self, path, key):
+        row = self._rows[path].pop(key, _MISSING)
+        if row is _MISSING:
+            return
+        if path == self.releases_path:
+            self._release_status[row[0]] -= 1
+            self._release_type[row[1]] -= 1
+            self._install_status.subtract(self._logs.pop(key, {}).values())
+            self._install_status.subtract(row[2])
+        elif path == self.licenses_path:
+            self._license_status[row] -= 1
+
+    def on_archived(self, kind, id, added):
+        if kind != self.installs_kind:
+            return
+        with self._lock:
+            row = self._rows[self.releases_path].get(id_key(id))
+            if self._stale or row is None:
+                return
+            row[2].update(added)
+            self._install_status.update(added)
+            self._snapshot = None
+
+    def _log_changed(self, rid, event):
+        logs = self._logs.get(rid)
+        if logs is None:
+            return
+        if event["op"] == "upsert_child":
+            log_key, status = id_key(event["doc"].get("updateLogId")), event["doc"].get("status")
+        else:
+            log_key, status = id_key(event.get("childId")), None
+        if log_key in logs:
+            self._install_status[logs.pop(log_key)] -= 1
+        if event["op"] == "upsert_child":
+            logs[log_key] = status
+            self._install_status[status] += 1
+
+
+def _positive(counter):
+    return {k: v for k, v in counter.items() if v > 0}
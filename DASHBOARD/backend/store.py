@@ -0,0 +1,595 @@
+import json, marshal, os, threading
+
+import config
+from binary_snapshot import BinarySnapshot, SnapshotError, source_of, write_snapshot
+from indexes import PositionIndex
+from journal import Journal
+from metrics import STORAGE_READ_BYTES, STORAGE_SECONDS, STORAGE_WRITTEN_BYTES
+
+
+class StorageBackend:
+    """
+    Interface the API handlers use to read and change collections.
+
+    Collections are addressed by their JSON file path (e.g. "releases.json").
+    load() returns the whole collection in its JSON shape; the mutation
+    helpers return the affected document, or None when nothing matched.
+    """
+
+    # True when calls wait on disk in the calling thread; async handlers
+    # then run them in a worker thread (see locks.run_io)
+    blocking = False
+
+    # Backends shared by several worker processes (config.SHARED) number
+    # every change globally: events then also carry "seq" and "at", and
+    # base_seq / base_at describe the state all workers agree on without
+    # having seen its changes (see shared_store.py). epoch names the data set.
+    shared = False
+    epoch = None
+    base_seq = 0
+    base_at = 0.0
+
+    def __init__(self):
+        self._listeners = []
+
+    def subscribe(self, listener):
+        """
+        Call listener(event) after every change. An event is the mutation
+        record (path, op, key, id, field, childKey, childId, doc) plus the
+        returned "result"; a whole collection swap arrives as op "replace".
+        Listeners run inside the write path and must stay cheap.
+        """
+        self._listeners.append(listener)
+
+    def _emit(self, record, result=None):
+        event = {**record, "result": result}
+        if "id" not in event and isinstance(record.get("doc"), dict):
+            event["id"] = record["doc"].get(record["key"])
+        for listener in self._listeners:
+            listener(event)
+
+    def load(self, path: str, default=list):
+        raise NotImplementedError
+
+    def find(self, path: str, key: str, value):
+        return next((x for x in self.load(path) if same_id(x.get(key), value)), None)
+
+    def save(self, path: str, data):
+        """Replace a whole collection."""
+        raise NotImplementedError
+
+    def upsert(self, path: str, key: str, doc: dict):
+        raise NotImplementedError
+
+    def delete(self, path: str, key: str, id):
+        raise NotImplementedError
+
+    def upsert_child(self, path, key, parent_id, field, child_key, doc, touch=None, front=False):
+        """Upsert into a list nested in a parent document (key=None targets the root object)."""
+        raise NotImplementedError
+
+    def delete_child(self, path, key, parent_id, field, child_key, child_id, touch=None):
+        raise NotImplementedError
+
+    def set_field(self, path: str, field: str, value):
+        """Set a top-level field of an object-shaped collection such as settings.json."""
+        raise NotImplementedError
+
+    def bump(self, path: str, field: str, by: int, floor: int = 0) -> int:
+        """Atomically advance a counter field to max(stored, floor) + by and return it."""
+        raise NotImplementedError
+
+    def batch(self, records):
+        """
+        Apply several mutation records ({"path", "op", ...} as built by the
+        helpers above) in one commit. Returns one result per record, None
+        where nothing matched; the records that did match are kept.
+        """
+        raise NotImplementedError
+
+    def durable_mark(self):
+        """Opaque marker of how far changes have been handed to storage (see when_durable)."""
+        return 0
+
+    def when_durable(self, mark, callback) -> bool:
+        """
+        Arrange callback(error) for when every change up to `mark` is on disk,
+        called from another thread. False, without a call, if nothing is
+        left to wait for: backends that write before returning always say so.
+        """
+        return False
+
+    def preload(self, paths):
+        pass
+
+    def sync(self):
+        """Pick up changes other worker processes made (shared mode only)."""
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def flush(self, force=False):
+        pass
+
+
+class CollectionStore(StorageBackend):
+    """
+    JSON file backend that keeps every collection resident in memory.
+
+    - load() parses a file once and serves it from memory afterwards
+    - save() and the mutation helpers only mark the collection dirty; a
+      background thread writes dirty collections back every FLUSH_INTERVAL
+      seconds, or as soon as FLUSH_BATCH writes are pending
+    - in journal mode each mutation is appended to the journal instead and
+      the JSON files are only rewritten when the journal is compacted
+    - a file changed on disk by someone else is parsed again by the flusher
+      thread and swapped in by the next load() after that (inline when there
+      is no flusher thread)
+    - find() and the mutations go through maintained id -> position indexes
+    - with a binary snapshot (config.BINARY_SNAPSHOT), collections whose JSON
+      file has not changed since it was written are decoded from it instead
+      of parsed; stop() writes a new one after the final flush
+
+    Calls stay on the event loop (blocking = False): responses serialize the
+    resident documents there, so mutating them from a worker thread would
+    race the encoder. Disk work happens elsewhere: snapshot writes and
+    reload parses in the flusher thread, journal appends in the journal's
+    writer thread (run_io awaits them through when_durable()).
+    """
+
+    def __init__(
+        self,
+        flush_interval=config.FLUSH_INTERVAL,
+        flush_batch=config.FLUSH_BATCH,
+        journal_path=config.JOURNAL_PATH if config.PERSISTENCE == "journal" else None,
+        snapshot_path=config.BINARY_SNAPSHOT_PATH if config.BINARY_SNAPSHOT else None,
+    ):
+        super().__init__()
+        self.flush_interval = flush_interval
+        self.flush_batch = max(1, flush_batch)
+        self.journal_path = journal_path
+        self.journal = None
+        self.snapshot_path = snapshot_path
+        self._snapshot = None       # BinarySnapshot, opened on the first read
+        self._snapshot_opened = False
+
+        self._data = {}       # path -> parsed collection
+        self._mtimes = {}     # path -> mtime_ns of the file we last read or wrote
+        self._dirty = set()   # paths with changes not yet in their JSON file
+        self._pending = 0     # writes since the last flush
+        self._reloaded = {}   # path -> (mtime_ns, data) parsed by the flusher, not swapped in yet
+
+        self._index = PositionIndex()
+
+        self._lock = threading.RLock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    # -------------------------
+    # READ / WRITE
+    # -------------------------
+    def load(self, path: str, default=list):
+        with self._lock:
+            mtime = _mtime(path)
+            cached = path in self._data
+            if cached and (path in self._dirty or mtime == self._mtimes.get(path)):
+                return self._data[path]
+
+            if cached and self._thread is not None:
+                # changed on disk: the flusher parses it, we keep serving what we hold until then
+                parsed = self._reloaded.pop(path, None)
+                if parsed is None or parsed[0] != mtime:
+                    self._wake.set()
+                    return self._data[path]
+                data = parsed[1]
+            else:
+                data = default() if mtime is None else self._read(path)
+            self._replaced(path, data)
+            self._mtimes[path] = mtime
+            return data
+
+    def _read(self, path):
+        snapshot = self._binary_snapshot()
+        if snapshot is not None and snapshot.fresh(path):
+            try:
+                with STORAGE_SECONDS.time(op="decode", file=path):
+                    data = snapshot.load(path)
+                STORAGE_READ_BYTES.inc(snapshot.size(path), file=path)
+                return data
+            except SnapshotError as e:
+                print("❌ Binary snapshot unusable, parsing the JSON file:", e)
+
+        with open(path, "r", encoding="utf-8") as f:
+            text = f.read()
+        STORAGE_READ_BYTES.inc(len(text), file=path)
+        with STORAGE_SECONDS.time(op="parse", file=path):
+            return json.loads(text)
+
+    def find(self, path: str, key: str, value):
+        with self._lock:
+            data = self.load(path)
+            pos = self._index.position(data, key, value)
+            return data[pos] if pos >= 0 else None
+
+    def save(self, path: str, data):
+        with self._lock:
+            self._replaced(path, data)
+            if self.journal:
+                self.journal.append({"path": path, "op": "replace", "data": data})
+            self._mark_dirty(path)
+        self._maybe_flush()
+
+    def preload(self, paths):
+        for path in paths:
+            try:
+                self.load(path)
+            except ValueError as e:
+                # left for the owning router to handle on first use
+                print("❌ ERROR preloading", path, ":", e)
+
+    # -------------------------
+    # MUTATIONS
+    # -------------------------
+    # Each helper builds one mutation record, applies it to the resident
+    # collection and (in journal mode) appends it to the journal.
+
+    def upsert(self, path: str, key: str, doc: dict):
+        return self._mutate(path, {"op": "upsert", "key": key, "doc": doc})
+
+    def delete(self, path: str, key: str, id):
+        return self._mutate(path, {"op": "delete", "key": key, "id": id})
+
+    def upsert_child(self, path, key, parent_id, field, child_key, doc, touch=None, front=False):
+        return self._mutate(path, {
+            "op": "upsert_child", "key": key, "id": parent_id, "field": field,
+            "childKey": child_key, "doc": doc, "touch": touch or {}, "front": front,
+        })
+
+    def delete_child(self, path, key, parent_id, field, child_key, child_id, touch=None):
+        return self._mutate(path, {
+            "op": "delete_child", "key": key, "id": parent_id, "field": field,
+            "childKey": child_key, "childId": child_id, "touch": touch or {},
+        })
+
+    def set_field(self, path: str, field: str, value):
+        return self._mutate(path, {"op": "set", "field": field, "value": value})
+
+    def bump(self, path: str, field: str, by: int, floor: int = 0) -> int:
+        return self._mutate(path, {"op": "bump", "field": field, "by": by, "floor": floor})
+
+    def batch(self, records):
+        records = list(records)
+        with self._lock:
+            results = [self._apply(r["path"], r) for r in records]
+            applied = [r for r, result in zip(records, results) if result is not None]
+            if self.journal and applied:
+                self.journal.append_many(applied)
+            for path in {r["path"] for r in applied}:
+                self._mark_dirty(path)
+        if applied:
+            self._maybe_flush()
+        return results
+
+    def _mutate(self, path, record):
+        record = {"path": path, **record}
+        with self._lock:
+            result = self._apply(path, record)
+            if result is None:
+                return None
+            if self.journal:
+                self.journal.append(record)
+            self._mark_dirty(path)
+        self._maybe_flush()
+        return result
+
+    def _apply(self, path, record):
+        # caller holds the lock and journals / marks dirty
+        data = self.load(path, default=empty_for(record))
+        result = apply_mutation(data, record, self._index)
+        if result is None:
+            return None
+        self._emit(record, result)
+        return result
+
+    def _replaced(self, path, data, **event):
+        # a whole collection was swapped out: its position maps are stale
+        swapped = path in self._data
+        if swapped:
+            self._index.clear()
+        self._data[path] = data
+        if swapped:
+            self._emit({"path": path, "op": "replace", **event})
+
+    def _mark_dirty(self, path):
+        self._dirty.add(path)
+        self._pending += 1
+        if self._pending >= self.flush_batch:
+            self._wake.set()
+
+    def _maybe_flush(self):
+        # no background thread running: behave like the old write-through helpers
+        if self.flush_interval <= 0 or self._thread is None:
+            self.flush()
+
+    # -------------------------
+    # FLUSHING / COMPACTION
+    # -------------------------
+    def flush(self, force=False):
+        if self.journal and not force and self.journal.size() < config.JOURNAL_COMPACT_BYTES:
+            # changes are already durable in the journal
+            return
+
+        with self._lock:
+            dirty = list(self._dirty)
+            self._dirty.clear()
+            self._pending = 0
+            if self.journal:
+                self.journal.rotate()
+            # handlers change the resident documents in place; write what they
+            # held at this moment, not whatever the encoder meets later
+            snapshots = {path: _copied(self._data[path]) for path in dirty}
+
+        failed = False
+        for path, data in snapshots.items():
+            try:
+                # the rotated journal segment is only dropped once these are on disk
+                self._write(path, data, durable=self.journal is not None)
+            except Exception as e:
+                # keep it dirty so the next flush retries
+                print("❌ ERROR flushing", path, ":", e)
+                failed = True
+                with self._lock:
+                    self._dirty.add(path)
+
+        if self.journal and not failed:
+            self.journal.discard_rotated()
+
+    def _parse_changed(self):
+        # flusher thread: parse resident collections whose file someone else changed
+        with self._lock:
+            changed = []
+            for path, current in self._data.items():
+                mtime = _mtime(path)
+                held = self._reloaded.get(path, (None,))[0]
+                if path not in self._dirty and mtime not in (self._mtimes.get(path), held):
+                    changed.append((path, mtime, type(current)))
+        for path, mtime, empty in changed:
+            try:
+                data = empty() if mtime is None else self._read(path)
+            except (OSError, ValueError) as e:
+                # caught mid-write, most likely; the next round tries again
+                print("❌ ERROR reloading", path, ":", e)
+                continue
+            if _mtime(path) == mtime:
+                with self._lock:
+                    self._reloaded[path] = (mtime, data)
+
+    def _write(self, path, data, durable=False):
+        # data is a private copy: serialize it outside the lock, then swap the
+        # file in atomically; durable: fsync the file and the rename as well
+        with STORAGE_SECONDS.time(op="serialize", file=path):
+            payload = json.dumps(data, indent=2)
+        STORAGE_WRITTEN_BYTES.inc(len(payload), file=path)
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(payload)
+            if durable:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp, path)
+        if durable:
+            _fsync_dir(directory or ".")
+
+        with self._lock:
+            self._mtimes[path] = _mtime(path)
+
+    def _binary_snapshot(self):
+        if self.snapshot_path and not self._snapshot_opened:
+            self._snapshot_opened = True
+            try:
+                self._snapshot = BinarySnapshot(self.snapshot_path)
+            except FileNotFoundError:
+                pass
+            except (OSError, SnapshotError) as e:
+                print("❌ Ignoring binary snapshot:", e)
+        return self._snapshot
+
+    def write_binary_snapshot(self):
+        """Snapshot every resident collection whose JSON file holds exactly what is in memory."""
+        with self._lock:
+            collections, sources = {}, {}
+            for path, data in self._data.items():
+                source = source_of(path)
+                if source and path not in self._dirty and source[0] == self._mtimes.get(path):
+                    collections[path], sources[path] = data, source
+            current = self._binary_snapshot()
+            if not collections or (current and all(current.fresh(p) for p in collections)):
+                return
+            try:
+                size = write_snapshot(self.snapshot_path, collections, sources)
+            except OSError as e:
+                print("❌ ERROR writing binary snapshot:", e)
+                return
+            if current:
+                current.close()
+            self._snapshot, self._snapshot_opened = None, False
+        print(f"✅ Wrote binary snapshot of {len(collections)} collections ({size} bytes)")
+
+    def replay(self, records):
+        """Apply journal records on top of the loaded snapshots."""
+        touched = set()
+        replayed = 0
+        with self._lock:
+            for record in records:
+                path = record["path"]
+                if record["op"] == "replace":
+                    self._replaced(path, record["data"])
+                else:
+                    apply_mutation(self.load(path, default=empty_for(record)), record, self._index)
+                self._dirty.add(path)
+                touched.add(path)
+                replayed += 1
+            for path in touched:
+                self._emit({"path": path, "op": "replace"})
+        return replayed
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+            self._parse_changed()
+
+    def durable_mark(self):
+        return self.journal.queued if self.journal else 0
+
+    def when_durable(self, mark, callback) -> bool:
+        return self.journal is not None and self.journal.when_written(mark, callback)
+
+    def start(self):
+        if self.journal_path and self.journal is None:
+            self.journal = Journal(self.journal_path, fsync=config.JOURNAL_FSYNC)
+            replayed = self.replay(self.journal.records())
+            if replayed:
+                print(f"✅ Replayed {replayed} journal records")
+            self.flush(force=True)
+
+        if self._thread is not None or self.flush_interval <= 0:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="store-flusher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._wake.set()
+            self._thread.join()
+            self._thread = None
+        self.flush(force=True)
+        if self.journal:
+            self.journal.close()
+            self.journal = None
+        if self.snapshot_path:
+            self.write_binary_snapshot()
+
+
+# -----------------------------------------------------
+# MUTATION RECORDS
+# -----------------------------------------------------
+def apply_mutation(data, m, index: PositionIndex = None):
+    """
+    Apply one mutation record to a collection in place; used live and on replay.
+    Pass the store's PositionIndex to avoid linear scans.
+    """
+    index = index or PositionIndex()
+    op = m["op"]
+
+    if op == "set":
+        data[m["field"]] = m["value"]
+        return m["value"]
+
+    if op == "bump":
+        data[m["field"]] = max(data.get(m["field"]) or 0, m.get("floor", 0)) + m["by"]
+        return data[m["field"]]
+
+    if op == "upsert":
+        return _upsert(data, m["key"], m["doc"], index)
+
+    if op == "delete":
+        return _remove(data, m["key"], m["id"], index)
+
+    if m["key"] is None:
+        parent = data
+    else:
+        pos = index.position(data, m["key"], m["id"])
+        parent = data[pos] if pos >= 0 else None
+    if parent is None:
+        return None
+
+    children = parent.setdefault(m["field"], [])
+    if op == "upsert_child":
+        result = _upsert(children, m["childKey"], m["doc"], index, front=m.get("front", False))
+    elif op == "delete_child":
+        result = _remove(children, m["childKey"], m["childId"], index) or {}
+    else:
+        raise ValueError(f"Unknown mutation: {op}")
+
+    parent.update(m.get("touch") or {})
+    return result
+
+
+def empty_for(record):
+    """What a missing collection starts as: an object for "set" / "bump", otherwise a list."""
+    return dict if record["op"] in ("set", "bump") else list
+
+
+def _upsert(items, key, doc, index, front=False):
+    pos = index.position(items, key, doc.get(key))
+    if pos >= 0:
+        index.replaced(items[pos])
+        items[pos] = doc
+    elif front:
+        items.insert(0, doc)
+        index.invalidate(items)
+    else:
+        items.append(doc)
+        index.appended(items, key)
+    return doc
+
+
+def _remove(items, key, value, index):
+    pos = index.position(items, key, value)
+    if pos < 0:
+        return None
+    doc = items.pop(pos)
+    index.removed(items, key, pos, doc)
+    return doc
+
+
+def _copied(data):
+    # deep copy of JSON-shaped data; marshal runs in C without releasing the
+    # GIL, so it is quick enough to take under the store lock
+    return marshal.loads(marshal.dumps(data))
+
+
+def _fsync_dir(directory):
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def same_id(a, b):
+    # ids arrive as ints from the API but some older records hold strings
+    return a == b or (a is not None and b is not None and str(a) == str(b))
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def create_store() -> StorageBackend:
+    if config.STORAGE == "sqlite":
+        from sqlite_store import SqliteStore
+        return SqliteStore(config.SQLITE_PATH, shared=config.SHARED)
+    if config.SHARED:
+        from shared_store import SharedCollectionStore
+        return SharedCollectionStore(config.SHARED_LOG_PATH)
+    return CollectionStore()
+
+
+store = create_store()
@@ -0,0 +1,52 @@
+import json
+
+from fastapi import Request, Response
+from fastapi.responses import StreamingResponse
+
+import config
+
+NDJSON = "application/x-ndjson"
+
+
+def stream_format(request: Request):
+    """NDJSON when the client accepts it, a streamed JSON array for ?stream=1, else None."""
+    if NDJSON in request.headers.get("accept", ""):
+        return NDJSON
+    if request.query_params.get("stream", "").lower() in ("1", "true"):
+        return "application/json"
+    return None
+
+
+def streamed(request: Request, response: Response, items):
+    """
+    Return `items` unchanged, or a StreamingResponse that encodes them a chunk
+    at a time when the client asked for streaming. Encoding runs in the
+    threadpool, so the event loop only hands out the first chunk.
+    """
+    media_type = stream_format(request)
+    if media_type is None:
+        return items
+
+    # shallow copy: later writes to the resident collection must not shift the iteration
+    body = _ndjson(list(items)) if media_type == NDJSON else _json_array(list(items))
+    return StreamingResponse(body, media_type=media_type, headers=dict(response.headers))
+
+
+def _chunks(items):
+    size = max(1, config.STREAM_CHUNK_SIZE)
+    for start in range(0, len(items), size):
+        yield [json.dumps(x, separators=(",", ":")) for x in items[start:start + size]]
+
+
+def _json_array(items):
+    first = True
+    yield "["
+    for encoded in _chunks(items):
+        yield ("" if first else ",") + ",".join(encoded)
+        first = False
+    yield "]"
+
+
+def _ndjson(items):
+    for encoded in _chunks(items):
+        yield "\n".join(encoded) + "\n"
@@ -0,0 +1,98 @@
+import threading
+from collections import OrderedDict, deque
+
+import config
+from indexes import id_key
+from store import store
+
+
+class SyncIndex:
+    """
+    Every entity ordered by the change-feed sequence number of its last
+    change, so "what changed since N" walks back from the newest entry and
+    stops at N: the cost follows the number of changes, not the dataset.
+
+    Deleted entities stay in the index as tombstones for `tombstones_keep`
+    sequence numbers; a token from before the oldest expired one could miss
+    deletes, so changes() refuses it and the client syncs in full. A
+    whole-collection swap (save / reload from disk) cannot be diffed and
+    marks the collection for a full resend instead.
+    """
+
+    def __init__(self, collections: dict, tombstones_keep: int = config.SYNC_TOMBSTONES_KEEP):
+        self.collections = collections    # entity type -> (path, key)
+        self.tombstones_keep = tombstones_keep
+        self._order = OrderedDict()       # (entity, id_key) -> (seq, id, deleted)
+        self._tombstones = deque()        # (seq, (entity, id_key)) of deletes, oldest first
+        self._floor = 0                   # tombstones up to this seq may have expired
+        self._resets = {}                 # entity -> seq of its last whole-collection swap
+        self._lock = threading.Lock()
+
+    def on_change(self, change):
+        entity = change["entity"]
+        if entity not in self.collections:
+            return
+        with self._lock:
+            if change["op"] == "replace":
+                self._resets[entity] = change["seq"]
+                return
+            entry = (entity, id_key(change["id"]))
+            deleted = change["op"] == "delete"
+            self._order.pop(entry, None)
+            self._order[entry] = (change["seq"], change["id"], deleted)
+            if deleted:
+                self._tombstones.append((change["seq"], entry))
+            self._expire(change["seq"] - self.tombstones_keep)
+
+    def _expire(self, cutoff):
+        # caller holds the lock
+        while self._tombstones and self._tombstones[0][0] <= cutoff:
+            seq, entry = self._tombstones.popleft()
+            current = self._order.get(entry)
+            # unless the entity came back since
+            if current is not None and current[0] == seq and current[2]:
+                del self._order[entry]
+            self._floor = seq
+
+    def changes(self, since):
+        """
+        {"upserted": {entity: [docs]}, "deleted": {entity: [ids]}, "reset": [entities]}
+        for everything changed after `since`; since=None sends every collection.
+        None when tombstones after `since` have expired (a full sync is needed).
+        """
+        with self._lock:
+            if since is not None and since < self._floor:
+                return None
+            if since is None:
+                reset = set(self.collections)
+            else:
+                reset = {e for e, seq in self._resets.items() if seq > since}
+
+            touched = []
+            for (entity, _), (seq, id, deleted) in reversed(self._order.items()):
+                if since is None or seq <= since:
+                    break
+                if entity not in reset:
+                    touched.append((entity, id, deleted))
+
+        upserted, deleted = {}, {}
+        for entity in sorted(reset):
+            upserted[entity] = self._load(entity)
+        for entity, id, gone in reversed(touched):
+            doc = None if gone else self._find(entity, id)
+            if doc is None:
+                deleted.setdefault(entity, []).append(id)
+            else:
+                upserted.setdefault(entity, []).append(doc)
+        return {"upserted": upserted, "deleted": deleted, "reset": sorted(reset)}
+
+    def _load(self, entity):
+        path, key = self.collections[entity]
+        data = store.load(path, default=list if key else dict)
+        return data if key else [data]
+
+    def _find(self, entity, id):
+        path, key = self.collections[entity]
+        if key is None:
+            return store.load(path, default=dict)
+        return store.find(path, key, id)
@@ -0,0 +1,33 @@
+import os, shutil, sys
+
+import pytest
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture()
+def data_dir(tmp_path, monkeypatch):
+    """A copy of the backend's data files as the working directory, with the backend importable."""
+    for name in os.listdir(BACKEND):
+        if name.endswith(".json"):
+            shutil.copy(os.path.join(BACKEND, name), tmp_path)
+    shutil.copytree(os.path.join(BACKEND, "data"), tmp_path / "data")
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.syspath_prepend(BACKEND)
+    return tmp_path
+
+
+def fresh_backend():
+    """Import main anew, so config reads the environment the test set up."""
+    names = {n[:-3] for n in os.listdir(BACKEND) if n.endswith(".py")} | {"routers", "routers.client_product"}
+    for module in [m for m in sys.modules if m in names]:
+        del sys.modules[module]
+    import main
+    return main
+
+
+def artifact(release_id, artifact_id):
+    return {
+        "artifactId": artifact_id, "releaseId": release_id, "fileUrl": f"https://example.com/{artifact_id}.bin",
+        "hash": "sha256:" + "0" * 64, "size": artifact_id, "createdAt": "2026-01-01T00:00:00Z",
+    }
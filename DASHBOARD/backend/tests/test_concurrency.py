@@ -0,0 +1,57 @@
+"""
+Parallel writes to one release through the HTTP API must all survive, in
+memory and on disk. Runs the app in-process (httpx's ASGITransport, as
+benchmarks/run.py does with its own client) against a copy of the data
+files, in journal mode with fsync so the journal writer thread is on the
+path of every request.
+
+    cd DASHBOARD/backend && pip install -r requirements-dev.txt && python -m pytest tests
+"""
+import asyncio
+
+import httpx
+import pytest
+
+from conftest import artifact, fresh_backend
+
+WRITERS = 50
+
+
+@pytest.fixture()
+def app(data_dir, monkeypatch):
+    monkeypatch.setenv("DASHBOARD_PERSISTENCE", "journal")
+    monkeypatch.setenv("DASHBOARD_JOURNAL_FSYNC", "1")
+    return fresh_backend()
+
+
+def test_parallel_upserts_to_one_release_are_not_lost(app):
+    async def run():
+        await app.start_store()
+        try:
+            transport = httpx.ASGITransport(app=app.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                release_id = (await client.get("/api/releases")).json()[0]["releaseId"]
+                before = {a["artifactId"] for a in app.store.find(app.RELEASES_PATH, "releaseId", release_id)["artifacts"]}
+                new_ids = [900000 + i for i in range(WRITERS)]
+                responses = await asyncio.gather(*(
+                    client.post(f"/api/releases/{release_id}/artifacts", json=artifact(release_id, i))
+                    for i in new_ids
+                ))
+                assert [r.status_code for r in responses] == [200] * WRITERS
+
+                release = (await client.get(f"/api/releases?releaseId={release_id}")).json()[0]
+                held = {a["artifactId"] for a in release["artifacts"]}
+                assert held == before | set(new_ids)
+        finally:
+            await app.stop_store()
+        return release_id, before | set(new_ids)
+
+    release_id, expected = asyncio.run(run())
+
+    # what reached the disk, read back the way a restarted server would
+    from store import CollectionStore
+    reread = CollectionStore(flush_interval=0, journal_path="journal.log", snapshot_path=None)
+    reread.start()
+    release = reread.find("releases.json", "releaseId", release_id)
+    assert {a["artifactId"] for a in release["artifacts"]} == expected
+    reread.stop()
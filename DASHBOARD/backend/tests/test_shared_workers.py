@@ -0,0 +1,83 @@
+"""
+Several worker processes sharing one data directory (DASHBOARD_SHARED=1)
+write to the same release at once; every write must survive, including
+the ones racing a compaction of the shared log (the compaction limit is
+set low so several happen during the run).
+
+    cd DASHBOARD/backend && pip install -r requirements-dev.txt && python -m pytest tests
+"""
+import asyncio, json, multiprocessing
+
+import httpx
+import pytest
+
+from conftest import artifact, fresh_backend
+
+WORKERS = 4
+WRITES = 40
+
+
+@pytest.fixture()
+def shared(data_dir, monkeypatch):
+    monkeypatch.setenv("DASHBOARD_SHARED", "1")
+    monkeypatch.setenv("DASHBOARD_JOURNAL_FSYNC", "1")
+    monkeypatch.setenv("DASHBOARD_JOURNAL_COMPACT_BYTES", "8192")
+    return data_dir
+
+
+def _worker(release_id, artifact_ids):
+    """Runs in its own process: post the artifacts in parallel, return the status codes."""
+    app = fresh_backend()
+
+    async def run():
+        await app.start_store()
+        try:
+            transport = httpx.ASGITransport(app=app.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                responses = await asyncio.gather(*(
+                    client.post(f"/api/releases/{release_id}/artifacts", json=artifact(release_id, i))
+                    for i in artifact_ids
+                ))
+        finally:
+            await app.stop_store()
+        return [r.status_code for r in responses]
+
+    return asyncio.run(run())
+
+
+def _artifact_ids(release_id):
+    """Runs in a fresh process: what a newly started worker sees."""
+    app = fresh_backend()
+
+    async def run():
+        await app.start_store()
+        try:
+            release = app.store.find(app.RELEASES_PATH, "releaseId", release_id)
+            return {a["artifactId"] for a in release["artifacts"]}
+        finally:
+            await app.stop_store()
+
+    return asyncio.run(run())
+
+
+def test_concurrent_writes_from_several_workers_are_not_lost(shared):
+    spawn = multiprocessing.get_context("spawn")
+    with spawn.Pool(1) as pool:
+        release_id = pool.apply(_first_release_id)
+        before = pool.apply(_artifact_ids, (release_id,))
+
+    batches = [[900000 + w * WRITES + i for i in range(WRITES)] for w in range(WORKERS)]
+    with spawn.Pool(WORKERS) as pool:
+        statuses = pool.starmap(_worker, [(release_id, ids) for ids in batches])
+    assert statuses == [[200] * WRITES] * WORKERS
+
+    with spawn.Pool(1) as pool:
+        after = pool.apply(_artifact_ids, (release_id,))
+    assert after == before | {i for ids in batches for i in ids}
+    with open(shared / "shared.log", encoding="utf-8") as f:
+        assert json.loads(f.readline())["generation"] > 1, "the run never compacted the log"
+
+
+def _first_release_id():
+    app = fresh_backend()
+    return app.store.load(app.RELEASES_PATH)[0]["releaseId"]
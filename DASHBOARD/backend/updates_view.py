@@ -0,0 +1,154 @@
+import threading
+from bisect import bisect_left, insort
+
+from indexes import id_key
+from store import store
+
+
+class UpdatesView:
+    """
+    Materialized /api/updates: every release merged with its product name,
+    kept sorted by releaseDate (newest first) and updated from store change
+    events instead of being rebuilt on each request.
+
+    Ties on releaseDate keep the order the releases were first seen in, which
+    matches the stable sort the endpoint used to do.
+    """
+
+    def __init__(self, releases_path: str, products_path: str):
+        self.releases_path = releases_path
+        self.products_path = products_path
+        self._lock = threading.RLock()
+        self._stale = True
+        self._changes = 0      # relevant events seen, to detect writes racing a rebuild
+
+        self._names = {}       # productId -> product name
+        self._by_product = {}  # productId -> {releaseId}
+        self._rows = {}        # releaseId -> merged row
+        self._keys = {}        # releaseId -> sort key currently in _order
+        self._order = []       # ascending (releaseDate, -seq, releaseId)
+        self._seq = {}         # releaseId -> first-seen sequence number
+        self._next_seq = 0
+        self._listing = None   # cached newest-first list, dropped on change
+
+    # -------------------------
+    # READ
+    # -------------------------
+    def rows(self):
+        while self._stale:
+            # read storage without holding our lock: change events arrive with
+            # the store's lock held and take ours second
+            seen = self._changes
+            products, releases = store.load(self.products_path), store.load(self.releases_path)
+            with self._lock:
+                if self._changes == seen:
+                    self._rebuild(products, releases)
+
+        with self._lock:
+            if self._listing is None:
+                self._listing = [self._rows[k[2]] for k in reversed(self._order)]
+            return self._listing
+
+    # -------------------------
+    # MAINTENANCE
+    # -------------------------
+    def on_change(self, event):
+        if event["path"] not in (self.releases_path, self.products_path):
+            return
+        with self._lock:
+            self._changes += 1
+            if self._stale:
+                return
+            if event["op"] == "replace":
+                self._stale = True
+            elif event["path"] == self.products_path:
+                self._product_changed(event)
+            else:
+                self._release_changed(event)
+            self._listing = None
+
+    def _product_changed(self, event):
+        pid = id_key(event.get("id"))
+        product = store.find(self.products_path, "productId", event.get("id"))
+        if product:
+            self._names[pid] = product.get("name")
+        else:
+            self._names.pop(pid, None)
+
+        # rename in place across every release of the product
+        name = self._product_name(pid)
+        for rid in self._by_product.get(pid, ()):
+            self._rows[rid] = {**self._rows[rid], "productName": name}
+
+    def _release_changed(self, event):
+        rid = id_key(event.get("id"))
+        self._remove(rid)
+        # child ops only carry the child, so read the release back (an index hit)
+        release = store.find(self.releases_path, "releaseId", event.get("id"))
+        if release:
+            self._add(release)
+        else:
+            # a re-created release goes to the end of storage order
+            self._seq.pop(rid, None)
+
+    def _rebuild(self, products, releases):
+        self._names = {id_key(p.get("productId")): p.get("name") for p in products}
+        self._by_product, self._rows, self._keys, self._order = {}, {}, {}, []
+        for release in releases:
+            self._add(release)
+        self._stale = False
+        self._listing = None
+
+    def _add(self, release):
+        rid = id_key(release.get("releaseId", 0))
+        pid = id_key(release.get("productId", 0))
+        if rid not in self._seq:
+            self._seq[rid] = self._next_seq
+            self._next_seq += 1
+
+        row = _merge(release, self._product_name(pid))
+        key = (row["releaseDate"], -self._seq[rid], rid)
+        self._rows[rid] = row
+        self._keys[rid] = (key, pid)
+        self._by_product.setdefault(pid, set()).add(rid)
+        insort(self._order, key)
+
+    def _remove(self, rid):
+        entry = self._keys.pop(rid, None)
+        if entry is None:
+            return
+        key, pid = entry
+        del self._order[bisect_left(self._order, key)]
+        del self._rows[rid]
+        self._by_product[pid].discard(rid)
+
+    def _product_name(self, pid):
+        return self._names[pid] if pid in self._names else "Unknown Product"
+
+
+def _merge(r, product_name):
+    # ✅ guarantee safe fields
+    changelog = r.get("changelog")
+    if not isinstance(changelog, list):
+        changelog = []
+
+    notes = r.get("notes")
+    if notes is None:
+        notes = ""
+
+    return {
+        "releaseId": r.get("releaseId", 0),
+        "productId": r.get("productId", 0),
+        "productName": product_name,
+        "version": r.get("version", ""),
+        "releaseType": r.get("releaseType", "minor"),
+        "status": r.get("status", "draft"),
+        "releaseDate": r.get("releaseDate", ""),
+        "title": r.get("title", "(No Title Provided)"),   # ✅ always exists
+        "notes": notes,                                   # ✅ always string
+        "changelog": changelog,                           # ✅ always list
+        "artifacts": r.get("artifacts", []),
+        "dependencies": r.get("dependencies", []),
+        "updateLogs": r.get("updateLogs", []),
+        "lastModified": r.get("lastModified", ""),
+    }
@@ -0,0 +1,339 @@
+import asyncio, hashlib, json, multiprocessing, os, threading, time, uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timezone
+from urllib.parse import unquote, urlparse
+
+from metrics import ARTIFACT_HASHED_BYTES, ARTIFACT_VERIFICATIONS
+
+# the content address of a blob, whatever algorithm its artifact records
+CONTENT_ALGORITHM = "sha256"
+
+
+def hash_file(path: str, algorithms, chunk_size: int):
+    """
+    ({algorithm: hex digest}, bytes read) of one file, read in chunk_size
+    pieces into one reused buffer. Runs in a pool worker process.
+    """
+    hashes = {a: hashlib.new(a) for a in algorithms}
+    buffer = bytearray(chunk_size)
+    view = memoryview(buffer)
+    total = 0
+    with open(path, "rb", buffering=0) as f:
+        while True:
+            n = f.readinto(buffer)
+            if not n:
+                break
+            for h in hashes.values():
+                h.update(view[:n])
+            total += n
+    return {a: h.hexdigest() for a, h in hashes.items()}, total
+
+
+class ArtifactFiles:
+    """
+    Local copies of artifact files under `root`, looked up by fileUrl:
+    https://host/a/b.bin lives at <root>/host/a/b.bin, a file: URL or a
+    relative path at <root>/<path>. Nothing outside root is ever read.
+
+    With dedup enabled, identical files are deduplicated by content
+    address (VerificationJobs asks only for verified ones): the first copy
+    becomes the blob <root>/.blobs/sha256/<2 hex>/<digest> (a hard link)
+    and later copies are swapped for links to it. Permissions are left as
+    they are: a link shares the inode, so changing the blob's would change
+    the original artifact's too. Tools that update an artifact file must
+    therefore replace it, not write into it.
+    """
+
+    def __init__(self, root: str, dedup: bool = False):
+        self.root = os.path.abspath(root)
+        self.dedup_enabled = dedup
+
+    def path_for(self, file_url):
+        if not file_url:
+            return None
+        url = urlparse(file_url)
+        if url.scheme in ("http", "https"):
+            relative = os.path.join(url.netloc, unquote(url.path).lstrip("/"))
+        elif url.scheme in ("", "file"):
+            relative = unquote(url.path).lstrip("/")
+        else:
+            return None
+        path = os.path.normpath(os.path.join(self.root, relative))
+        return path if path.startswith(self.root + os.sep) else None
+
+    def blob_path(self, digest: str) -> str:
+        return os.path.join(self.root, ".blobs", CONTENT_ALGORITHM, digest[:2], digest)
+
+    def dedup(self, path: str, digest: str, hashed) -> int:
+        """
+        Link path to the blob of its content (digest, hashed when the file
+        had stat `hashed`); returns the bytes this freed. A file that changed
+        since it was hashed is left alone.
+        """
+        if not self.dedup_enabled:
+            return 0
+        blob = self.blob_path(digest)
+        st = os.stat(path)
+        if not _same_file(st, hashed):
+            return 0
+        try:
+            held = os.stat(blob)
+        except FileNotFoundError:
+            os.makedirs(os.path.dirname(blob), exist_ok=True)
+            os.link(path, blob)
+            return 0
+        if held.st_ino == st.st_ino or held.st_size != st.st_size:
+            return 0
+        tmp = f"{path}.dedup"
+        os.link(blob, tmp)
+        os.replace(tmp, path)
+        # the replaced copy only frees space if nothing else links to it
+        return st.st_size if st.st_nlink == 1 else 0
+
+
+class HashCache:
+    """
+    Digests of artifact files keyed by (path, mtime_ns, size), persisted as
+    JSON at `path` so a restart does not rehash unchanged files. A file that
+    changed in any of the three is simply a miss; its entry is replaced.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._entries = None     # file path -> {"mtime", "size", "digests"}
+        self._lock = threading.Lock()
+
+    def get(self, path: str, st, algorithms):
+        with self._lock:
+            entry = self._load().get(path)
+        if entry and entry["mtime"] == st.st_mtime_ns and entry["size"] == st.st_size:
+            if all(a in entry["digests"] for a in algorithms):
+                return entry["digests"]
+        return None
+
+    def put(self, path: str, st, digests: dict):
+        with self._lock:
+            entries = self._load()
+            old = entries.get(path)
+            if old and old["mtime"] == st.st_mtime_ns and old["size"] == st.st_size:
+                digests = {**old["digests"], **digests}
+            entries[path] = {"mtime": st.st_mtime_ns, "size": st.st_size, "digests": digests}
+
+    def save(self):
+        with self._lock:
+            if self._entries is None:
+                return
+            tmp = f"{self.path}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self._entries, f)
+            os.replace(tmp, self.path)
+
+    def _load(self):
+        # caller holds the lock
+        if self._entries is None:
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    self._entries = json.load(f)
+            except FileNotFoundError:
+                self._entries = {}
+            except ValueError as e:
+                print("❌ Ignoring unreadable artifact hash cache:", e)
+                self._entries = {}
+        return self._entries
+
+
+class VerificationJobs:
+    """
+    Background jobs that check artifact files against their recorded hash
+    and size. Files are hashed in a process pool (`workers` processes, one
+    file per task, streamed in `chunk_size` pieces); a cached digest is used
+    when the file's (path, mtime, size) is unchanged. Files whose status is
+    "ok" are then deduplicated by content, if ArtifactFiles has dedup
+    enabled (config.ARTIFACT_DEDUP, off by default).
+
+    A job reports progress while it runs and keeps per-artifact results;
+    the newest `keep` jobs are kept in memory, per worker process.
+    """
+
+    def __init__(self, files: ArtifactFiles, cache: HashCache, workers: int, chunk_size: int, keep: int):
+        self.files = files
+        self.cache = cache
+        self.workers = max(1, workers)
+        self.chunk_size = chunk_size
+        self.keep = keep
+        self._jobs = {}        # jobId -> job, oldest first
+        self._tasks = set()
+        self._pool = None
+
+    def start(self, release_id, artifacts: list) -> dict:
+        job = {
+            "jobId": uuid.uuid4().hex[:12],
+            "releaseId": release_id,
+            "state": "running",
+            "total": len(artifacts),
+            "done": 0,
+            "hashedBytes": 0,
+            "cached": 0,
+            "summary": {},
+            "dedup": {"linked": 0, "savedBytes": 0},
+            "startedAt": _now(),
+            "finishedAt": None,
+            "results": [],
+        }
+        self._jobs[job["jobId"]] = job
+        while len(self._jobs) > self.keep:
+            oldest = next(iter(self._jobs))
+            if self._jobs[oldest]["state"] == "running":
+                break
+            del self._jobs[oldest]
+        task = asyncio.create_task(self._run(job, artifacts))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job
+
+    def get(self, job_id: str):
+        return self._jobs.get(job_id)
+
+    def list(self) -> list:
+        return list(reversed(self._jobs.values()))
+
+    def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    # -------------------------
+    # RUNNING
+    # -------------------------
+    async def _run(self, job, artifacts):
+        started = time.perf_counter()
+        try:
+            results = await asyncio.gather(*(self._verify(job, a) for a in artifacts))
+            # identical content within the release, by content address
+            holders = {}
+            for r in results:
+                if r.get("contentAddress"):
+                    holders.setdefault(r["contentAddress"], []).append(r["artifactId"])
+            for r in results:
+                others = [a for a in holders.get(r.get("contentAddress"), ()) if a != r["artifactId"]]
+                if others:
+                    r["sameContentAs"] = others
+            job["state"] = "done"
+        except asyncio.CancelledError:
+            job["state"] = "cancelled"
+            raise
+        except Exception as e:
+            print("❌ Artifact verification failed:", e)
+            job.update(state="failed", error=str(e))
+        finally:
+            job["finishedAt"] = _now()
+            job["seconds"] = round(time.perf_counter() - started, 3)
+            await asyncio.to_thread(self.cache.save)
+
+    async def _verify(self, job, artifact):
+        result = {
+            "artifactId": artifact.get("artifactId"),
+            "fileUrl": artifact.get("fileUrl"),
+            "expectedHash": artifact.get("hash"),
+            "expectedSize": artifact.get("size"),
+        }
+        try:
+            result.update(await self._check(job, artifact))
+        except OSError as e:
+            result.update(status="error", detail=str(e))
+        job["results"].append(result)
+        job["done"] += 1
+        job["summary"][result["status"]] = job["summary"].get(result["status"], 0) + 1
+        ARTIFACT_VERIFICATIONS.inc(status=result["status"])
+        return result
+
+    async def _check(self, job, artifact):
+        path = self.files.path_for(artifact.get("fileUrl"))
+        if path is None:
+            return {"status": "missing", "detail": "fileUrl is outside the artifact store"}
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return {"status": "missing", "detail": "no local copy"}
+
+        algorithm, expected = _parse_hash(artifact.get("hash"))
+        algorithms = [CONTENT_ALGORITHM] + ([algorithm] if algorithm and algorithm != CONTENT_ALGORITHM else [])
+        digests = self.cache.get(path, st, algorithms)
+        if digests is not None:
+            job["cached"] += 1
+            size = st.st_size
+        else:
+            loop = asyncio.get_running_loop()
+            pool = self._executor()
+            try:
+                digests, size = await loop.run_in_executor(pool, hash_file, path, algorithms, self.chunk_size)
+            except BrokenProcessPool:
+                # a worker died; the next job starts a new pool
+                if self._pool is pool:
+                    self._pool = None
+                raise
+            job["hashedBytes"] += size
+            ARTIFACT_HASHED_BYTES.inc(size)
+            # only cache what matches the file as it is now
+            if _same_file(st, os.stat(path)):
+                self.cache.put(path, st, digests)
+
+        content = digests[CONTENT_ALGORITHM]
+        check = {
+            "actualSize": size,
+            "actualHash": f"{algorithm}:{digests[algorithm]}" if algorithm else None,
+            "contentAddress": f"{CONTENT_ALGORITHM}:{content}",
+        }
+        if algorithm is None:
+            return {**check, "status": "unverifiable", "detail": "recorded hash is not a known algorithm:hex digest"}
+        problems = []
+        if artifact.get("size") is not None and artifact["size"] != size:
+            problems.append("size")
+        if digests[algorithm] != expected:
+            problems.append("hash")
+        if problems:
+            return {**check, "status": "mismatch", "detail": f"{' and '.join(problems)} differ"}
+
+        # only files that match their record are linked to a shared blob
+        saved = await asyncio.to_thread(self.files.dedup, path, content, st)
+        if saved:
+            job["dedup"]["linked"] += 1
+            job["dedup"]["savedBytes"] += saved
+        # a dedup link changes the file's mtime: remember the digests for that too
+        after = os.stat(path)
+        if not _same_file(st, after):
+            self.cache.put(path, after, digests)
+        return {**check, "status": "ok"}
+
+    def _executor(self):
+        if self._pool is None:
+            # spawn: forking a process that runs threads (flusher, to_thread) is unsafe
+            self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._pool
+
+
+def _parse_hash(value):
+    """("sha256", hex) from "sha256:<hex>" (or bare hex, taken as sha256); (None, None) if unusable."""
+    if not isinstance(value, str):
+        return None, None
+    algorithm, sep, digest = value.strip().partition(":")
+    if not sep:
+        algorithm, digest = CONTENT_ALGORITHM, algorithm
+    algorithm, digest = algorithm.lower(), digest.lower()
+    if algorithm not in hashlib.algorithms_guaranteed:
+        return None, None
+    expected = hashlib.new(algorithm).digest_size * 2
+    if len(digest) != expected or any(c not in "0123456789abcdef" for c in digest):
+        return None, None
+    return algorithm, digest
+
+
+def _same_file(a, b):
+    return (a.st_ino, a.st_mtime_ns, a.st_size) == (b.st_ino, b.st_mtime_ns, b.st_size)
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat()
@@ -0,0 +1,155 @@
+import time, uuid, zlib
+from email.utils import formatdate, parsedate_to_datetime
+
+from fastapi import HTTPException, Request, Response
+
+from indexes import id_key
+from store import store
+
+
+class VersionTracker:
+    """
+    Per-collection and per-entity change counters, fed by store change events.
+
+    Tags are prefixed with a per-process epoch so a restart never reuses a tag
+    a client may still hold.
+
+    With a shared backend the counters are the global sequence numbers the
+    events carry instead, and epoch and start come from the store, so every
+    worker hands out the same tags. Changes from before the store's base
+    (which a worker started later has never seen) all count as the base.
+    """
+
+    def __init__(self):
+        self._epoch = uuid.uuid4().hex[:8]
+        self.started = time.time()
+        self._collections = {}     # path -> change counter
+        self._generations = {}     # path -> whole-collection swaps
+        self._entities = {}        # (path, id_key) -> change counter
+        self._modified = {}        # path or (path, id_key) -> unix time of last change
+
+    @property
+    def epoch(self) -> str:
+        return store.epoch or self._epoch
+
+    def on_change(self, event):
+        path, now = event["path"], event.get("at") or time.time()
+        # shared backends: a replace without a sequence number is a reload back to the base
+        tick = event.get("seq", store.base_seq) if store.shared else None
+        self._collections[path] = self._next(self._collections.get(path, 0), tick)
+        self._modified[path] = now
+
+        if event["op"] == "replace":
+            self._generations[path] = self._next(self._generations.get(path, 0), tick)
+            self._modified[(path, None)] = now
+            return
+        if event.get("key") is None:
+            return
+        entity = (path, id_key(event.get("id")))
+        self._entities[entity] = self._next(self._entities.get(entity, 0), tick)
+        self._modified[entity] = now
+
+    @staticmethod
+    def _next(counter, tick):
+        return counter + 1 if tick is None else tick
+
+    def collection_version(self, *paths) -> str:
+        base = store.base_seq
+        return ".".join(str(max(self._collections.get(p, 0), base)) for p in paths)
+
+    def collection_tag(self, *paths, variant: str = "") -> str:
+        # weak: the same data may be encoded differently (streamed, projected, ...)
+        suffix = f"-{zlib.crc32(variant.encode()):08x}" if variant else ""
+        return f'W/"{self.epoch}-{self.collection_version(*paths)}{suffix}"'
+
+    def entity_tag(self, path: str, id) -> str:
+        entity, base = (path, id_key(id)), store.base_seq
+        generation = max(self._generations.get(path, 0), base)
+        return f'"{self.epoch}-{generation}.{max(self._entities.get(entity, 0), base)}"'
+
+    def last_modified(self, *keys) -> float:
+        start = store.base_at if store.shared else self.started
+        return max([start, *(self._modified.get(k, 0) for k in keys)])
+
+
+versions = VersionTracker()
+store.subscribe(versions.on_change)
+
+
+# -----------------------------------------------------
+# CONDITIONAL REQUESTS
+# -----------------------------------------------------
+class NotModified(Exception):
+    status_code = 304
+
+    def __init__(self, headers: dict):
+        self.headers = headers
+
+
+async def not_modified_handler(request: Request, exc: NotModified):
+    return Response(status_code=304, headers=exc.headers)
+
+
+def conditional(*paths):
+    """
+    Dependency for collection GETs: answers 304 from the version counters
+    before the handler touches storage, otherwise stamps ETag/Last-Modified.
+    """
+    def dependency(request: Request, response: Response):
+        variant = f"{request.url.query}|{request.headers.get('accept', '')}"
+        tag = versions.collection_tag(*paths, variant=variant)
+        _check(request, response, tag, versions.last_modified(*paths))
+    return dependency
+
+
+def conditional_entity(path: str, key: str, param: str):
+    """
+    Same as conditional() for a single document addressed by a path parameter.
+    If-None-Match: * only matches a document that exists, so a missing one
+    falls through to the handler's 404.
+    """
+    def dependency(request: Request, response: Response):
+        id = request.path_params[param]
+        tag = versions.entity_tag(path, id)
+        exists = lambda: store.find(path, key, id) is not None
+        _check(request, response, tag, versions.last_modified((path, None), (path, id_key(id))), exists)
+    return dependency
+
+
+def check_if_match(request: Request, path: str, id):
+    """Optimistic concurrency for PUT/DELETE; call right before the write."""
+    header = request.headers.get("if-match")
+    if header is None or header.strip() == "*":
+        return
+    current = versions.entity_tag(path, id)
+    if current not in [t.strip() for t in header.split(",")]:
+        raise HTTPException(status_code=412, detail="Resource was modified; reload and retry")
+
+
+def entity_headers(response: Response, path: str, id):
+    response.headers["ETag"] = versions.entity_tag(path, id)
+
+
+def _check(request, response, tag, modified, exists=lambda: True):
+    headers = {"ETag": tag, "Cache-Control": "no-cache"}
+    # Last-Modified only tells seconds apart: a date whose second is still
+    # running could be followed by another change within it that the same
+    # date would then validate. Such a response carries the ETag only.
+    if int(modified) < int(time.time()):
+        headers["Last-Modified"] = formatdate(modified, usegmt=True)
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        # weak comparison, as RFC 9110 asks for If-None-Match
+        held = {t.strip().removeprefix("W/") for t in if_none_match.split(",")}
+        if tag.removeprefix("W/") in held or ("*" in held and exists()):
+            raise NotModified(headers)
+    elif request.headers.get("if-modified-since"):
+        try:
+            since = parsedate_to_datetime(request.headers["if-modified-since"]).timestamp()
+        except (TypeError, ValueError):
+            since = None
+        if since is not None and int(modified) <= since:
+            raise NotModified(headers)
+
+    response.headers.update(headers)